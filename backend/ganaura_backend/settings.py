@@ -61,6 +61,7 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'ganaura_backend.urls'
 
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_EXPOSE_HEADERS = ['ETag', 'X-Next-Cursor']
 
 CRONJOBS = [
     ('0 */3 * * *', 'user.tasks.cleanup_expired_tokens'),  # Run every 3 hours
@@ -107,6 +108,14 @@ DATABASES = {
     }
 }
 
+# Use a shared backend (e.g. Redis) in production so gallery invalidation reaches every worker
+CACHES = {
+    "default": {
+        "BACKEND": decouple.config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": decouple.config("CACHE_LOCATION", default=""),
+    }
+}
+
 
 
 # Password validation
@@ -150,3 +159,14 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Object storage for direct uploads; without keys, uploads keep going through Django
+SPACES_ACCESS_KEY_ID = decouple.config("SPACES_ACCESS_KEY_ID", default="")
+SPACES_SECRET_KEY = decouple.config("SPACES_SECRET_KEY", default="")
+SPACES_REGION = decouple.config("SPACES_REGION", default="sgp1")
+SPACES_ENDPOINT_URL = decouple.config("SPACES_ENDPOINT_URL", default=f"https://{SPACES_REGION}.digitaloceanspaces.com")
+SPACES_BUCKET = decouple.config("SPACES_BUCKET", default="ganaura")
+DIRECT_UPLOAD_EXPIRY = 900
+
+# Pass the stored file's path to the microservice so a co-located instance opens it in place
+SHARED_MEDIA_HANDOFF = decouple.config("SHARED_MEDIA_HANDOFF", default=False, cast=bool)
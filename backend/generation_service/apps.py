@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GenerationServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'generation_service'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,44 @@
+import base64
+import hashlib
+import time
+from datetime import datetime
+from django.core.cache import cache
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+GALLERY_CACHE_TTL = 300
+
+
+def version_key(user_id):
+    return f"gallery-version:{user_id}"
+
+
+def gallery_version(user_id):
+    """Token that changes whenever any of the user's processed media changes."""
+    return cache.get_or_set(version_key(user_id), time.time_ns, None)
+
+
+def bump_gallery_version(*user_ids):
+    """Invalidate cached gallery pages and ETags for these users."""
+    now = time.time_ns()
+    cache.set_many({version_key(user_id): now for user_id in user_ids}, None)
+
+
+def gallery_etag(user_id, version, *params):
+    digest = hashlib.sha1(f"{user_id}:{version}:{params}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def encode_cursor(media):
+    """Opaque position after `media` in (uploaded_at, id) descending order."""
+    raw = f"{media.uploaded_at.isoformat()}|{media.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (uploaded_at, id) from a cursor, raising ValueError if it is malformed."""
+    try:
+        uploaded_at, media_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(uploaded_at), int(media_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
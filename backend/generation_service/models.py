@@ -26,6 +26,13 @@ class UserMedia(models.Model):
     file = models.FileField(upload_to=user_media_path)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     media_type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES, editable=False)
+    # Processing job created for this upload, echoed back in the save-media callback
+    job_id = models.CharField(max_length=36, unique=True, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'media_type', '-uploaded_at'], name='usermedia_user_type_recent'),
+        ]
 
     def save(self, *args, **kwargs):
         """Automatically determine if the uploaded file is an image or a video."""
@@ -49,4 +56,11 @@ class CloudMedia(models.Model):
     user_media = models.ForeignKey(UserMedia, on_delete=models.CASCADE, related_name="processed")
     media_type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
-    media_url = models.URLField(blank=True, null=True) 
\ No newline at end of file
+    media_url = models.URLField(blank=True, null=True)
+
+    class Meta:
+        # Gallery pages filter on the upload and media type, newest first
+        indexes = [
+            models.Index(fields=['media_type', '-uploaded_at', '-id'], name='cloudmedia_type_recent'),
+            models.Index(fields=['user_media', 'media_type', '-uploaded_at', '-id'], name='cloudmedia_upload_type_recent'),
+        ] 
\ No newline at end of file
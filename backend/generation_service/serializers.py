@@ -1,8 +1,15 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
 from rest_framework import serializers
 from .models import CloudMedia, UserMedia
+from .gallery import bump_gallery_version
 import uuid
 from user.models import User
 
+IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
+VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi', 'mkv', 'flv', 'wmv']
+ALLOWED_EXTENSIONS = IMAGE_EXTENSIONS + VIDEO_EXTENSIONS
+
 class UserMediaSerializer(serializers.ModelSerializer):
     file = serializers.FileField(write_only=True)
     user_id = serializers.CharField(write_only=True)  # Accept UUIDs # Accept user ID in API request
@@ -10,15 +17,14 @@ class UserMediaSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UserMedia
-        fields = ['id', 'user_id', 'username', 'file', 'media_type', 'uploaded_at']
-        read_only_fields = ['id', 'media_type', 'uploaded_at', 'username']
+        fields = ['id', 'user_id', 'username', 'file', 'media_type', 'uploaded_at', 'job_id']
+        read_only_fields = ['id', 'media_type', 'uploaded_at', 'username', 'job_id']
 
     def validate_file(self, value):
         """Validate the uploaded file type."""
         ext = value.name.split('.')[-1].lower()
-        allowed_extensions = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'mp4', 'mov', 'avi', 'mkv', 'flv', 'wmv']
         
-        if ext not in allowed_extensions:
+        if ext not in ALLOWED_EXTENSIONS:
             raise serializers.ValidationError("Unsupported file format.")
         
         return value
@@ -33,14 +39,49 @@ class UserMediaSerializer(serializers.ModelSerializer):
         return instance
 
 
+class DirectUploadSerializer(serializers.Serializer):
+    """Registers an upload the client sends straight to object storage."""
+    filename = serializers.CharField(write_only=True)
+    content_type = serializers.CharField(write_only=True, required=False, allow_blank=True)
+
+    def validate_filename(self, value):
+        ext = value.rsplit('.', 1)[-1].lower() if '.' in value else ''
+        if ext not in ALLOWED_EXTENSIONS:
+            raise serializers.ValidationError("Unsupported file format.")
+        return value
+
+    def validate(self, attrs):
+        """The declared content type must name the same kind of media as the file extension."""
+        content_type = attrs.get('content_type')
+        if content_type:
+            ext = attrs['filename'].rsplit('.', 1)[-1].lower()
+            expected = 'image' if ext in IMAGE_EXTENSIONS else 'video'
+            if content_type.split('/')[0].lower() != expected:
+                raise serializers.ValidationError({"content_type": f"Expected an {expected} content type for .{ext} files."})
+        return attrs
+
+    def create(self, validated_data):
+        ext = validated_data['filename'].rsplit('.', 1)[-1].lower()
+        user_id = validated_data['user_id']
+        # The object key is stored as the file name; UserMedia.save derives the media type from it
+        instance = UserMedia(
+            user_id=user_id,
+            file=f"uploads/{user_id}/{uuid.uuid4()}.{ext}",
+            job_id=validated_data['job_id'],
+        )
+        instance.save()
+        return instance
+
+
 class CloudMediaSerializer(serializers.ModelSerializer):
     user_id = serializers.CharField(write_only=True)
+    job_id = serializers.CharField(write_only=True, required=False, allow_null=True)
     media_url = serializers.URLField(required=True)
     media_type = serializers.ChoiceField(choices=UserMedia.MEDIA_TYPE_CHOICES, required=True)
 
     class Meta:
         model = CloudMedia
-        fields = ['id','user_id', 'media_url', 'media_type']
+        fields = ['id','user_id', 'job_id', 'media_url', 'media_type']
         read_only_fields = ['id']
 
     def validate_user_id(self, value):
@@ -53,11 +94,17 @@ class CloudMediaSerializer(serializers.ModelSerializer):
         user_id = validated_data.pop('user_id')
         media_url = validated_data.pop('media_url')
         media_type = validated_data.pop('media_type')
+        job_id = validated_data.pop('job_id', None)
 
         try:
-            # Get the latest uploaded video for the user
-            user = User.objects.get(pk=user_id)
-            media_instance = UserMedia.objects.filter(user=user, media_type=media_type).latest('uploaded_at')
+            if job_id:
+                media_instance = UserMedia.objects.filter(job_id=job_id, user_id=user_id).first()
+                if media_instance is None:
+                    # Never guess: the latest upload may belong to another job
+                    raise serializers.ValidationError({"job_id": "No upload found for this job."})
+            else:
+                # Uploads made before jobs carried an id: fall back to the latest one
+                media_instance = UserMedia.objects.filter(user_id=user_id, media_type=media_type).latest('uploaded_at')
 
             # Get or create the related CloudMedia instance
             cloud_media_instance, created = CloudMedia.objects.get_or_create(user_media=media_instance)
@@ -67,4 +114,89 @@ class CloudMediaSerializer(serializers.ModelSerializer):
 
             return cloud_media_instance
         except UserMedia.DoesNotExist:
-            raise serializers.ValidationError("No uploaded video found for this user.")
\ No newline at end of file
+            raise serializers.ValidationError("No uploaded video found for this user.")
+
+
+class CloudMediaCompletionSerializer(serializers.Serializer):
+    user_id = serializers.CharField()
+    job_id = serializers.CharField(required=False, allow_null=True)
+    media_url = serializers.URLField()
+    media_type = serializers.ChoiceField(choices=UserMedia.MEDIA_TYPE_CHOICES)
+
+
+class CloudMediaBatchSerializer(serializers.Serializer):
+    """Save many processing completions with a fixed number of queries."""
+    # Entries are validated one by one in create, so one bad entry doesn't fail the batch
+    completions = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def create(self, validated_data):
+        results = {}
+        completions = {}
+        for index, item in enumerate(validated_data['completions']):
+            completion = CloudMediaCompletionSerializer(data=item)
+            if completion.is_valid():
+                completions[index] = completion.validated_data
+            else:
+                results[index] = {"index": index, "errors": completion.errors}
+
+        user_ids = {item['user_id'] for item in completions.values()}
+        existing_users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+
+        # Latest upload per (user, media type), resolved in one query
+        newest = UserMedia.objects.filter(
+            user_id=OuterRef('user_id'), media_type=OuterRef('media_type')
+        ).order_by('-uploaded_at').values('id')[:1]
+        targets = {
+            (user_id, media_type): media_id
+            for user_id, media_type, media_id in UserMedia.objects.filter(user_id__in=existing_users)
+            .annotate(newest_id=Subquery(newest))
+            .filter(id=F('newest_id'))
+            .values_list('user_id', 'media_type', 'id')
+        }
+        job_ids = {item['job_id'] for item in completions.values() if item.get('job_id')}
+        jobs = {
+            (user_id, job_id): media_id
+            for user_id, job_id, media_id in UserMedia.objects.filter(job_id__in=job_ids)
+            .values_list('user_id', 'job_id', 'id')
+        }
+
+        updates = {}
+        for index, item in completions.items():
+            if item['user_id'] not in existing_users:
+                results[index] = {"index": index, "error": "User ID does not exist in the database."}
+                continue
+            if item.get('job_id'):
+                media_id = jobs.get((item['user_id'], item['job_id']))
+                if media_id is None:
+                    results[index] = {"index": index, "error": "No upload found for this job."}
+                    continue
+            else:
+                media_id = targets.get((item['user_id'], item['media_type']))
+            if media_id is None:
+                results[index] = {"index": index, "error": "No uploaded media found for this user."}
+                continue
+            # Later completions for the same upload win, as with one request each
+            updates[media_id] = item
+            results[index] = {"index": index, "user_media": media_id}
+
+        with transaction.atomic():
+            cloud_media = {}
+            for instance in CloudMedia.objects.filter(user_media_id__in=updates).order_by('id'):
+                cloud_media.setdefault(instance.user_media_id, instance)
+            to_update, to_create = [], []
+            for media_id, item in updates.items():
+                instance = cloud_media.get(media_id)
+                if instance is None:
+                    to_create.append(CloudMedia(user_media_id=media_id, media_url=item['media_url'],
+                                                media_type=item['media_type']))
+                else:
+                    instance.media_url = item['media_url']
+                    instance.media_type = item['media_type']
+                    to_update.append(instance)
+            CloudMedia.objects.bulk_create(to_create)
+            CloudMedia.objects.bulk_update(to_update, ['media_url', 'media_type'])
+
+        # Bulk writes skip the model signals that invalidate cached galleries
+        bump_gallery_version(*{item['user_id'] for item in updates.values()})
+
+        return [results[index] for index in sorted(results)]
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .gallery import bump_gallery_version
+from .models import CloudMedia, UserMedia
+
+
+@receiver([post_save, post_delete], sender=CloudMedia)
+def invalidate_gallery(sender, instance, **kwargs):
+    # Only the owner's id is needed, so don't load the whole upload for it
+    if CloudMedia.user_media.is_cached(instance):
+        user_id = instance.user_media.user_id
+    else:
+        user_id = UserMedia.objects.filter(pk=instance.user_media_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        bump_gallery_version(user_id)
@@ -0,0 +1,47 @@
+import threading
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def direct_uploads_enabled():
+    return bool(settings.SPACES_ACCESS_KEY_ID and settings.SPACES_SECRET_KEY)
+
+
+def get_client():
+    """Shared S3 client for the Spaces bucket that receives direct uploads."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = boto3.session.Session().client(
+                's3',
+                region_name=settings.SPACES_REGION,
+                endpoint_url=settings.SPACES_ENDPOINT_URL,
+                aws_access_key_id=settings.SPACES_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.SPACES_SECRET_KEY,
+                config=Config(signature_version='s3v4'),
+            )
+    return _client
+
+
+def presigned_upload(key, content_type):
+    """URL the client PUTs the file to; the Content-Type header must match `content_type`."""
+    return get_client().generate_presigned_url(
+        'put_object',
+        Params={'Bucket': settings.SPACES_BUCKET, 'Key': key, 'ContentType': content_type},
+        ExpiresIn=settings.DIRECT_UPLOAD_EXPIRY,
+    )
+
+
+def uploaded_object(key):
+    """Return the object's metadata, or None if the client has not uploaded it."""
+    try:
+        return get_client().head_object(Bucket=settings.SPACES_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
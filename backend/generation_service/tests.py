@@ -1,3 +1,310 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import uuid
+from unittest import mock
 
-# Create your tests here.
+import requests
+from moto import mock_aws
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from user.models import User
+from utils.utils import generate_jwt
+from . import storage
+from .models import CloudMedia, UserMedia
+from .serializers import CloudMediaBatchSerializer
+
+
+class CloudMediaBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="alice", email="alice@example.com")
+        self.other = User.objects.create(username="bob", email="bob@example.com")
+        # Primary keys default to UUID objects until read back from the database
+        self.uploads = [
+            str(UserMedia.objects.create(user=self.user, file=f"videos/{n}.mp4", job_id=f"job-{n}").id)
+            for n in range(3)
+        ]
+
+    def completion(self, n, **overrides):
+        item = {"user_id": str(self.user.id), "job_id": f"job-{n}",
+                "media_url": f"https://cdn.example/{n}.mp4", "media_type": "video"}
+        item.update(overrides)
+        return item
+
+    def save(self, completions):
+        serializer = CloudMediaBatchSerializer(data={"completions": completions})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save()
+
+    def test_invalid_entries_are_reported_by_index(self):
+        completions = [
+            self.completion(0),
+            self.completion(1, media_url=None),
+            self.completion(2, user_id="missing"),
+            {"user_id": str(self.other.id), "media_url": "https://cdn.example/x.mp4", "media_type": "video"},
+            self.completion(2),
+        ]
+        # Users, latest uploads, job lookup, existing results, then the bulk insert
+        # inside its savepoint; the query count does not grow with the batch
+        with self.assertNumQueries(7):
+            results = self.save(completions)
+
+        self.assertEqual([result["index"] for result in results], [0, 1, 2, 3, 4])
+        self.assertEqual(results[0]["user_media"], self.uploads[0])
+        self.assertIn("media_url", results[1]["errors"])
+        self.assertEqual(results[2]["error"], "User ID does not exist in the database.")
+        self.assertEqual(results[3]["error"], "No uploaded media found for this user.")
+        self.assertEqual(results[4]["user_media"], self.uploads[2])
+
+        saved = dict(CloudMedia.objects.values_list("user_media_id", "media_url"))
+        self.assertEqual(saved, {
+            self.uploads[0]: "https://cdn.example/0.mp4",
+            self.uploads[2]: "https://cdn.example/2.mp4",
+        })
+
+    def test_unknown_job_id_is_not_attached_to_the_latest_upload(self):
+        results = self.save([self.completion(0, job_id="job-unknown"), self.completion(1, job_id=None)])
+
+        self.assertEqual(results[0]["error"], "No upload found for this job.")
+        # Without a job id the latest upload is still the fallback
+        self.assertEqual(results[1]["user_media"], self.uploads[2])
+        self.assertEqual(list(CloudMedia.objects.values_list("user_media_id", flat=True)), [self.uploads[2]])
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        with self.assertNumQueries(7):
+            self.save([self.completion(n) for n in range(3)])
+        # A second round updates the existing rows instead of inserting
+        with self.assertNumQueries(7):
+            self.save([self.completion(n, media_url=f"https://cdn.example/new-{n}.mp4") for n in range(3)])
+        self.assertEqual(CloudMedia.objects.count(), 3)
+        self.assertEqual(CloudMedia.objects.get(user_media_id=self.uploads[1]).media_url, "https://cdn.example/new-1.mp4")
+
+    def test_batch_endpoint_accepts_a_batch_with_bad_entries(self):
+        response = self.client.post(
+            "/api/gan/save-media/batch/",
+            {"completions": [self.completion(0), self.completion(1, media_url=None)]},
+            content_type="application/json",
+            headers={"FastAPI-Secret": "absdfasasdfasf"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["user_media"], self.uploads[0])
+        self.assertIn("media_url", response.json()["results"][1]["errors"])
+
+
+class ConcurrentJobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Read back so the primary key is the stored string, as at login
+        self.user = User.objects.get(pk=User.objects.create(username="alice", email="alice@example.com").pk)
+        self.access_token, _ = generate_jwt(self.user)
+
+    def start_jobs(self, count):
+        """Upload `count` videos back to back; returns the job ids handed to FastAPI, in upload order."""
+        with mock.patch("generation_service.views.send_to_fastapi", return_value=None) as send:
+            for n in range(count):
+                response = self.client.post(
+                    "/api/gan/generate-video/",
+                    {"file": SimpleUploadedFile(f"clip-{n}.mp4", b"video", content_type="video/mp4")},
+                    headers={"Authorization": f"Bearer {self.access_token}"},
+                )
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual(response.json()["job_id"], send.call_args.args[0]["job_id"])
+        return [call.args[0]["job_id"] for call in send.call_args_list]
+
+    def completion(self, job_id):
+        return {"user_id": self.user.id, "job_id": job_id,
+                "media_url": f"https://cdn.example/{job_id}.mp4", "media_type": "video"}
+
+    def assert_attached_to_own_job(self, job_ids):
+        for job_id in job_ids:
+            cloud_media = CloudMedia.objects.get(media_url=f"https://cdn.example/{job_id}.mp4")
+            self.assertEqual(cloud_media.user_media.job_id, job_id)
+
+    def test_callbacks_attach_to_their_own_job(self):
+        job_ids = self.start_jobs(3)
+        self.assertEqual(len(set(job_ids)), 3)
+
+        # Finish out of order: the oldest upload is not the latest one any more
+        for job_id in reversed(job_ids):
+            response = self.client.post("/api/gan/save-media/", self.completion(job_id), content_type="application/json")
+            self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(CloudMedia.objects.count(), 3)
+        self.assert_attached_to_own_job(job_ids)
+
+    def test_callback_for_an_unknown_job_is_refused(self):
+        self.start_jobs(2)
+
+        response = self.client.post("/api/gan/save-media/", self.completion(str(uuid.uuid4())),
+                                    content_type="application/json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("job_id", response.json())
+        self.assertFalse(CloudMedia.objects.exists())
+
+    def test_batched_callbacks_attach_to_their_own_job(self):
+        job_ids = self.start_jobs(4)
+
+        response = self.client.post(
+            "/api/gan/save-media/batch/",
+            {"completions": [self.completion(job_id) for job_id in (job_ids[2], job_ids[0], job_ids[3])]},
+            content_type="application/json",
+            headers={"FastAPI-Secret": "absdfasasdfasf"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CloudMedia.objects.count(), 3)
+        self.assert_attached_to_own_job([job_ids[2], job_ids[0], job_ids[3]])
+        self.assertFalse(CloudMedia.objects.filter(user_media__job_id=job_ids[1]).exists())
+
+
+class UserGalleryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(pk=User.objects.create(username="alice", email="alice@example.com").pk)
+        self.upload = UserMedia.objects.create(user=self.user, file="videos/clip.mp4", job_id="job-0")
+        self.auth = {"Authorization": f"Bearer {generate_jwt(self.user)[0]}"}
+        self.media = [self.add(n) for n in range(5)]
+        # Three entries share a timestamp, so only the id keeps their order stable
+        CloudMedia.objects.filter(id__in=self.media[1:4]).update(uploaded_at=timezone.now())
+
+    def add(self, n):
+        return CloudMedia.objects.create(user_media=self.upload, media_type="video",
+                                         media_url=f"https://cdn.example/{n}.mp4").id
+
+    def gallery(self, headers=None, **params):
+        return self.client.get("/api/gan/gallery/", {"media_type": "video", **params}, headers={**self.auth, **(headers or {})})
+
+    def test_pages_follow_the_cursor_without_gaps_or_repeats(self):
+        expected = list(CloudMedia.objects.order_by("-uploaded_at", "-id").values_list("id", flat=True))
+        seen, cursor, pages = [], None, 0
+        while True:
+            response = self.gallery(page_size=2, **({"cursor": cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.json()), 2)
+            seen += [item["id"] for item in response.json()]
+            pages += 1
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_bad_cursor_or_page_size_is_rejected(self):
+        self.assertEqual(self.gallery(cursor="not-a-cursor").status_code, 400)
+        self.assertEqual(self.gallery(page_size="many").status_code, 400)
+        self.assertEqual(self.client.get("/api/gan/gallery/", headers=self.auth).status_code, 400)
+
+    def test_matching_etag_is_answered_with_304(self):
+        first = self.gallery()
+        etag = first.headers["ETag"]
+
+        response = self.gallery(headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(self.gallery(headers={"If-None-Match": '"stale"'}).status_code, 200)
+
+    def test_saving_or_deleting_media_invalidates_cached_pages(self):
+        etag = self.gallery().headers["ETag"]
+
+        new_id = self.add(5)
+        response = self.gallery(headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["id"], new_id)
+
+        etag = response.headers["ETag"]
+        deleted = self.client.delete("/api/gan/gallery/", {"id": new_id}, content_type="application/json", headers=self.auth)
+        self.assertEqual(deleted.status_code, 200)
+        response = self.gallery(headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(new_id, [item["id"] for item in response.json()])
+
+    def test_invalidation_reads_only_the_owner_id(self):
+        # The insert, then the owner's id; the upload itself is not loaded
+        with self.assertNumQueries(2):
+            CloudMedia.objects.create(user_media_id=self.upload.id, media_type="video", media_url="https://cdn.example/x.mp4")
+        with self.assertNumQueries(1):
+            CloudMedia.objects.create(user_media=self.upload, media_type="video", media_url="https://cdn.example/y.mp4")
+
+
+@override_settings(SPACES_ACCESS_KEY_ID="key", SPACES_SECRET_KEY="secret", SPACES_REGION="us-east-1",
+                   SPACES_ENDPOINT_URL="https://s3.amazonaws.com", SPACES_BUCKET="uploads")
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        # The shared client is built from settings on first use
+        client = mock.patch.object(storage, "_client", None)
+        client.start()
+        self.addCleanup(client.stop)
+        storage.get_client().create_bucket(Bucket="uploads")
+        cache.clear()
+        self.user = User.objects.get(pk=User.objects.create(username="alice", email="alice@example.com").pk)
+        self.auth = {"Authorization": f"Bearer {generate_jwt(self.user)[0]}"}
+
+    def request_upload(self, filename, content_type=""):
+        return self.client.post("/api/gan/upload-url/", {"filename": filename, "content_type": content_type},
+                                headers=self.auth)
+
+    def start_processing(self, media_id):
+        with mock.patch("generation_service.views.send_to_fastapi", return_value=None) as send:
+            response = self.client.post("/api/gan/generate-video/", {"media_id": media_id}, headers=self.auth)
+        return response, send
+
+    def test_issued_url_accepts_the_upload_and_processing_starts(self):
+        response = self.request_upload("holiday.mp4", "video/mp4")
+        self.assertEqual(response.status_code, 200)
+        issued = response.json()
+        self.assertTrue(issued["key"].startswith(f"uploads/{self.user.id}/") and issued["key"].endswith(".mp4"))
+        self.assertEqual(issued["headers"], {"Content-Type": "video/mp4"})
+        self.assertEqual(UserMedia.objects.get(pk=issued["media_id"]).media_type, "video")
+
+        # Not uploaded yet
+        response, send = self.start_processing(issued["media_id"])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(send.called)
+
+        put = requests.put(issued["upload_url"], data=b"video", headers=issued["headers"])
+        self.assertEqual(put.status_code, 200)
+
+        response, send = self.start_processing(issued["media_id"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["job_id"], issued["job_id"])
+        send.assert_called_once_with({"user_id": self.user.id, "object_key": issued["key"],
+                                      "media_type": "video", "job_id": issued["job_id"]})
+
+    def test_content_type_must_match_the_file_extension(self):
+        response = self.request_upload("holiday.mp4", "image/png")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("content_type", response.json())
+        self.assertFalse(UserMedia.objects.exists())
+        self.assertEqual(self.request_upload("notes.txt").status_code, 400)
+
+    def test_upload_of_another_media_type_is_not_processed(self):
+        issued = self.request_upload("photo.png").json()
+        storage.get_client().put_object(Bucket="uploads", Key=issued["key"], Body=b"video", ContentType="video/mp4")
+
+        response, send = self.start_processing(issued["media_id"])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(send.called)
+
+    def test_other_users_cannot_start_an_upload(self):
+        issued = self.request_upload("photo.png").json()
+        other = User.objects.get(pk=User.objects.create(username="bob", email="bob@example.com").pk)
+        self.auth = {"Authorization": f"Bearer {generate_jwt(other)[0]}"}
+
+        response, send = self.start_processing(issued["media_id"])
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(send.called)
@@ -1,12 +1,14 @@
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
-from .views import GenerateVideo,SaveMediaUrl,UserGallery
+from .views import GenerateVideo,DirectUploadURL,SaveMediaUrl,SaveMediaBatch,UserGallery
 
 urlpatterns = [
     #path('upload/', UserMediaUploadView.as_view(), name='upload-media'),
     path("generate-video/", GenerateVideo.as_view(), name="generate_video"),
+    path("upload-url/", DirectUploadURL.as_view(), name="upload_url"),
     path("save-media/",SaveMediaUrl.as_view(),name='save-video'),
+    path("save-media/batch/",SaveMediaBatch.as_view(),name='save-media-batch'),
     path("gallery/",UserGallery.as_view(), name='gallery')
 ]
 
@@ -1,13 +1,21 @@
+from django.conf import settings
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from .models import CloudMedia, UserMedia
-from .serializers import UserMediaSerializer,CloudMediaSerializer
+from .serializers import UserMediaSerializer,CloudMediaSerializer,CloudMediaBatchSerializer,DirectUploadSerializer
+from .storage import direct_uploads_enabled, presigned_upload, uploaded_object
+import mimetypes
 import requests
-from utils.permission import JWTAuth, JWTUtils
+import uuid
+from utils.permission import JWTAuth, JWTUtils, FastAPIAuth
 from user.models import User
 from .models import UserMedia
+from django.core.cache import cache
+from django.db.models import Q
+from .gallery import (DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, GALLERY_CACHE_TTL, gallery_version, gallery_etag,
+                      encode_cursor, decode_cursor)
 
 FASTAPI_URL = "http://127.0.0.1:9000/process-video/"
 
@@ -40,6 +48,43 @@ FASTAPI_URL = "http://127.0.0.1:9000/process-video/"
 FASTAPI_URL = "http://127.0.0.1:9000/process-video/"
 
 
+def send_to_fastapi(data):
+    response = requests.post(FASTAPI_URL, data=data)
+    if response.status_code == 200:
+        return None
+    elif response.status_code in (429, 503):
+        return Response({"error": "Processing service is busy, try again shortly"}, status=response.status_code)
+    else:
+        return Response({"error": "FastAPI processing failed"}, status=500)
+
+
+class DirectUploadURL(APIView):
+    """Issues a presigned PUT so the client uploads straight to object storage"""
+    permission_classes = [JWTAuth]
+
+    def post(self, request):
+        if not direct_uploads_enabled():
+            return Response({"error": "Direct uploads are not configured"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        user_id = JWTUtils.fetch_user_id(request)
+        serializer = DirectUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        job_id = str(uuid.uuid4())
+        media_instance = serializer.save(user_id=user_id, job_id=job_id)
+        content_type = (serializer.validated_data.get("content_type")
+                        or mimetypes.guess_type(serializer.validated_data["filename"])[0]
+                        or "application/octet-stream")
+        return Response({
+            "media_id": media_instance.id,
+            "job_id": job_id,
+            "key": media_instance.file.name,
+            "upload_url": presigned_upload(media_instance.file.name, content_type),
+            "headers": {"Content-Type": content_type},
+        })
+
+
 class GenerateVideo(APIView):
     """Handles media upload and video processing requests"""
     permission_classes = [JWTAuth]
@@ -47,27 +92,63 @@ class GenerateVideo(APIView):
     def post(self, request):
         """
         Handles media upload and sends videos to FastAPI
+
+        Either a multipart `file`, or the `media_id` of a direct upload
+        obtained from the upload-url endpoint and already PUT to storage.
         """
         user_id = JWTUtils.fetch_user_id(request)  # Fetch user ID from JWT
+        media_id = request.data.get("media_id")
+        if media_id and not request.FILES.get("file"):
+            return self.process_direct_upload(user_id, media_id)
+
         file = request.FILES.get("file") 
 
 
         # Save file using serializer
         serializer = UserMediaSerializer(data={"user_id": user_id, "file": file})
         if serializer.is_valid():
-            media_instance = serializer.save()
-            response = requests.post(FASTAPI_URL, data={
+            # The job id links the processed result back to this upload
+            job_id = str(uuid.uuid4())
+            media_instance = serializer.save(job_id=job_id)
+            data = {
                 "user_id": user_id,
                 "media_path": f'http://localhost:8000/api/gan{media_instance.file.url}',
-                "media_type" : media_instance.media_type
-            })
-
-            if response.status_code == 200:
-                return Response({"message": "Video uploaded and sent for processing", "media": serializer.data})
-            else:
-                return Response({"error": "FastAPI processing failed"}, status=500)
+                "media_type" : media_instance.media_type,
+                "job_id": job_id
+            }
+            if settings.SHARED_MEDIA_HANDOFF:
+                # media_path stays as the fallback when the microservice can't open the file
+                data["local_path"] = media_instance.file.path
+            error = send_to_fastapi(data)
+            if error:
+                return error
+            return Response({"message": "Video uploaded and sent for processing", "media": serializer.data, "job_id": job_id})
 
         return Response(serializer.errors, status=400)
+
+    def process_direct_upload(self, user_id, media_id):
+        media_instance = UserMedia.objects.filter(id=media_id, user_id=user_id).first()
+        if not media_instance:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        stored = uploaded_object(media_instance.file.name)
+        if stored is None:
+            return Response({"error": "The file has not been uploaded yet"}, status=400)
+        # The presigned PUT pins the Content-Type, so a mismatch means the wrong file was sent
+        stored_type = stored.get('ContentType', '').split('/')[0]
+        if stored_type in ('image', 'video') and stored_type != media_instance.media_type:
+            return Response({"error": f"The uploaded file is not a {media_instance.media_type}"}, status=400)
+
+        # The microservice reads the object by key, so the bytes never pass through Django
+        error = send_to_fastapi({
+            "user_id": user_id,
+            "object_key": media_instance.file.name,
+            "media_type": media_instance.media_type,
+            "job_id": media_instance.job_id
+        })
+        if error:
+            return error
+        return Response({"message": "Video sent for processing", "media": UserMediaSerializer(media_instance).data,
+                         "job_id": media_instance.job_id})
     
 class SaveMediaUrl(APIView):
     def post(self, request):
@@ -81,6 +162,20 @@ class SaveMediaUrl(APIView):
 
 
 
+class SaveMediaBatch(APIView):
+    """Saves a batch of processing completions sent by the FastAPI service"""
+    permission_classes = [FastAPIAuth]
+
+    def post(self, request):
+        serializer = CloudMediaBatchSerializer(data=request.data)
+
+        if serializer.is_valid():
+            results = serializer.save()
+            return Response({"results": results}, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class UserGallery(APIView):
     authentication_classes = [JWTAuth]
 
@@ -94,11 +189,41 @@ class UserGallery(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        cloud_media_entries = CloudMedia.objects.filter(user_media__user=user, media_type=media_type)
-
-        serializer = CloudMediaSerializer(cloud_media_entries, many=True)
-
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        cursor = request.query_params.get("cursor")
+        try:
+            page_size = min(max(int(request.query_params.get("page_size", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+            position = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return Response({"error": "Invalid cursor or page_size"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The version changes on every save or delete, so the ETag and cache key do too
+        etag = gallery_etag(user, gallery_version(user), media_type, cursor, page_size)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        page = cache.get(f"gallery:{etag}")
+        if page is None:
+            # Keyset pagination: newest first, resuming after the cursor's (uploaded_at, id)
+            cloud_media_entries = CloudMedia.objects.filter(
+                user_media__user=user, media_type=media_type
+            ).order_by('-uploaded_at', '-id')
+            if position:
+                uploaded_at, media_id = position
+                cloud_media_entries = cloud_media_entries.filter(
+                    Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=media_id)
+                )
+            entries = list(cloud_media_entries.only('id', 'media_url', 'media_type', 'uploaded_at')[:page_size + 1])
+            serializer = CloudMediaSerializer(entries[:page_size], many=True)
+            page = {
+                "results": [dict(item) for item in serializer.data],
+                "next_cursor": encode_cursor(entries[page_size - 1]) if len(entries) > page_size else None,
+            }
+            cache.set(f"gallery:{etag}", page, GALLERY_CACHE_TTL)
+
+        if page["next_cursor"]:
+            headers["X-Next-Cursor"] = page["next_cursor"]
+        return Response(page["results"], status=status.HTTP_200_OK, headers=headers)
   
     def delete(self, request):
 
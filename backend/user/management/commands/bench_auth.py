@@ -0,0 +1,44 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from utils.permission import JWTUtils
+from utils.revocation import revoked_tokens
+from utils.utils import generate_jwt
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = "Time the JWT auth path of one request: verify, revocation check, user id and expiry"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20000)
+
+    def time_requests(self, requests, token, reuse_claims):
+        factory = RequestFactory()
+        timings = []
+        for _ in range(requests):
+            request = factory.get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+            started = time.perf_counter()
+            JWTUtils.is_jwt_authenticated(request)
+            for helper in (JWTUtils.fetch_user_id, JWTUtils.fetch_expiry):
+                if not reuse_claims:
+                    # What each helper paid before the claims were cached on the request
+                    request.jwt_claims = None
+                helper(request)
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def handle(self, *args, **options):
+        # Not saved: generate_jwt only reads the id
+        token, _ = generate_jwt(User(id=str(uuid.uuid4())))
+        revoked_tokens._rebuild()
+        for label, reuse_claims in (("decode per helper", False), ("cached claims", True)):
+            self.time_requests(1000, token, reuse_claims)
+            timings = sorted(self.time_requests(options["requests"], token, reuse_claims))
+            self.stdout.write(
+                f"{label:>18}: mean {statistics.mean(timings) * 1e6:.1f} us, "
+                f"p50 {timings[len(timings) // 2] * 1e6:.1f} us, p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} us"
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from user.tasks import cleanup_expired_tokens, PURGE_BATCH_SIZE, PURGE_PAUSE_SECONDS
+
+
+class Command(BaseCommand):
+    help = "Delete expired revoked tokens in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE)
+        parser.add_argument("--pause", type=float, default=PURGE_PAUSE_SECONDS,
+                            help="Seconds to sleep between batches")
+        parser.add_argument("--max-batches", type=int, default=None,
+                            help="Stop after this many batches (default: until done)")
+
+    def handle(self, *args, **options):
+        report = cleanup_expired_tokens(options["batch_size"], options["pause"], options["max_batches"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {report['removed']} tokens in {report['batches']} batches ({report['duration_s']}s)"
+        ))
@@ -26,5 +26,8 @@ class Token(models.Model):
         ]
     user = models.ForeignKey(User,on_delete=models.CASCADE,related_name='user')
     token = models.TextField(null=False)
+    # sha256 of the token; revocation checks look this up instead of the raw text
+    token_hash = models.CharField(max_length=64, unique=True, null=True, blank=True)
     token_type = models.CharField(max_length=20,choices=TOKEN_TYPE_CHOICES,null=False)
-    expiry = models.DateTimeField(default=default_expiry)
+    # Indexed for the expired-token purge
+    expiry = models.DateTimeField(default=default_expiry, db_index=True)
@@ -1,6 +1,41 @@
+import logging
+import time
 from django.utils import timezone
 from .models import Token
 
-def cleanup_expired_tokens():
-    expired_tokens = Token.objects.filter(expiry_time__lt=timezone.now())
-    expired_tokens.delete()
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = 1000
+# Pause between batches so the purge never holds the table for long
+PURGE_PAUSE_SECONDS = 0.05
+
+
+def cleanup_expired_tokens(batch_size=PURGE_BATCH_SIZE, pause=PURGE_PAUSE_SECONDS, max_batches=None):
+    """
+    Delete revoked tokens that have expired anyway, in bounded batches
+
+    Each batch selects ids through the index on `expiry` and deletes them
+    in a short statement of its own, so concurrent logins and logouts are
+    never blocked behind one large delete.
+
+    Returns a dict with the rows removed, batches run and duration.
+    """
+    started = time.monotonic()
+    cutoff = timezone.now()
+    removed = batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(
+            Token.objects.filter(expiry__lt=cutoff).order_by('expiry').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        deleted, _ = Token.objects.filter(id__in=ids).delete()
+        removed += deleted
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+
+    report = {"removed": removed, "batches": batches, "duration_s": round(time.monotonic() - started, 3)}
+    logger.info("Expired token purge: %s", report)
+    return report
@@ -1,3 +1,176 @@
+from datetime import timedelta
+from unittest import mock
+
+import jwt
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ganaura_backend.settings import SECRET_KEY
+from utils.revocation import RevocationSet, REBUILD_SECONDS, revoked_tokens, token_digest
+from utils.types import TokenType
+from utils.utils import format_time, generate_jwt, get_utc_time
+from .models import Token, User
+from .tasks import cleanup_expired_tokens
+
+
+class RevocationSetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="alice", email="alice@example.com")
+        self.revocations = RevocationSet()
+
+    def revoke(self, token, hashed=True):
+        return Token.objects.create(user=self.user, token=token, token_type=TokenType.ACCESS,
+                                    token_hash=token_digest(token) if hashed else None)
+
+    def test_rebuild_reads_raw_tokens_only_for_rows_without_a_digest(self):
+        self.revoke("hashed")
+        self.revoke("legacy", hashed=False)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.revocations._rebuild()
+
+        self.assertIn(token_digest("hashed"), self.revocations._filter)
+        self.assertIn(token_digest("legacy"), self.revocations._filter)
+        raw_reads = [query["sql"] for query in queries if '"user_token"."token",' in query["sql"]
+                     or '"user_token"."token" FROM' in query["sql"]]
+        self.assertTrue(raw_reads)
+        self.assertTrue(all('"token_hash" IS NULL' in sql for sql in raw_reads))
+
+    def test_checks_do_not_wait_for_a_rebuild(self):
+        self.revoke("revoked")
+        with mock.patch.object(RevocationSet, "_start_rebuild") as start_rebuild:
+            # No filter yet: answered from the table while the first one is built
+            self.assertTrue(self.revocations.is_revoked("revoked"))
+            self.assertFalse(self.revocations.is_revoked("valid"))
+            self.assertTrue(start_rebuild.called)
+
+            self.revocations._rebuild()
+            stale = self.revocations._filter
+            self.revocations._built_at -= REBUILD_SECONDS + 1
+            start_rebuild.reset_mock()
+            # A due rebuild is handed off and the current filter keeps serving
+            self.assertIs(self.revocations._sync(), stale)
+            start_rebuild.assert_called_once()
+
+    def test_token_revoked_elsewhere_after_a_negative_check_is_rejected(self):
+        with mock.patch.object(RevocationSet, "_start_rebuild"):
+            self.assertFalse(self.revocations.is_revoked("stolen"))
+            # Logged out through another worker, whose cache this one does not share
+            self.revoke("stolen")
+            self.assertTrue(self.revocations.is_revoked("stolen"))
+
+    def test_revocations_made_after_a_rebuild_are_seen(self):
+        self.revocations._rebuild()
+        self.revocations.revoke("late", self.user, TokenType.ACCESS, timezone.now() + timedelta(days=1))
+        self.assertTrue(self.revocations.is_revoked("late"))
+        self.assertFalse(self.revocations.is_revoked("other"))
+
+
+class CleanupExpiredTokensTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="alice", email="alice@example.com")
+        now = timezone.now()
+        self.expired = [self.token(f"expired-{n}", now - timedelta(hours=n + 1)) for n in range(7)]
+        self.valid = [self.token(f"valid-{n}", now + timedelta(hours=n + 1)) for n in range(3)]
+
+    def token(self, value, expiry):
+        return Token.objects.create(user=self.user, token=value, token_type=TokenType.REFRESH,
+                                    token_hash=token_digest(value), expiry=expiry).id
+
+    def remaining(self):
+        return set(Token.objects.values_list("id", flat=True))
+
+    def test_removes_only_expired_tokens_in_batches(self):
+        report = cleanup_expired_tokens(batch_size=3, pause=0)
+
+        self.assertEqual((report["removed"], report["batches"]), (7, 3))
+        self.assertEqual(self.remaining(), set(self.valid))
+
+    def test_max_batches_leaves_the_rest_for_the_next_run(self):
+        report = cleanup_expired_tokens(batch_size=3, pause=0, max_batches=2)
+
+        self.assertEqual((report["removed"], report["batches"]), (6, 2))
+        # Oldest first, so the most recently expired token is the one left
+        self.assertEqual(self.remaining(), set(self.valid) | {self.expired[0]})
+
+        report = cleanup_expired_tokens(batch_size=3, pause=0)
+        self.assertEqual((report["removed"], report["batches"]), (1, 1))
+        self.assertEqual(self.remaining(), set(self.valid))
+
+    def test_nothing_to_remove(self):
+        Token.objects.filter(id__in=self.expired).delete()
+
+        report = cleanup_expired_tokens(batch_size=3, pause=0)
+
+        self.assertEqual((report["removed"], report["batches"]), (0, 0))
+        self.assertEqual(self.remaining(), set(self.valid))
+
+
+@mock.patch.object(RevocationSet, "_start_rebuild")
+class JWTAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(pk=User.objects.create(username="alice", email="alice@example.com").pk)
+        self.access_token, _ = generate_jwt(self.user)
+
+    def bearer(self, token):
+        return {"Authorization": f"Bearer {token}"}
+
+    def gallery(self, token):
+        return self.client.get("/api/gan/gallery/", {"media_type": "image"}, headers=self.bearer(token))
+
+    def count_decodes(self, send):
+        with mock.patch("utils.permission.jwt.decode", wraps=jwt.decode) as decode:
+            response = send()
+        return response, decode.call_count
+
+    def test_claims_are_decoded_once_per_request(self, start_rebuild):
+        # Authentication class, then the view's fetch_user_id
+        response, decodes = self.count_decodes(lambda: self.gallery(self.access_token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(decodes, 1)
+
+        # Permission class, then the view's fetch_user_id
+        response, decodes = self.count_decodes(lambda: self.client.post(
+            "/api/gan/generate-video/", {"media_id": "missing"}, headers=self.bearer(self.access_token)))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(decodes, 1)
+
+        # Each request verifies its own token
+        _, decodes = self.count_decodes(lambda: [self.gallery(self.access_token) for _ in range(3)])
+        self.assertEqual(decodes, 3)
+
+    def test_expired_token_is_refused(self, start_rebuild):
+        expired = jwt.encode({"id": self.user.id, "tokenType": "access",
+                              "expiry": str(format_time(get_utc_time() - timedelta(seconds=1)))},
+                             SECRET_KEY, algorithm="HS256")
+
+        self.assertEqual(self.gallery(expired).status_code, 401)
+        self.assertEqual(self.client.post("/api/gan/upload-url/", headers=self.bearer(expired)).status_code, 403)
+
+    def test_revoked_token_is_refused(self, start_rebuild):
+        self.assertEqual(self.gallery(self.access_token).status_code, 200)
+
+        revoked_tokens.revoke(self.access_token, self.user, TokenType.ACCESS, timezone.now() + timedelta(hours=3))
+
+        self.assertEqual(self.gallery(self.access_token).status_code, 401)
+        self.assertEqual(self.client.post("/api/gan/upload-url/", headers=self.bearer(self.access_token)).status_code, 403)
+
+    def test_tampered_or_missing_token_is_refused(self, start_rebuild):
+        self.assertEqual(self.gallery(self.access_token[:-2] + "xx").status_code, 401)
+        self.assertEqual(self.client.get("/api/gan/gallery/", {"media_type": "image"}).status_code, 401)
+
+    def test_user_token_does_not_open_service_endpoints(self, start_rebuild):
+        batch = {"completions": [{"user_id": self.user.id, "media_url": "https://cdn.example/a.png", "media_type": "image"}]}
+
+        response = self.client.post("/api/gan/save-media/batch/", batch, content_type="application/json",
+                                    headers=self.bearer(self.access_token))
+        self.assertEqual(response.status_code, 403)
 
-# Create your tests here.
+        response = self.client.post("/api/gan/save-media/batch/", batch, content_type="application/json",
+                                    headers={**self.bearer(self.access_token), "FastAPI-Secret": "absdfasasdfasf"})
+        self.assertEqual(response.status_code, 200)
@@ -8,9 +8,10 @@ from rest_framework.views import APIView
 from rest_framework.authentication import get_authorization_header
 from utils.utils import get_utc_time,generate_jwt,format_time,mark_token_expired,get_refresh_expiry
 from utils.permission import JWTUtils
+from utils.revocation import revoked_tokens
 from utils.response import CustomResponse
 from utils.types import TokenType
-from .models import User,Token
+from .models import User
 from .serializers import UserCUDSerializer
 from ganaura_backend.settings import SECRET_KEY
 
@@ -84,8 +85,7 @@ class GetAcessToken(APIView):
     def post(self,request):
         refresh_token = request.data.get('refreshToken')
         
-        existing_token = Token.objects.filter(token=refresh_token).first()
-        if existing_token:
+        if not refresh_token or revoked_tokens.is_revoked(refresh_token):
             return CustomResponse(message="Invalid or expired refresh token").get_unauthorized_response()
     
         try:
@@ -1,25 +1,46 @@
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 import jwt
-from rest_framework import authentication
 from rest_framework.authentication import get_authorization_header
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import BasePermission
 from ganaura_backend.settings import SECRET_KEY
 from .exception import UnauthorizedAccessException
-from .utils import get_utc_time
-from user.models import Token
+from .revocation import revoked_tokens
 
 def format_time(date_time):
     formatted_time = date_time.strftime("%Y-%m-%d %H:%M:%S%z")
     return datetime.strptime(formatted_time, "%Y-%m-%d %H:%M:%S%z")
 
 
+class JWTClaims:
+    """Verified JWT payload, parsed once and attached to the request."""
+
+    __slots__ = ("token", "payload", "user_id", "expiry", "token_type")
+
+    def __init__(self, token, payload):
+        self.token = token
+        self.payload = payload
+        self.user_id = payload.get("id")
+        self.token_type = payload.get("tokenType")
+        expiry = payload.get("expiry")
+        # Epoch seconds, so per-request checks are a float comparison
+        self.expiry = datetime.strptime(expiry, "%Y-%m-%d %H:%M:%S%z").timestamp() if expiry else None
+
+    @property
+    def expiry_datetime(self):
+        return datetime.fromtimestamp(self.expiry, tz=timezone.utc) if self.expiry is not None else None
+
+
 class JWTAuth(BasePermission):
     token_prefix = "Bearer"
 
     def authenticate(self, request):
         return JWTUtils.is_jwt_authenticated(request)
 
+    def has_permission(self, request, view):
+        return JWTUtils.is_logged_in(request)
+
     def authenticate_header(self, request):
         return f'{self.token_prefix} realm="api"'
     
@@ -38,13 +59,36 @@ class FastAPIAuth(BasePermission):
         return True
     
 class JWTUtils:
+    @staticmethod
+    def get_claims(request):
+        """
+        Verify the request's bearer token once and cache the claims on the request
+
+        Raises the usual jwt exceptions, or UnauthorizedAccessException when
+        the header is missing or malformed.
+        """
+        # DRF's Request wraps the HttpRequest; cache on the inner one so both see it
+        raw_request = getattr(request, "_request", request)
+        claims = getattr(raw_request, "jwt_claims", None)
+        if claims is not None:
+            return claims
+
+        token_prefix = "Bearer"
+        auth_header = get_authorization_header(request).decode("utf-8")
+        if not auth_header or not auth_header.startswith(token_prefix):
+            raise UnauthorizedAccessException("Invalid token header")
+        token = auth_header[len(token_prefix):].strip()
+        if not token:
+            raise UnauthorizedAccessException("Empty Token")
+
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"], verify=True)
+        claims = JWTClaims(token, payload)
+        raw_request.jwt_claims = claims
+        return claims
+
     @staticmethod
     def fetch_user_id(request):
-        token = authentication.get_authorization_header(request).decode("utf-8").split()
-        payload = jwt.decode(
-            token[1], SECRET_KEY, algorithms=["HS256"], verify=True
-        )
-        user_id = payload.get("id")
+        user_id = JWTUtils.get_claims(request).user_id
         if user_id is None:
             raise Exception(
                 "The corresponding JWT token does not contain the 'user_id' key"
@@ -65,11 +109,7 @@ class JWTUtils:
 
     @staticmethod
     def fetch_expiry(request):
-        token = authentication.get_authorization_header(request).decode("utf-8").split()
-        payload = jwt.decode(
-            token[1], SECRET_KEY, algorithms=["HS256"], verify=True
-        )
-        expiry = datetime.strptime(payload.get("expiry"), "%Y-%m-%d %H:%M:%S%z")
+        expiry = JWTUtils.get_claims(request).expiry_datetime
         if expiry is None:
             raise Exception(
                 "The corresponding JWT token does not contain the 'expiry' key"
@@ -78,28 +118,15 @@ class JWTUtils:
         
     @staticmethod
     def is_jwt_authenticated(request):
-        token_prefix = "Bearer"
         try:
-            auth_header = get_authorization_header(request).decode("utf-8")
-            if not auth_header or not auth_header.startswith(token_prefix):
-                raise UnauthorizedAccessException("Invalid token header")
-
-            token = auth_header[len(token_prefix):].strip()
-            existing_token = Token.objects.filter(token=token).first()
-            if existing_token:
+            claims = JWTUtils.get_claims(request)
+            if revoked_tokens.is_revoked(claims.token):
                 raise UnauthorizedAccessException("Expired Token")
-            if not token:
-                raise UnauthorizedAccessException("Empty Token")
-            
-            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"], verify=True)
-
-            user_id = payload.get("id")
-            expiry = datetime.strptime(payload.get("expiry"), "%Y-%m-%d %H:%M:%S%z")
 
-            if not user_id or expiry < get_utc_time():
+            if not claims.user_id or claims.expiry is None or claims.expiry < time.time():
                 raise UnauthorizedAccessException("Token Expired or Invalid")
 
-            return None, payload
+            return None, claims.payload
         except jwt.exceptions.InvalidSignatureError as e:
             raise UnauthorizedAccessException(
                 {
@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from user.models import Token
+
+logger = logging.getLogger(__name__)
+
+HIGH_WATER_KEY = "revoked-tokens:high-water"
+# Upper bound on how stale a worker's view is when the cache is not shared between workers
+REFRESH_SECONDS = 5
+# Full rebuilds drop tokens purged from the table since the filter was built
+REBUILD_SECONDS = 3600
+FALSE_POSITIVE_RATE = 0.001
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = max(capacity, 1024)
+        self.size = int(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8 + 1)
+        self.count = 0
+
+    def _positions(self, digest):
+        # The digest is already uniform, so double hashing over two halves is enough
+        raw = bytes.fromhex(digest)
+        a, b = int.from_bytes(raw[:8], "big"), int.from_bytes(raw[8:16], "big") | 1
+        return [(a + i * b) % self.size for i in range(self.hashes)]
+
+    def add(self, digest):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class RevocationSet:
+    """
+    Answers "is this token revoked?" without a table scan per request.
+
+    Each worker keeps a Bloom filter of revoked token digests, loaded
+    incrementally by primary key. Most tokens are not revoked and are
+    accepted from the filter alone; a hit is confirmed through the
+    Django cache and, failing that, an indexed lookup on the digest.
+    Revocations publish the newest row id through the cache so other
+    workers catch up on their next check. Full rebuilds run on a
+    background thread while the previous filter keeps serving.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_id = 0
+        self._refreshed_at = 0
+        self._built_at = 0
+        self._rebuilding = False
+
+    @staticmethod
+    def _scan(bloom, since):
+        """Add revoked tokens with an id above `since` to `bloom`; returns the highest id seen."""
+        last_id = since
+        rows = Token.objects.filter(id__gt=since)
+        for row_id, digest in rows.filter(token_hash__isnull=False).values_list(
+            'id', 'token_hash'
+        ).iterator(chunk_size=10000):
+            bloom.add(digest)
+            last_id = max(last_id, row_id)
+        # Rows written before digests were stored only have the raw token
+        for row_id, token in rows.filter(token_hash__isnull=True).values_list(
+            'id', 'token'
+        ).iterator(chunk_size=10000):
+            bloom.add(token_digest(token))
+            last_id = max(last_id, row_id)
+        return last_id
+
+    def _rebuild(self):
+        try:
+            bloom = BloomFilter(Token.objects.count() * 2)
+            last_id = self._scan(bloom, 0)
+            with self._lock:
+                # Pick up revocations made during the scan, then swap the new filter in
+                self._last_id = self._scan(bloom, last_id)
+                self._filter = bloom
+                self._built_at = self._refreshed_at = time.monotonic()
+        except Exception:
+            logger.exception("Revocation filter rebuild failed")
+        finally:
+            self._rebuilding = False
+
+    def _rebuild_in_background(self):
+        try:
+            self._rebuild()
+        finally:
+            # The thread opened its own database connection
+            connection.close()
+
+    def _start_rebuild(self):
+        if not self._rebuilding:
+            self._rebuilding = True
+            threading.Thread(target=self._rebuild_in_background, name="revocation-rebuild", daemon=True).start()
+
+    def _load(self):
+        self._last_id = self._scan(self._filter, self._last_id)
+        self._refreshed_at = time.monotonic()
+
+    def _sync(self):
+        """Return the filter to check against, or None while the first one is being built."""
+        now = time.monotonic()
+        with self._lock:
+            if (self._filter is None or now - self._built_at > REBUILD_SECONDS
+                    or self._filter.count > self._filter.capacity):
+                self._start_rebuild()
+            if self._filter is not None and (cache.get(HIGH_WATER_KEY, 0) > self._last_id
+                                             or now - self._refreshed_at > REFRESH_SECONDS):
+                self._load()
+            return self._filter
+
+    def is_revoked(self, token):
+        digest = token_digest(token)
+        bloom = self._sync()
+        if bloom is not None and digest not in bloom:
+            return False
+        cached = cache.get(f"revoked-token:{digest}")
+        if cached is not None:
+            return cached
+        # Rows written before digests were stored only have the raw token
+        revoked = Token.objects.filter(Q(token_hash=digest) | Q(token_hash__isnull=True, token=token)).exists()
+        # Only revocations are cached: a token revoked on another worker must not
+        # keep passing on this one because "not revoked" was remembered here
+        if revoked:
+            cache.set(f"revoked-token:{digest}", True, 3600)
+        return revoked
+
+    def revoke(self, token, user, token_type, expiry):
+        digest = token_digest(token)
+        instance, _ = Token.objects.get_or_create(
+            token_hash=digest, defaults={"user": user, "token": token, "token_type": token_type, "expiry": expiry}
+        )
+        cache.set(f"revoked-token:{digest}", True, 3600)
+        cache.set(HIGH_WATER_KEY, max(cache.get(HIGH_WATER_KEY, 0), instance.id), None)
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(digest)
+        return instance
+
+
+revoked_tokens = RevocationSet()
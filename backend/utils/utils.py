@@ -2,7 +2,7 @@ import jwt
 import pytz
 from datetime import datetime, timedelta
 from .types import TokenType
-from user.models import Token
+from .revocation import revoked_tokens
 from ganaura_backend.settings import SECRET_KEY
 
 def format_time(date_time):
@@ -60,7 +60,7 @@ def get_refresh_expiry(token):
 
     
 def mark_token_expired(token,user,token_type,expiry):
-    Token.objects.create(user=user,token=token,token_type=token_type,expiry=expiry)
+    return revoked_tokens.revoke(token,user,token_type,expiry)
     
 def sort_nested_list(data):
     for key, value in data.items():
@@ -5,6 +5,7 @@ import ProfileSidebar from '../Home/ProfileSidebar';
 import './Home.css';
 import './DropdownMenu.css';
 import { toast } from 'react-hot-toast';
+import axios from 'axios';
 import api from '../../api/api';
 
 const Home: React.FC = () => {
@@ -63,19 +64,31 @@ const Home: React.FC = () => {
     }
   };
 
+  // Upload straight to object storage when the backend offers a presigned URL,
+  // otherwise send the file through Django as before
+  const uploadAndGenerate = async (file: File) => {
+    let upload;
+    try {
+      upload = await api.post("/api/gan/upload-url/", { filename: file.name, content_type: file.type });
+    } catch {
+      const formData = new FormData();
+      formData.append("file", file);
+      return api.post("/api/gan/generate-video/", formData);
+    }
+    await axios.put(upload.data.upload_url, file, { headers: upload.data.headers });
+    return api.post("/api/gan/generate-video/", { media_id: upload.data.media_id });
+  };
+
   const handleFileChange = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
     if (!file) return; // Exit if no file is selected
 
-    const formData = new FormData();
-    formData.append("file", file);
-
     setProgress(0);
     setIsUploading(true);
 
     try {
       const response = await toast.promise(
-        api.post("/api/gan/generate-video/", formData),
+        uploadAndGenerate(file),
         {
           loading: "Processing your file...",
           success: "File processed successfully!",
@@ -30,6 +30,20 @@ const Profile: React.FC<ProfileSidebarProps> = ({ isOpen, onClose, onLogout, use
   const [loading, setLoading] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
 
+  // The gallery is paginated; follow X-Next-Cursor until the last page
+  const fetchGallery = async (mediaType: 'image' | 'video') => {
+    const items: any[] = [];
+    let cursor: string | undefined;
+    do {
+      const response = await api.get('/api/gan/gallery', {
+        params: { media_type: mediaType, ...(cursor ? { cursor } : {}) },
+      });
+      items.push(...response.data);
+      cursor = response.headers['x-next-cursor'];
+    } while (cursor);
+    return items;
+  };
+
   // Fetch images and videos from the API
   useEffect(() => {
     const fetchMedia = async () => {
@@ -38,8 +52,8 @@ const Profile: React.FC<ProfileSidebarProps> = ({ isOpen, onClose, onLogout, use
 
       try {
         // Fetch images
-        const imageResponse = await api.get('/api/gan/gallery?media_type=image');
-        const images = imageResponse.data.map((item: any) => ({
+        const imageItems = await fetchGallery('image');
+        const images = imageItems.map((item: any) => ({
           id: item.id.toString(),
           url: item.media_url,
           media_type: item.media_type,
@@ -48,8 +62,8 @@ const Profile: React.FC<ProfileSidebarProps> = ({ isOpen, onClose, onLogout, use
         setUserImages(images);
 
         // Fetch videos
-        const videoResponse = await api.get('/api/gan/gallery?media_type=video');
-        const videos = videoResponse.data.map((item: any) => ({
+        const videoItems = await fetchGallery('video');
+        const videos = videoItems.map((item: any) => ({
           id: item.id.toString(),
           url: item.media_url,
           media_type: item.media_type,
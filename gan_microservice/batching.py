@@ -0,0 +1,108 @@
+# batching.py
+import asyncio
+import os
+import time
+import weakref
+
+import numpy as np
+
+from executor import run_blocking
+
+BATCH_MAX_LATENCY_MS = float(os.getenv("BATCH_MAX_LATENCY_MS", "10"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+
+
+class BatchScheduler:
+    def __init__(self, session, max_latency_ms=BATCH_MAX_LATENCY_MS, max_batch=BATCH_MAX_SIZE):
+        """
+        Dynamic micro-batcher in front of one ONNX session
+
+        Tensors submitted through `infer` are grouped by their padded shape
+        (the `to_8s` size), held for at most `max_latency_ms` or until
+        `max_batch` are waiting, then run as a single batched `session.run`.
+        Each caller gets back its own slice of the output.
+
+        Args:
+            session: ONNX Runtime inference session
+            max_latency_ms (float): Longest time a tensor waits for company
+            max_batch (int): Largest batch sent to the session
+        """
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.max_latency = max_latency_ms / 1000
+        batch_dim = session.get_inputs()[0].shape[0]
+        # Models exported with a fixed batch of 1 can't be batched
+        self.max_batch = 1 if isinstance(batch_dim, int) and batch_dim == 1 else max(1, max_batch)
+        self._pending = {}
+        self._timers = {}
+        self.batches = 0
+        self.items = 0
+        self.run_time = 0.0
+
+    async def infer(self, tensor):
+        """Run `tensor` of shape (1, H, W, C) through the generator, returning (1, H, W, C)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        bucket = tensor.shape[1:]
+        self._pending.setdefault(bucket, []).append((tensor, future))
+
+        if len(self._pending[bucket]) >= self.max_batch:
+            self._flush(bucket)
+        elif bucket not in self._timers:
+            self._timers[bucket] = loop.call_later(self.max_latency, self._flush, bucket)
+        return await future
+
+    def _flush(self, bucket):
+        timer = self._timers.pop(bucket, None)
+        if timer:
+            timer.cancel()
+        pending = self._pending.pop(bucket, [])
+        if pending:
+            asyncio.ensure_future(self._run(pending))
+
+    async def _run(self, pending):
+        batch = np.concatenate([tensor for tensor, _ in pending], axis=0)
+        start = time.perf_counter()
+        try:
+            outputs = await run_blocking(self.session.run, None, {self.input_name: batch})
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.run_time += time.perf_counter() - start
+        self.batches += 1
+        self.items += len(pending)
+
+        for i, (_, future) in enumerate(pending):
+            if not future.done():
+                future.set_result(outputs[0][i:i + 1])
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "max_latency_ms": self.max_latency * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "run_time_ms": round(self.run_time * 1000, 1),
+            "waiting": sum(len(p) for p in self._pending.values()),
+        }
+
+
+# The scheduler lives on the session itself so a session evicted from the
+# registry is collected together with its scheduler.
+_schedulers = weakref.WeakSet()
+
+
+def get_scheduler(session):
+    """Return the batch scheduler attached to `session`, creating it on first use."""
+    scheduler = getattr(session, "_batch_scheduler", None)
+    if scheduler is None:
+        scheduler = session._batch_scheduler = BatchScheduler(session)
+        _schedulers.add(scheduler)
+    return scheduler
+
+
+def batching_stats():
+    return [scheduler.stats() for scheduler in list(_schedulers)]
@@ -0,0 +1,93 @@
+# bench_batching.py
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from batching import BatchScheduler, BATCH_MAX_LATENCY_MS
+from executor import run_blocking
+from session_registry import get_session, DEFAULT_MODEL_PATH
+
+
+class SyntheticSession:
+    """
+    Stand-in generator whose run time is a fixed cost per call plus a cost per image
+
+    Sleeping releases the GIL the way ONNX Runtime does, so the scheduler
+    and executor see the same concurrency as with the real model.
+    """
+
+    def __init__(self, call_ms, item_ms):
+        self.call_s = call_ms / 1000
+        self.item_s = item_ms / 1000
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input", shape=["batch", "height", "width", 3])]
+
+    def run(self, outputs, feeds):
+        batch = feeds["input"]
+        time.sleep(self.call_s + self.item_s * len(batch))
+        return [batch]
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+async def load(scheduler, tensor, concurrency, requests):
+    """Run `concurrency` clients that each send `requests` images back to back; returns latencies and wall time."""
+    latencies = []
+
+    async def client():
+        for _ in range(requests):
+            started = time.perf_counter()
+            await scheduler.infer(tensor)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+async def main(args):
+    if args.synthetic:
+        session = SyntheticSession(args.call_ms, args.item_ms)
+    else:
+        session = await run_blocking(get_session, args.model, args.device)
+    tensor = np.random.default_rng(0).uniform(-1, 1, (1, args.size, args.size, 3)).astype(np.float32)
+
+    report = []
+    for max_batch in args.max_batch:
+        for concurrency in args.concurrency:
+            scheduler = BatchScheduler(session, max_latency_ms=args.max_latency_ms, max_batch=max_batch)
+            # Warm up so one-off allocations don't land in the first measurement
+            await load(scheduler, tensor, min(concurrency, max_batch), 1)
+            scheduler = BatchScheduler(session, max_latency_ms=args.max_latency_ms, max_batch=max_batch)
+            latencies, elapsed = await load(scheduler, tensor, concurrency, args.requests)
+            report.append({
+                "max_batch": scheduler.max_batch,
+                "concurrency": concurrency,
+                "images_per_s": round(len(latencies) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 50), 1),
+                "p99_ms": round(percentile(latencies, 99), 1),
+                "avg_batch_size": round(scheduler.stats()["avg_batch_size"], 2),
+            })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and p99 latency of the batch scheduler under concurrent load")
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL_PATH, help="Path to the generator")
+    parser.add_argument("--device", type=str, default="cpu", help="'gpu' or 'cpu'")
+    parser.add_argument("--size", type=int, default=256, help="Edge of the square test image (a to_8s size)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32], help="Simultaneous clients")
+    parser.add_argument("--requests", type=int, default=20, help="Images each client sends")
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[1, 4, 8], help="Scheduler batch limits to compare")
+    parser.add_argument("--max-latency-ms", type=float, default=BATCH_MAX_LATENCY_MS, help="Scheduler wait budget")
+    parser.add_argument("--synthetic", action="store_true", help="Use a stand-in session instead of the model")
+    parser.add_argument("--call-ms", type=float, default=20, help="Synthetic cost of one session.run")
+    parser.add_argument("--item-ms", type=float, default=5, help="Synthetic cost of each image in a batch")
+    asyncio.run(main(parser.parse_args()))
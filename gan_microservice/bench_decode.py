@@ -0,0 +1,49 @@
+# bench_decode.py
+import argparse
+import json
+import time
+
+from video_processing import Videocap
+
+
+def decode(video_path, decoder, batch_size, max_frames):
+    """Decode and preprocess frames as the video pipeline does; returns (decoder used, frames, seconds)."""
+    vid = Videocap(video_path, "generator", 1280, False, decoder)
+    frames = 0
+    started = time.perf_counter()
+    try:
+        for batch in vid.batches(batch_size, vid.frames(batch_size * 2)):
+            vid.preprocess(batch)
+            frames += len(batch)
+            if frames >= max_frames:
+                break
+    finally:
+        vid.close()
+    return vid.decoder, frames, time.perf_counter() - started
+
+
+def main(args):
+    report = []
+    for decoder in args.decoders:
+        best = None
+        for _ in range(args.repeat):
+            used, frames, elapsed = decode(args.video, decoder, args.batch_size, args.max_frames)
+            best = elapsed if best is None else min(best, elapsed)
+        report.append({
+            "decoder": decoder,
+            # Videocap falls back to OpenCV when ffmpeg is missing
+            "used": used,
+            "frames": frames,
+            "fps": round(frames / best, 2) if best else 0.0,
+        })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode and preprocess frames per second for each video decoder")
+    parser.add_argument("video", type=str, help="Sample input video")
+    parser.add_argument("--decoders", type=str, nargs="+", default=["opencv", "ffmpeg"], help="Backends to compare")
+    parser.add_argument("--batch-size", type=int, default=4, help="Frames preprocessed together")
+    parser.add_argument("--max-frames", type=int, default=1000, help="Stop after this many frames")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per decoder; the fastest is reported")
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+# bench_event_loop.py
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import aiohttp
+import cv2
+import jwt
+import numpy as np
+
+from utils import SECRET_KEY
+
+
+def random_jpeg(rng, size):
+    """Noise photo; every request gets new pixels so the result cache never answers it."""
+    ok, data = cv2.imencode(".jpg", rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+    return data.tobytes()
+
+
+def summary(latencies):
+    if not latencies:
+        return {}
+    return {
+        "samples": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+async def probe_http(session, url, stop, interval):
+    """Time GET /metrics/executor/, which only the event loop serves."""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        async with session.get(f"{url}/metrics/executor/") as response:
+            await response.read()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def probe_websocket(session, url, token, stop, interval):
+    """Round trip of WebSocket ping/pong on the progress socket."""
+    latencies = []
+    ws_url = url.replace("http", "ws", 1) + f"/ws/progress/?token={token}"
+    async with session.ws_connect(ws_url, autoping=False) as ws:
+        while not stop.is_set():
+            started = time.perf_counter()
+            await ws.ping()
+            message = await ws.receive(timeout=30)
+            if message.type != aiohttp.WSMsgType.PONG:
+                raise RuntimeError(f"Expected a pong, got {message.type}")
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(interval)
+    return latencies
+
+
+async def flood(session, url, user_id, stop, size, statuses, seed):
+    rng = np.random.default_rng(seed)
+    while not stop.is_set():
+        form = aiohttp.FormData()
+        form.add_field("user_id", user_id)
+        form.add_field("image", random_jpeg(rng, size), filename="bench.jpg", content_type="image/jpeg")
+        try:
+            async with session.post(f"{url}/process-single-image/", data=form) as response:
+                await response.read()
+                statuses[response.status] += 1
+                if response.status in (429, 503):
+                    # Honour the backpressure instead of hammering the service
+                    await asyncio.sleep(float(response.headers.get("Retry-After", "1")) / 10)
+        except aiohttp.ClientError as e:
+            statuses[type(e).__name__] += 1
+
+
+async def measure(args, session, token, clients):
+    stop = asyncio.Event()
+    statuses = Counter()
+    probes = [probe_http(session, args.url, stop, args.interval)]
+    if token:
+        probes.append(probe_websocket(session, args.url, token, stop, args.interval))
+    load = [asyncio.ensure_future(flood(session, args.url, args.user_id, stop, args.size, statuses, seed))
+            for seed in range(clients)]
+    running = asyncio.gather(*probes)
+    await asyncio.sleep(args.duration)
+    stop.set()
+    results = await running
+    await asyncio.gather(*load)
+    report = {"clients": clients, "http_probe": summary(results[0]), "responses": dict(statuses)}
+    if token:
+        report["websocket_ping"] = summary(results[1])
+    return report
+
+
+async def main(args):
+    token = args.token
+    if token is None and not args.no_websocket:
+        token = jwt.encode({"id": args.user_id}, SECRET_KEY, algorithm="HS256")
+    async with aiohttp.ClientSession() as session:
+        report = [await measure(args, session, token, clients) for clients in [0] + args.clients]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event loop responsiveness of a running service under image load")
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:9000", help="Base URL of the service")
+    parser.add_argument("--user-id", type=str, default="bench", help="User the load is sent as")
+    parser.add_argument("--token", type=str, default=None, help="JWT for the progress socket (default: signed for --user-id)")
+    parser.add_argument("--no-websocket", action="store_true", help="Only probe over HTTP")
+    parser.add_argument("--clients", type=int, nargs="+", default=[8, 32, 128], help="Concurrent uploaders per run")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per run")
+    parser.add_argument("--interval", type=float, default=0.05, help="Pause between probes")
+    parser.add_argument("--size", type=int, default=1024, help="Edge of the uploaded images")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+# bench_tiling.py
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+
+from batching import get_scheduler
+from bench_batching import SyntheticSession
+from executor import run_blocking
+from session_registry import get_session, DEFAULT_MODEL_PATH
+from tiling import infer_tiled, tile_memory, TILE_SIZE, TILE_OVERLAP
+
+SIZES = {"4k": (2160, 3840), "8k": (4320, 7680)}
+
+
+class ActivationSession(SyntheticSession):
+    """Synthetic session that also holds the activation memory `tile_memory` estimates for its input."""
+
+    def run(self, outputs, feeds):
+        batch = feeds["input"]
+        edge = int((batch.shape[1] * batch.shape[2]) ** 0.5)
+        activations = np.ones(tile_memory(edge) * len(batch) // 4, dtype=np.float32)
+        try:
+            return super().run(outputs, feeds)
+        finally:
+            del activations
+
+
+async def run_case(args, size, mode):
+    if args.synthetic:
+        session = ActivationSession(args.call_ms, args.item_ms)
+    else:
+        session = await run_blocking(get_session, args.model, args.device)
+    height, width = SIZES[size]
+    image = np.random.default_rng(0).uniform(-1, 1, (1, height, width, 3)).astype(np.float32)
+    scheduler = get_scheduler(session)
+    # Memory already in use before inference, so the report shows what inference added
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if mode == "tiled":
+        await infer_tiled(scheduler, image, tile=args.tile, overlap=args.overlap)
+    else:
+        await scheduler.infer(image)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"latency_s": round(elapsed, 2), "peak_rss_mb": round(peak / 1024, 1),
+            "inference_rss_mb": round((peak - baseline) / 1024, 1)}
+
+
+def case(args, size, mode, results):
+    results.put(asyncio.run(run_case(args, size, mode)))
+
+
+def main(args):
+    # Peak RSS only ever grows, so every case runs in a fresh process
+    context = multiprocessing.get_context("spawn")
+    report = []
+    for size in args.sizes:
+        for mode in args.modes:
+            results = context.Queue()
+            process = context.Process(target=case, args=(args, size, mode, results))
+            process.start()
+            process.join()
+            row = {"size": size, "mode": mode}
+            if process.exitcode == 0:
+                row.update(results.get())
+            else:
+                # Killed by the OOM killer (or any crash) is a result too
+                row["failed"] = f"exit code {process.exitcode}"
+            report.append(row)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak RSS and latency of whole-image and tiled inference")
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL_PATH, help="Path to the generator")
+    parser.add_argument("--device", type=str, default="cpu", help="'gpu' or 'cpu'")
+    parser.add_argument("--sizes", type=str, nargs="+", default=["4k", "8k"], choices=sorted(SIZES), help="Image sizes")
+    parser.add_argument("--modes", type=str, nargs="+", default=["whole", "tiled"], choices=["whole", "tiled"],
+                        help="Inference modes to compare")
+    parser.add_argument("--tile", type=int, default=TILE_SIZE, help="Tile edge in pixels")
+    parser.add_argument("--overlap", type=int, default=TILE_OVERLAP, help="Pixels shared by neighbouring tiles")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Use a stand-in session that allocates the estimated activation memory")
+    parser.add_argument("--call-ms", type=float, default=20, help="Synthetic cost of one session.run")
+    parser.add_argument("--item-ms", type=float, default=5, help="Synthetic cost of each tile in a batch")
+    main(parser.parse_args())
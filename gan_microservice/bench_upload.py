@@ -0,0 +1,80 @@
+# bench_upload.py
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import time
+
+from s3api import DOSpacesManager, SPACE_NAME
+
+
+def produce(write, size_mb, encode_mbps):
+    """Emit `size_mb` of output at the rate an encoder would, one MiB at a time."""
+    chunk = os.urandom(1024 ** 2)
+    started = time.perf_counter()
+    for n in range(size_mb):
+        write(chunk)
+        # Stay on schedule instead of writing everything at disk speed
+        delay = started + (n + 1) / encode_mbps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def upload_after_finish(manager, space, size_mb, encode_mbps):
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "output.mp4")
+        started = time.perf_counter()
+        with open(path, "wb") as f:
+            produce(f.write, size_mb, encode_mbps)
+        encoded = time.perf_counter()
+        url = manager.upload_file(space, path)
+        finished = time.perf_counter()
+    return url, finished - started, finished - encoded
+
+
+def upload_while_encoding(manager, space, size_mb, encode_mbps):
+    started = time.perf_counter()
+    stream = manager.open_upload_stream(space, ".mp4")
+    try:
+        produce(stream.write, size_mb, encode_mbps)
+        encoded = time.perf_counter()
+        url = stream.complete()
+    except Exception:
+        stream.abort()
+        raise
+    finished = time.perf_counter()
+    return url, finished - started, finished - encoded
+
+
+def main(args):
+    if args.moto:
+        from moto import mock_aws
+        # moto answers requests for the AWS endpoint
+        os.environ["SPACES_ENDPOINT_URL"] = "https://s3.amazonaws.com"
+        backend, region = mock_aws(), "us-east-1"
+    else:
+        backend, region = contextlib.nullcontext(), args.region
+    with backend:
+        manager = DOSpacesManager(os.getenv("ACCESS_KEY_ID", "key"), os.getenv("SECRET_KEY", "secret"), region=region)
+        manager.ensure_space(args.space)
+        report = {"size_mb": args.size_mb, "encode_mbps": args.encode_mbps}
+        for name, upload in (("after_finish", upload_after_finish), ("while_encoding", upload_while_encoding)):
+            url, total, tail = upload(manager, args.space, args.size_mb, args.encode_mbps)
+            if url is None:
+                raise SystemExit(f"Upload failed in mode {name}")
+            report[name] = {"time_to_url_s": round(total, 2), "upload_tail_s": round(tail, 2)}
+        report["reduction_s"] = round(report["after_finish"]["time_to_url_s"]
+                                      - report["while_encoding"]["time_to_url_s"], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to URL of uploading after encoding versus while encoding")
+    parser.add_argument("--size-mb", type=int, default=200, help="Size of the simulated encoder output")
+    parser.add_argument("--encode-mbps", type=float, default=20, help="MiB per second the encoder produces")
+    parser.add_argument("--space", type=str, default=SPACE_NAME, help="Bucket used for the test objects")
+    parser.add_argument("--region", type=str, default="sgp1", help="Region of the storage endpoint")
+    parser.add_argument("--moto", action="store_true",
+                        help="Use an in-process S3 stand-in instead of SPACES_ENDPOINT_URL (no network cost)")
+    main(parser.parse_args())
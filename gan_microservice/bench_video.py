@@ -0,0 +1,46 @@
+# bench_video.py
+import argparse
+import json
+import os
+import tempfile
+
+from bench_batching import SyntheticSession
+from session_registry import DEFAULT_MODEL_PATH
+from video_processing import Cartoonizer, VIDEO_DECODER, VIDEO_INFERENCE_WORKERS
+
+
+def render(args, batch_size, scratch):
+    cartoonizer = Cartoonizer(args.video, args.model, args.device, scratch, batch_size=batch_size,
+                              inference_workers=args.inference_workers, keyframe_threshold=0, decoder=args.decoder)
+    if args.synthetic:
+        cartoonizer.sess = SyntheticSession(args.call_ms, args.item_ms)
+    stats = cartoonizer.render(os.path.join(scratch, f"batch-{batch_size}.mp4"))
+    inference = stats["stages"]["inference"]
+    return {
+        "batch_size": stats["batch_size"],
+        "frames": stats["frames"],
+        "fps": stats["fps"],
+        "inference_batches_per_s": inference["items_per_s"],
+        "inference_frames_per_s": round(inference["items_per_s"] * stats["batch_size"], 2),
+        "elapsed_s": stats["elapsed_s"],
+    }
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as scratch:
+        report = [render(args, batch_size, scratch) for batch_size in args.batch_sizes]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Video frames per second for each inference batch size")
+    parser.add_argument("video", type=str, help="Sample input video")
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL_PATH, help="Path to the generator")
+    parser.add_argument("--device", type=str, default="cpu", help="'gpu' or 'cpu'")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Frames per session.run")
+    parser.add_argument("--inference-workers", type=int, default=VIDEO_INFERENCE_WORKERS, help="Inference threads")
+    parser.add_argument("--decoder", type=str, default=VIDEO_DECODER, help="'opencv' or 'ffmpeg'")
+    parser.add_argument("--synthetic", action="store_true", help="Use a stand-in session instead of the model")
+    parser.add_argument("--call-ms", type=float, default=20, help="Synthetic cost of one session.run")
+    parser.add_argument("--item-ms", type=float, default=5, help="Synthetic cost of each frame in a batch")
+    main(parser.parse_args())
@@ -0,0 +1,212 @@
+# callbacks.py
+import asyncio
+import json
+import os
+import time
+import uuid
+
+import aiohttp
+
+DJANGO_API_URL = os.getenv("DJANGO_API_URL", 'http://127.0.0.1:8000/api/gan/save-media/')
+DJANGO_BATCH_API_URL = os.getenv("DJANGO_BATCH_API_URL", 'http://127.0.0.1:8000/api/gan/save-media/batch/')
+FASTAPI_SECRET = os.getenv("FASTAPI_SECRET", "absdfasasdfasf")
+CALLBACK_OUTBOX_DIR = os.getenv("CALLBACK_OUTBOX_DIR", "callback_outbox")
+CALLBACK_MAX_RETRIES = int(os.getenv("CALLBACK_MAX_RETRIES", "3"))
+CALLBACK_TIMEOUT = float(os.getenv("CALLBACK_TIMEOUT", "10"))
+CALLBACK_FLUSH_INTERVAL = float(os.getenv("CALLBACK_FLUSH_INTERVAL", "15"))
+CALLBACK_BATCH_SIZE = int(os.getenv("CALLBACK_BATCH_SIZE", "50"))
+
+
+class CallbackClient:
+    def __init__(self, url=DJANGO_API_URL, secret=FASTAPI_SECRET, outbox_dir=CALLBACK_OUTBOX_DIR,
+                 max_retries=CALLBACK_MAX_RETRIES, timeout=CALLBACK_TIMEOUT, batch_url=DJANGO_BATCH_API_URL):
+        """
+        Delivers save-media notifications to Django
+
+        Requests share one keep-alive connection pool and are retried with
+        exponential backoff. A notification that still cannot be delivered
+        is written to an on-disk outbox and re-sent in batches by a
+        background flusher, so a slow or restarting Django never blocks a
+        job nor loses its result. Outbox entries are flushed through the
+        batch endpoint, one request per batch. Entries Django refuses are
+        moved to `outbox_dir/rejected` rather than deleted.
+
+        Args:
+            url (str): Django save-media endpoint
+            secret (str): Shared secret sent in the FastAPI-Secret header
+            outbox_dir (str): Directory holding undelivered notifications
+            max_retries (int): Retries per notification before it goes to the outbox
+            timeout (float): Seconds allowed per request
+            batch_url (str): Django endpoint accepting a list of completions
+        """
+        self.url = url
+        self.batch_url = batch_url
+        self.secret = secret
+        self.outbox_dir = outbox_dir
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._session = None
+        self._flusher = None
+        self._flush_lock = None
+        self.sent = 0
+        self.retries = 0
+        self.rejected = 0
+        self.outboxed = 0
+        # Notifications Django refused, kept for inspection rather than retried
+        self.rejected_dir = os.path.join(outbox_dir, "rejected")
+        os.makedirs(self.rejected_dir, exist_ok=True)
+
+    def _get_session(self):
+        # Created lazily: the session must belong to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"FastAPI-Secret": self.secret},
+            )
+        return self._session
+
+    async def _post(self, payload, url=None):
+        """
+        Send one request
+
+        Returns (True, parsed body) once Django accepted it, or (False, error
+        text) when Django rejected the payload itself and retrying cannot help.
+        """
+        async with self._get_session().post(url or self.url, json=payload) as response:
+            if response.status < 400:
+                try:
+                    return True, await response.json(content_type=None)
+                except ValueError:
+                    return True, None
+            body = await response.text()
+            if response.status < 500 and response.status != 429:
+                print(f"Callback rejected ({response.status}): {body}")
+                self.rejected += 1
+                return False, body
+            raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                              status=response.status, message=body)
+
+    async def _send(self, payload, url=None):
+        """Returns the outcome of `_post`, or None when Django stayed unreachable."""
+        delay = 0.5
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._post(payload, url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    print(f"Callback failed after {attempt + 1} attempts: {e}")
+                    return None
+                self.retries += 1
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    def _store(self, payload, directory=None, error=None):
+        directory = directory or self.outbox_dir
+        name = f"{time.time():.6f}-{uuid.uuid4().hex}.json"
+        partial = os.path.join(directory, name + ".tmp")
+        with open(partial, "w") as f:
+            json.dump(payload if error is None else {"payload": payload, "error": error}, f)
+        os.replace(partial, os.path.join(directory, name))
+
+    def _dead_letter(self, payload, error, path=None):
+        """Keep a notification Django refused for inspection instead of dropping it."""
+        self._store(payload, self.rejected_dir, error)
+        if path is not None:
+            os.remove(path)
+
+    def pending(self):
+        return sorted(name for name in os.listdir(self.outbox_dir) if name.endswith(".json"))
+
+    async def notify(self, payload):
+        """Deliver `payload`, falling back to the outbox instead of raising."""
+        outcome = await self._send(payload)
+        if outcome is None:
+            self._store(payload)
+            self.outboxed += 1
+            self.start()
+            return False
+        delivered, body = outcome
+        if delivered:
+            self.sent += 1
+        else:
+            self._dead_letter(payload, body)
+        return True
+
+    async def flush(self):
+        """Re-send the oldest outbox entries as one batch; returns False if Django is still unreachable."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            paths, payloads = [], []
+            for name in self.pending()[:CALLBACK_BATCH_SIZE]:
+                path = os.path.join(self.outbox_dir, name)
+                try:
+                    with open(path) as f:
+                        payloads.append(json.load(f))
+                    paths.append(path)
+                except (OSError, ValueError):
+                    continue
+            if not payloads:
+                return True
+            outcome = await self._send({"completions": payloads}, self.batch_url)
+            if outcome is None:
+                return False
+            delivered, body = outcome
+            if not delivered:
+                # The batch was refused as a whole; send entries one by one so
+                # only the ones Django rejects are set aside
+                for payload, path in zip(payloads, paths):
+                    outcome = await self._send(payload)
+                    if outcome is None:
+                        return False
+                    if outcome[0]:
+                        self.sent += 1
+                        os.remove(path)
+                    else:
+                        self._dead_letter(payload, outcome[1], path)
+                return True
+            # Django reports entries it could not save by their index in the batch
+            errors = {result["index"]: result for result in (body or {}).get("results", [])
+                      if "user_media" not in result}
+            for index, (payload, path) in enumerate(zip(payloads, paths)):
+                if index in errors:
+                    print(f"Callback rejected in batch: {errors[index]}")
+                    self.rejected += 1
+                    self._dead_letter(payload, errors[index], path)
+                else:
+                    self.sent += 1
+                    os.remove(path)
+            return True
+
+    async def _flush_forever(self, interval):
+        while self.pending():
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Callback outbox flush failed: {e}")
+
+    def start(self, interval=CALLBACK_FLUSH_INTERVAL):
+        """Start the background flusher if the outbox has entries."""
+        if (self._flusher is None or self._flusher.done()) and self.pending():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_forever(interval))
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+        if self._session is not None:
+            await self._session.close()
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "outboxed": self.outboxed,
+            "outbox_pending": len(self.pending()),
+            "rejected_kept": len(os.listdir(self.rejected_dir)),
+        }
+
+
+callback_client = CallbackClient()
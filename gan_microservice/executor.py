@@ -0,0 +1,131 @@
+# executor.py
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", str(min(8, (os.cpu_count() or 1) + 2))))
+BLOCKING_QUEUE = int(os.getenv("BLOCKING_QUEUE", "64"))
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", "0"))
+MAX_ACTIVE_JOBS = int(os.getenv("MAX_ACTIVE_JOBS", "8"))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "4"))
+
+
+class ExecutorBusy(Exception):
+    """Raised when an executor already has its maximum number of calls queued."""
+
+
+class BoundedExecutor:
+    def __init__(self, pool, max_workers, max_queue):
+        """
+        Wrap a concurrent.futures pool with a cap on outstanding calls
+
+        Args:
+            pool: ThreadPoolExecutor or ProcessPoolExecutor doing the work
+            max_workers (int): Number of workers in the pool
+            max_queue (int): Calls allowed to wait once every worker is busy
+        """
+        self.pool = pool
+        self.limit = max_workers + max_queue
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def saturated(self):
+        return self.pending >= self.limit
+
+    async def run(self, fn, *args):
+        """Run `fn(*args)` in the pool without blocking the event loop."""
+        with self._lock:
+            if self.pending >= self.limit:
+                raise ExecutorBusy("Executor queue is full")
+            self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def stats(self):
+        return {"pending": self.pending, "limit": self.limit}
+
+
+class JobSlots:
+    def __init__(self, limit):
+        """
+        Admission control for background jobs
+
+        Endpoints reserve a slot before scheduling work and the slot is
+        released when the job finishes, so at most `limit` jobs are in
+        flight and further requests are turned away instead of queueing
+        without bound.
+        """
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active = max(0, self.active - 1)
+
+    async def run(self, job, *args):
+        """Await `job(*args)` and free the slot reserved for it."""
+        try:
+            return await job(*args)
+        finally:
+            self.release()
+
+    def stats(self):
+        return {"active": self.active, "limit": self.limit}
+
+
+# ONNX Runtime and OpenCV release the GIL, so threads are enough for them
+blocking_executor = BoundedExecutor(
+    ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking"),
+    BLOCKING_WORKERS,
+    BLOCKING_QUEUE,
+)
+
+# Pure-Python work can be moved to processes by setting PROCESS_WORKERS;
+# functions sent here must be importable module-level functions.
+if PROCESS_WORKERS > 0:
+    cpu_executor = BoundedExecutor(ProcessPoolExecutor(max_workers=PROCESS_WORKERS), PROCESS_WORKERS, BLOCKING_QUEUE)
+else:
+    cpu_executor = blocking_executor
+
+# Network transfers get their own threads so uploads overlap with inference
+# instead of occupying blocking workers
+io_executor = BoundedExecutor(
+    ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io"),
+    IO_WORKERS,
+    BLOCKING_QUEUE,
+)
+
+job_slots = JobSlots(MAX_ACTIVE_JOBS)
+
+
+async def run_blocking(fn, *args):
+    return await blocking_executor.run(fn, *args)
+
+
+async def run_cpu(fn, *args):
+    return await cpu_executor.run(fn, *args)
+
+
+async def run_io(fn, *args):
+    return await io_executor.run(fn, *args)
+
+
+def executor_stats():
+    return {
+        "jobs": job_slots.stats(),
+        "blocking": blocking_executor.stats(),
+        "cpu": cpu_executor.stats(),
+        "io": io_executor.stats(),
+    }
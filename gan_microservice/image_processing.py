@@ -1,19 +1,23 @@
 # image_processing.py
 import cv2
 import numpy as np
-import onnxruntime as ort
 from glob import glob
 import os
 import shutil
 import tempfile
 import asyncio
-
-import requests
-from s3api import upload_to_cloud
+import time
+from functools import partial
+
+from s3api import upload_to_cloud_async
+from session_registry import get_session
+from batching import get_scheduler
+from tiling import use_tiling, tiling_params, infer_tiled
+from quality import resolve_tier, capped_size, upsample_edge_aware, quality_stats
+from executor import run_blocking
+from result_cache import result_cache, RESULT_CACHE_REUSE_URLS
 from websocket_handler import active_connections
-
-DJANGO_API_URL = 'http://127.0.0.1:8000/api/gan/save-media/'
-FASTAPI_SECRET = "absdfasasdfasf"
+from callbacks import callback_client
 
 pic_form = ['.jpeg', '.jpg', '.png', '.JPEG', '.JPG', '.PNG']
 
@@ -22,20 +26,29 @@ def check_folder(path):
         os.makedirs(path)
     return path
 
-def process_image(img, model_name):
-    h, w = img.shape[:2]
+def process_image(img, model_name, max_edge=0):
+    h, w = capped_size(*img.shape[:2], max_edge)
     def to_8s(x):
         if 'tiny' in os.path.basename(model_name):
             return 256 if x < 256 else x - x % 16
         else:
             return 256 if x < 256 else x - x % 8
-    img = cv2.resize(img, (to_8s(w), to_8s(h)))
+    # INTER_AREA avoids aliasing when a quality tier shrinks the image
+    interpolation = cv2.INTER_AREA if (h, w) != img.shape[:2] else cv2.INTER_LINEAR
+    img = cv2.resize(img, (to_8s(w), to_8s(h)), interpolation=interpolation)
     img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB).astype(np.float32) / 127.5 - 1.0
     return img
 
-def load_test_data(image_path, model_name):
-    img0 = cv2.imread(image_path).astype(np.float32)
-    img = process_image(img0, model_name)
+def read_image(image_path):
+    img0 = cv2.imread(image_path)
+    if img0 is None:
+        raise ValueError(f"Could not read image: {image_path}")
+    return img0
+
+def load_test_data(image_path, model_name, img0=None, max_edge=0):
+    if img0 is None:
+        img0 = read_image(image_path)
+    img = process_image(img0.astype(np.float32), model_name, max_edge)
     img = np.expand_dims(img, axis=0)
     return img, img0.shape
 def filter(image):
@@ -51,43 +64,86 @@ def filter(image):
 
     return filter_image
 
-def save_images(images, image_path, size, user_id):
+async def notify_django(user_id, media_url, job_id=None):
+    return await callback_client.notify({
+        "user_id": user_id,
+        "media_type": 'image',
+        "media_url": media_url,
+        "job_id": str(job_id) if job_id else None,
+    })
+
+def save_images(images, image_path, size, guide=None):
     images = (np.squeeze(images) + 1.) / 2 * 255  # Convert from [-1,1] to [0,255]
     images = np.clip(images, 0, 255).astype(np.uint8)  # Ensure valid pixel range
-    images = cv2.resize(images, size)  # Resize to original dimensions
+    if guide is not None and images.shape[1] < size[0]:
+        # Inferred at a capped size: restore detail from the original photo
+        images = upsample_edge_aware(images, guide, size)
+    else:
+        images = cv2.resize(images, size)  # Resize to original dimensions
 
     anime_image = filter(images)
 
     cv2.imwrite(image_path, cv2.cvtColor(anime_image, cv2.COLOR_RGB2BGR))
-
-    media_url = upload_to_cloud(image_path)
-    response = requests.post(
-            DJANGO_API_URL,
-            headers={"FastAPI-Secret": FASTAPI_SECRET},
-            json={
-                "user_id": user_id,
-                "media_type": 'image',
-                "media_url": media_url,
-            }
-        )
-
-
-async def process_images(task_id, user_id, input_path, output_path, model_path="/home/advay/Desktop/gaaaannnnnnn/Ganaura/gan_microservice/models/generator.onnx", device="cpu"):
+    return anime_image
+
+async def publish_result(image_path, user_id, cache_key, job_id=None):
+    # Uploads run on the I/O threads, leaving the blocking workers to inference
+    media_url = await upload_to_cloud_async(image_path)
+    await run_blocking(result_cache.put, cache_key, image_path, media_url)
+    await notify_django(user_id, media_url, job_id)
+    return media_url
+
+async def publish_cached(entry, cache_key, image_path, user_id, job_id=None):
+    """Deliver a cached result, uploading it again only when no URL can be reused."""
+    media_url = entry["url"] if RESULT_CACHE_REUSE_URLS else None
+    if not media_url:
+        await run_blocking(shutil.copyfile, entry["path"], image_path)
+        media_url = await upload_to_cloud_async(image_path)
+        await run_blocking(result_cache.set_url, cache_key, media_url)
+    await notify_django(user_id, media_url, job_id)
+    return media_url
+
+
+async def stylize(session, input_path, img0, model_path, max_edge, image_path):
+    """Run a decoded image through the generator at the tier's size, write it to `image_path` and return it (RGB)."""
+    infer_size = capped_size(*img0.shape[:2], max_edge)
+    sample_image, shape = await run_blocking(load_test_data, input_path, model_path, img0, max_edge)
+    if use_tiling(*infer_size):
+        # Large photos go through in tiles so activations stay within the memory budget
+        fake_img = await infer_tiled(get_scheduler(session), sample_image)
+    else:
+        fake_img = await get_scheduler(session).infer(sample_image)
+    guide = img0 if infer_size != img0.shape[:2] else None
+    return await run_blocking(save_images, fake_img, image_path, (shape[1], shape[0]), guide)
+
+
+async def process_images(task_id, user_id, input_path, output_path, model_path="/home/advay/Desktop/gaaaannnnnnn/Ganaura/gan_microservice/models/generator.onnx", device="cpu", quality=None, job_id=None):
+    # job_id is the Django upload the result belongs to; None for images Django never saw
     print(f"Image processing started for user {user_id}, task {task_id}")
     
     try:
-        if ort.get_device() == 'GPU' and device == "gpu":
-            session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
-        else:
-            session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
-        
-        x = session.get_inputs()[0].name
-        y = session.get_outputs()[0].name
-
-        sample_image, shape = load_test_data(input_path, model_path)
+        tier, max_edge = resolve_tier(quality)
+        img0 = await run_blocking(read_image, input_path)
+        infer_size = capped_size(*img0.shape[:2], max_edge)
         image_path = os.path.join(output_path, os.path.basename(input_path))
-        fake_img = session.run(None, {x: sample_image})
-        save_images(fake_img[0], image_path, (shape[1], shape[0]),user_id)
+        check_folder(output_path)
+
+        # Identical pixels through the same model give the same output
+        extension = os.path.splitext(input_path)[1].lower()
+        params = {"max_edge": max_edge} if max_edge else {}
+        # run_blocking only forwards positional arguments
+        cache_key = await run_blocking(partial(result_cache.key, img0, model_path, extension=extension,
+                                               **params, **tiling_params(*infer_size)))
+        cached = await run_blocking(result_cache.get, cache_key)
+        if cached is not None:
+            print(f"Result cache hit for task {task_id}")
+            return await publish_cached(cached, cache_key, image_path, user_id, job_id)
+
+        started = time.perf_counter()
+        session = await run_blocking(get_session, model_path, device)
+        await stylize(session, input_path, img0, model_path, max_edge, image_path)
+        quality_stats.record(tier, time.perf_counter() - started)
+        return await publish_result(image_path, user_id, cache_key, job_id)
     
     except Exception as e:
         print(f"Error in process_images: {e}")
@@ -96,4 +152,6 @@ async def process_images(task_id, user_id, input_path, output_path, model_path="
             await websocket.send_json({
                 "error": str(e),
                 "task_id": task_id,
-            })
\ No newline at end of file
+            })
+        # Let the job queue see the failure so it can retry
+        raise
@@ -0,0 +1,177 @@
+# ingest.py
+import asyncio
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+
+from executor import run_io
+
+# Uploads larger than this are refused; checked against Content-Length before reading
+MAX_INGEST_BYTES = int(os.getenv("MAX_INGEST_BYTES", str(2 * 1024 ** 3)))
+INGEST_MIN_CHUNK = int(os.getenv("INGEST_MIN_CHUNK", str(256 * 1024)))
+INGEST_MAX_CHUNK = int(os.getenv("INGEST_MAX_CHUNK", str(8 * 1024 * 1024)))
+
+
+class MediaTooLarge(Exception):
+    """Raised when a download exceeds MAX_INGEST_BYTES."""
+
+
+def sniff_media_type(head):
+    """
+    Identify a media file from its first bytes
+
+    Args:
+        head (bytes): Start of the file; 64 bytes are enough for every format checked
+    Returns:
+        (media_type, extension): ('unknown', '') when the format is not recognised
+    """
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image', '.jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image', '.png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image', '.gif'
+    if head.startswith(b'BM'):
+        return 'image', '.bmp'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image', '.webp'
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'video', '.avi'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand in (b'heic', b'heix', b'mif1', b'avif'):
+            return 'image', '.avif' if brand == b'avif' else '.heic'
+        return 'video', '.mov' if brand == b'qt  ' else '.mp4'
+    if head.startswith(b'\x30\x26\xb2\x75\x8e\x66\xcf\x11'):
+        # ASF container, as used by .wmv
+        return 'video', '.wmv'
+    if head.startswith(b'FLV\x01'):
+        return 'video', '.flv'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        # Matroska and WebM share the EBML header; the doctype decides the extension
+        return 'video', '.webm' if b'webm' in head[:64] else '.mkv'
+    return 'unknown', ''
+
+
+def media_type_from_content_type(content_type):
+    return 'image' if content_type.startswith('image/') else 'video' if content_type.startswith('video/') else 'unknown'
+
+
+def sniff_file(path):
+    """Sniff the media type of a file already on disk; returns (media_type, extension)."""
+    with open(path, 'rb') as f:
+        return sniff_media_type(f.read(64))
+
+
+class IngestStats:
+    def __init__(self):
+        self.downloads = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def record(self, size, seconds):
+        with self._lock:
+            self.downloads += 1
+            self.bytes += size
+            self.seconds += seconds
+
+    def stats(self):
+        return {
+            "downloads": self.downloads,
+            "bytes": self.bytes,
+            "rejected": self.rejected,
+            "throughput_mb_s": round(self.bytes / self.seconds / 1e6, 2) if self.seconds else 0.0,
+        }
+
+
+ingest_stats = IngestStats()
+
+
+def _write_chunk(f, digest, data):
+    # Hashing runs here too so neither the write nor the hash holds the event loop
+    f.write(data)
+    digest.update(data)
+
+
+async def ingest_response(response, download_base, max_bytes=MAX_INGEST_BYTES):
+    """
+    Stream an aiohttp response to disk
+
+    Reads are batched into chunks that start at INGEST_MIN_CHUNK and double
+    up to INGEST_MAX_CHUNK, and each chunk is written and hashed on the I/O
+    pool while the next one is read. The size limit is enforced from
+    Content-Length before the body is read and again as bytes arrive. The
+    media type is taken from the leading bytes, falling back to the
+    Content-Type header and then the URL's extension.
+
+    Args:
+        response (aiohttp.ClientResponse): Response with status 200
+        download_base (str): Destination path without extension; the sniffed
+            extension is appended
+        max_bytes (int): Largest body accepted
+    Returns:
+        (path, media_type, size, sha256 hex digest)
+    """
+    if response.content_length is not None and response.content_length > max_bytes:
+        ingest_stats.rejected += 1
+        raise MediaTooLarge(f"Media is {response.content_length} bytes, limit is {max_bytes}")
+
+    partial = download_base + ".part"
+    digest = hashlib.sha256()
+    started = time.perf_counter()
+    chunk_size = INGEST_MIN_CHUNK
+    buffer = bytearray()
+    head = b''
+    size = 0
+    pending = None
+    try:
+        with open(partial, 'wb') as f:
+            try:
+                while True:
+                    data = await response.content.read(chunk_size - len(buffer))
+                    if data:
+                        buffer += data
+                        size += len(data)
+                        if size > max_bytes:
+                            ingest_stats.rejected += 1
+                            raise MediaTooLarge(f"Media exceeds the {max_bytes} byte limit")
+                        if len(head) < 64:
+                            # The buffer is emptied after each write, so collect the head from the reads
+                            head += data[:64 - len(head)]
+                        if len(buffer) < chunk_size:
+                            continue
+                    # One write in flight at a time keeps the file in order
+                    if pending is not None:
+                        await pending
+                        pending = None
+                    if buffer:
+                        pending = asyncio.ensure_future(run_io(_write_chunk, f, digest, buffer))
+                        buffer = bytearray()
+                        chunk_size = min(chunk_size * 2, INGEST_MAX_CHUNK)
+                    if not data:
+                        break
+                if pending is not None:
+                    await pending
+            finally:
+                # Never close the file under an in-flight write
+                if pending is not None and not pending.done():
+                    await asyncio.wait([pending])
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    media_type, extension = sniff_media_type(head)
+    if media_type == 'unknown':
+        content_type = response.headers.get('Content-Type', '').split(';')[0]
+        media_type = media_type_from_content_type(content_type)
+        extension = (mimetypes.guess_extension(content_type) or
+                     os.path.splitext(response.url.path)[-1])
+    path = download_base + extension
+    os.replace(partial, path)
+    ingest_stats.record(size, time.perf_counter() - started)
+    return path, media_type, size, digest.hexdigest()
@@ -1,14 +1,25 @@
 # main.py
-from fastapi import FastAPI, BackgroundTasks, UploadFile, File, Form
+from fastapi import FastAPI, BackgroundTasks, UploadFile, File, Form, HTTPException
 from pydantic import BaseModel
+from typing import Optional
 import uuid
 import os
 import tempfile
 import requests
 import uvicorn
 from image_processing import process_images, check_folder
-from video_processing import Cartoonizer
+from video_processing import Cartoonizer, recent_pipeline_stats, video_session_threads, VIDEO_KEYFRAME_THRESHOLD
 from websocket_handler import websocket_endpoint
+from session_registry import session_registry, DEFAULT_MODEL_PATH, WARM_DEVICES
+from batching import batching_stats
+from result_cache import result_cache
+from ingest import ingest_response, ingest_stats, sniff_file, media_type_from_content_type, MediaTooLarge, MAX_INGEST_BYTES
+from quality import resolve_tier, quality_stats
+from s3api import get_spaces_manager, download_from_cloud
+from callbacks import callback_client
+from executor import job_slots, blocking_executor, executor_stats, run_blocking, run_io
+from video_segments import SegmentedVideoJob, VIDEO_SEGMENT_WORKERS
+from job_queue import JobQueue, JOB_QUEUE_ENABLED, MAX_QUEUED_JOBS, IMAGE_PRIORITY, VIDEO_PRIORITY
 import asyncio
 import aiohttp
 import mimetypes
@@ -18,6 +29,93 @@ app = FastAPI()
 DJANGO_API_URL = 'http://127.0.0.1:8000/api/gan/save-media/'
 FASTAPI_SECRET = "absdfasasdfasf"
 
+# Django's MEDIA_ROOT when both services share a filesystem; empty disables the handoff
+SHARED_MEDIA_ROOT = os.getenv("SHARED_MEDIA_ROOT", "")
+
+# With the job queue enabled, endpoints only enqueue and `worker.py` does the processing
+job_queue = JobQueue() if JOB_QUEUE_ENABLED else None
+
+@app.on_event("startup")
+async def warm_sessions():
+    # Load the generator before the first request so it doesn't pay the cold start;
+    # image requests use ORT's default threads, video splits the cores between workers
+    session_registry.warm([DEFAULT_MODEL_PATH], WARM_DEVICES, (0, video_session_threads()))
+    # Build the shared Spaces client and check the bucket once, not per upload
+    try:
+        await run_blocking(get_spaces_manager)
+    except Exception as e:
+        print(f"Spaces client not ready: {e}")
+    # Resend notifications Django missed before the restart
+    callback_client.start()
+    # Pick up segmented video jobs interrupted by the last shutdown; queued
+    # jobs are resumed by the workers instead
+    for job in ([] if job_queue else SegmentedVideoJob.pending()):
+        if job_slots.try_acquire():
+            asyncio.create_task(job_slots.run(job.process, job.job_id))
+
+@app.on_event("shutdown")
+async def close_clients():
+    await callback_client.close()
+
+def reserve_job_slot():
+    """Turn the request away when the service is already saturated."""
+    if job_queue is not None:
+        if job_queue.depth() >= MAX_QUEUED_JOBS:
+            raise HTTPException(status_code=429, detail="Too many jobs queued, retry later", headers={"Retry-After": "30"})
+        return
+    if blocking_executor.saturated():
+        raise HTTPException(status_code=503, detail="Inference workers are saturated, retry later", headers={"Retry-After": "5"})
+    if not job_slots.try_acquire():
+        raise HTTPException(status_code=429, detail="Too many jobs in progress, retry later", headers={"Retry-After": "5"})
+
+def release_job_slot():
+    if job_queue is None:
+        job_slots.release()
+
+def submit_job(background_tasks, kind, task_id, payload, job, *args):
+    """Persist the job for the workers when the queue is enabled, otherwise run it in-process."""
+    if job_queue is not None:
+        priority = IMAGE_PRIORITY if kind == 'image' else VIDEO_PRIORITY
+        job_queue.enqueue(kind, payload, priority, job_id=task_id)
+    else:
+        background_tasks.add_task(job_slots.run, job, *args)
+
+def link_shared_media(local_path, download_path):
+    """
+    Hard-link a file Django already stored into `downloads/` instead of fetching it over HTTP
+
+    Returns False when the handoff is disabled, the path is outside the shared
+    media root, or the link cannot be made (e.g. a different filesystem).
+    """
+    if not SHARED_MEDIA_ROOT or not local_path:
+        return False
+    root = os.path.realpath(SHARED_MEDIA_ROOT)
+    source = os.path.realpath(local_path)
+    if os.path.commonpath([root, source]) != root or not os.path.isfile(source):
+        return False
+    try:
+        # A link keeps the upload intact when the job deletes its input afterwards
+        os.link(source, download_path)
+        return True
+    except OSError as e:
+        print(f"Shared media handoff failed, downloading instead: {e}")
+        return False
+
+def detect_media_type(path, content_type='', declared=None):
+    """
+    Classify a file already on disk as 'image', 'video' or 'unknown'
+
+    The leading bytes decide first, since browsers often send no type for
+    formats like .mkv or .wmv; then the stored content type or the file
+    name; then the type Django declared for the upload.
+    """
+    media_type, _ = sniff_file(path)
+    if media_type == 'unknown':
+        media_type = media_type_from_content_type(content_type or mimetypes.guess_type(path)[0] or '')
+    if media_type == 'unknown' and declared in ('image', 'video'):
+        media_type = declared
+    return media_type
+
 # WebSocket Endpoint
 app.websocket("/ws/progress/")(websocket_endpoint)
 
@@ -27,12 +125,26 @@ class ImageRequest(BaseModel):
     input_imgs_dir: str
     model_path: str = "/home/advay/Desktop/gaaaannnnnnn/Ganaura/gan_microservice/models/generator.onnx"
     device: str = "cpu"
+    # Quality tier (draft/standard/high/full); None uses DEFAULT_QUALITY_TIER
+    quality: Optional[str] = None
+
+def check_quality(quality):
+    try:
+        resolve_tier(quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/process-images/")
 async def process_images_endpoint(request: ImageRequest, background_tasks: BackgroundTasks):
+    check_quality(request.quality)
     task_id = str(uuid.uuid4())
     output_path = f"output/{task_id}"
-    background_tasks.add_task(process_images, task_id, request.user_id, request.input_imgs_dir, output_path, request.model_path, request.device)
+    reserve_job_slot()
+    payload = {"user_id": request.user_id, "input_path": request.input_imgs_dir, "output_path": output_path,
+               "model_path": request.model_path, "device": request.device, "quality": request.quality}
+    submit_job(background_tasks, 'image', task_id, payload,
+               process_images, task_id, request.user_id, request.input_imgs_dir, output_path, request.model_path, request.device,
+               request.quality)
     return {"message": "Image processing started", "task_id": task_id}
 
 # Single Image Upload Endpoint
@@ -40,11 +152,14 @@ async def process_images_endpoint(request: ImageRequest, background_tasks: Backg
 async def process_single_image(
     user_id: str = Form(...),
     image: UploadFile = File(""),
-    model_path: str = Form(default=""),
+    model_path: str = Form(default=DEFAULT_MODEL_PATH),
     device: str = Form(default="cpu"),
+    quality: str = Form(default=None),
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
+    check_quality(quality)
     task_id = str(uuid.uuid4())
+    reserve_job_slot()
     temp_dir = tempfile.mkdtemp()
     input_path = os.path.join(temp_dir, image.filename)
     output_path = os.path.join(temp_dir, "output")
@@ -52,11 +167,18 @@ async def process_single_image(
     with open(input_path, "wb") as f:
         f.write(await image.read())
     
-    background_tasks.add_task(process_images, task_id, user_id, temp_dir, output_path, model_path, device)
+    payload = {"user_id": user_id, "input_path": input_path, "output_path": output_path,
+               "model_path": model_path, "device": device, "quality": quality}
+    submit_job(background_tasks, 'image', task_id, payload,
+               process_images, task_id, user_id, input_path, output_path, model_path, device, quality)
     return {"message": "Single image processing started", "task_id": task_id}
 
 @app.post("/process-video/")
-async def generate_media(background_tasks: BackgroundTasks, user_id: str = Form(...), media_path: str = Form(...)):
+async def generate_media(background_tasks: BackgroundTasks, user_id: str = Form(...), media_path: str = Form(default=None),
+                         keyframe_threshold: float = Form(default=VIDEO_KEYFRAME_THRESHOLD),
+                         job_id: str = Form(default=None), object_key: str = Form(default=None),
+                         local_path: str = Form(default=None), quality: str = Form(default=None),
+                         declared_type: str = Form(default=None, alias="media_type")):
     """
     Download media from URL, detect type, and notify WebSocket clients
     
@@ -64,53 +186,87 @@ async def generate_media(background_tasks: BackgroundTasks, user_id: str = Form(
         task_id (str): Unique identifier for the task
         user_id (str): User identifier
         media_path (str): URL of the media to download
+        object_key (str): Key of media uploaded straight to object storage; read
+            from the bucket instead of `media_path`
+        local_path (str): Path of the upload on Django's disk; opened in place
+            when SHARED_MEDIA_ROOT is set and contains it, else `media_path` is used
+        keyframe_threshold (float): Frame difference under which video frames reuse
+            the previous stylized frame (0 runs the generator on every frame)
+        job_id (str): Id of the Django upload; used as the task id and echoed in
+            the save-media callback so the result is attached to that upload
+        quality (str): Quality tier for images (draft/standard/high/full); lower
+            tiers infer at a capped size and upsample the result
+        media_type (str): Type Django recorded for the upload; used only when the
+            file itself doesn't identify it
     """
-    task_id = uuid.uuid4()
-    model_path = 'models/generator.onnx'
+    try:
+        # Also names files and checkpoint directories, so only accept a UUID
+        task_id = str(uuid.UUID(job_id)) if job_id else str(uuid.uuid4())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="job_id must be a UUID")
+    if not media_path and not object_key:
+        raise HTTPException(status_code=400, detail="media_path or object_key is required")
+    check_quality(quality)
+    model_path = DEFAULT_MODEL_PATH
+    reserve_job_slot()
     print(f"Media processing started for task {task_id}")
     
     try:
-        # Determine file extension and create a unique filename
-        file_extension = os.path.splitext(media_path)[-1]
-        if not file_extension:
-            # If no extension, try to get from content type
-            async with aiohttp.ClientSession() as session:
-                async with session.head(media_path) as response:
-                    content_type = response.headers.get('Content-Type', '')
-                    file_extension = mimetypes.guess_extension(content_type) or ''
-        
+        # Determine file extension and create a unique filename; plain
+        # downloads get theirs from the leading bytes once streamed
+        file_extension = os.path.splitext(object_key or local_path or media_path)[-1]
         unique_filename = f"{uuid.uuid4()}{file_extension}"
         download_path = os.path.join("downloads", unique_filename)
+        content_hash = None
         
         # Ensure downloads directory exists
         os.makedirs("downloads", exist_ok=True)
         os.makedirs("generation_outputs", exist_ok=True)
         output_dir = 'generation_outputs'
         
-        # Download the media
-        async with aiohttp.ClientSession() as session:
-            async with session.get(media_path) as response:
-                # Validate response
-                if response.status != 200:
-                    raise Exception(f"Failed to download media. Status code: {response.status}")
-                
-                # Detect media type
-                content_type = response.headers.get('Content-Type', '')
-                media_type = 'image' if content_type.startswith('image/') else 'video' if content_type.startswith('video/') else 'unknown'
-                
-                # Stream download
-                with open(download_path, 'wb') as f:
-                    while True:
-                        chunk = await response.content.read(8192)
-                        if not chunk:
-                            break
-                        f.write(chunk)
+        if link_shared_media(local_path, download_path):
+            if os.path.getsize(download_path) > MAX_INGEST_BYTES:
+                os.remove(download_path)
+                ingest_stats.rejected += 1
+                raise MediaTooLarge(f"Media exceeds the {MAX_INGEST_BYTES} byte limit")
+            media_type = await run_io(detect_media_type, download_path, '', declared_type)
+        elif object_key:
+            # Direct uploads are fetched from the bucket with parallel ranged reads
+            content_type = await run_io(download_from_cloud, object_key, download_path)
+            # Uploads signed without a type are stored as application/octet-stream
+            media_type = await run_io(detect_media_type, download_path, content_type, declared_type)
+        else:
+            # Stream the media to disk, sniffing its type from the first bytes
+            async with aiohttp.ClientSession() as session:
+                async with session.get(media_path) as response:
+                    # Validate response
+                    if response.status != 200:
+                        raise Exception(f"Failed to download media. Status code: {response.status}")
+                    download_base = os.path.join("downloads", os.path.splitext(unique_filename)[0])
+                    download_path, media_type, size, content_hash = await ingest_response(response, download_base)
+                    if media_type == 'unknown' and declared_type in ('image', 'video'):
+                        media_type = declared_type
+                    print(f"Downloaded {size} bytes for task {task_id} (sha256 {content_hash})")
 
+        # Results are only tied to an upload when Django issued the job id
+        upload_job_id = task_id if job_id else None
+        payload = {"user_id": user_id, "input_path": download_path, "output_path": output_dir,
+                   "model_path": model_path, "device": 'gpu', "keyframe_threshold": keyframe_threshold,
+                   "quality": quality, "job_id": upload_job_id}
         if media_type == 'image':
-            background_tasks.add_task(process_images, task_id, user_id, download_path, output_dir, model_path, 'gpu')
+            submit_job(background_tasks, 'image', task_id, payload,
+                       process_images, task_id, user_id, download_path, output_dir, model_path, 'gpu', quality,
+                       upload_job_id)
+        elif media_type == 'video' and VIDEO_SEGMENT_WORKERS > 0:
+            job = SegmentedVideoJob(download_path, model_path, 'gpu', output_dir, task_id, user_id,
+                                   keyframe_threshold=keyframe_threshold, upload_job_id=upload_job_id)
+            submit_job(background_tasks, 'video', task_id, payload, job.process, task_id, user_id)
         elif media_type == 'video':
-            cartoonizer = Cartoonizer(download_path, model_path, 'gpu', output_dir, None)
-            background_tasks.add_task(cartoonizer.process, task_id, user_id)
+            cartoonizer = Cartoonizer(download_path, model_path, 'gpu', output_dir, None, keyframe_threshold=keyframe_threshold)
+            submit_job(background_tasks, 'video', task_id, payload, cartoonizer.process, task_id, user_id, upload_job_id)
+        else:
+            os.remove(download_path)
+            raise HTTPException(status_code=415, detail="Unsupported media type")
 
 
         # response = requests.post(
@@ -127,11 +283,20 @@ async def generate_media(background_tasks: BackgroundTasks, user_id: str = Form(
         print(f"Media processing completed for task {task_id}")
         return {
             "success": True,
+            "task_id": task_id,
             "media_type": media_type,
-            "file_path": download_path
+            "file_path": download_path,
+            "content_hash": content_hash
         }
     
+    except MediaTooLarge as e:
+        release_job_slot()
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        release_job_slot()
+        raise
     except Exception as e:
+        release_job_slot()
         print(f"Error in media processing: {e}")
         return {
             "success": False,
@@ -139,5 +304,58 @@ async def generate_media(background_tasks: BackgroundTasks, user_id: str = Form(
         }
     
 
+@app.get("/jobs/{task_id}/")
+async def job_status(task_id: str):
+    if job_queue is None:
+        raise HTTPException(status_code=404, detail="Job queue is not enabled")
+    job = await run_blocking(job_queue.get, task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/metrics/sessions/")
+async def session_metrics():
+    return session_registry.stats()
+
+
+@app.get("/metrics/executor/")
+async def executor_metrics():
+    stats = executor_stats()
+    if job_queue is not None:
+        stats["queue"] = await run_blocking(job_queue.counts)
+    return stats
+
+
+@app.get("/metrics/video/")
+async def video_metrics():
+    return list(recent_pipeline_stats)
+
+
+@app.get("/metrics/batching/")
+async def batching_metrics():
+    return batching_stats()
+
+
+@app.get("/metrics/callbacks/")
+async def callback_metrics():
+    return callback_client.stats()
+
+
+@app.get("/metrics/result-cache/")
+async def result_cache_metrics():
+    return result_cache.stats()
+
+
+@app.get("/metrics/ingest/")
+async def ingest_metrics():
+    return ingest_stats.stats()
+
+
+@app.get("/metrics/quality-tiers/")
+async def quality_tier_metrics():
+    return quality_stats.stats()
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=9000)
\ No newline at end of file
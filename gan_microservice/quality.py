@@ -0,0 +1,121 @@
+# quality.py
+import os
+import threading
+
+import cv2
+import numpy as np
+
+# Longest edge the generator sees per tier; 0 runs at the input resolution
+QUALITY_TIERS = {"draft": 512, "standard": 768, "high": 1024, "full": 0}
+DEFAULT_QUALITY_TIER = os.getenv("DEFAULT_QUALITY_TIER", "full")
+# Guided-filter settings for the edge-aware upsampler
+UPSAMPLE_RADIUS = int(os.getenv("UPSAMPLE_RADIUS", "4"))
+UPSAMPLE_EPS = float(os.getenv("UPSAMPLE_EPS", "1e-3"))
+
+
+def resolve_tier(quality):
+    """Return (tier name, max edge) for `quality`; raises ValueError for unknown tiers."""
+    tier = quality or DEFAULT_QUALITY_TIER
+    if tier not in QUALITY_TIERS:
+        raise ValueError(f"Unknown quality tier '{tier}', expected one of {', '.join(QUALITY_TIERS)}")
+    return tier, QUALITY_TIERS[tier]
+
+
+def capped_size(height, width, max_edge):
+    """Size an image is inferred at once its longest edge is capped to `max_edge`."""
+    if not max_edge or max(height, width) <= max_edge:
+        return height, width
+    scale = max_edge / max(height, width)
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+
+def _box(image, radius):
+    return cv2.boxFilter(image, -1, (2 * radius + 1, 2 * radius + 1))
+
+
+def upsample_edge_aware(image, guide, size, radius=UPSAMPLE_RADIUS, eps=UPSAMPLE_EPS):
+    """
+    Upscale a generated image using the full-resolution input as a guide
+
+    A fast guided filter (He & Sun): the linear coefficients relating the
+    generated image to the photo's luminance are fitted at the inference
+    size, then upsampled and applied to the full-resolution luminance, so
+    edges lost at the reduced size are restored from the input. Only the
+    final multiply-add runs at the output resolution.
+
+    Args:
+        image (np.ndarray): Generated RGB image, uint8
+        guide (np.ndarray): Original BGR image at the output resolution
+        size (tuple): Output (width, height)
+        radius (int): Filter window radius in inference-size pixels
+        eps (float): Regularisation; larger values smooth more
+    Returns:
+        np.ndarray: Upscaled RGB image, uint8
+    """
+    low_size = image.shape[1::-1]
+    if guide.shape[1::-1] != tuple(size):
+        guide = cv2.resize(guide, size, interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(guide, cv2.COLOR_BGR2GRAY)
+    gray_low = cv2.resize(gray, low_size, interpolation=cv2.INTER_AREA).astype(np.float32)[:, :, None] / 255
+    src = image.astype(np.float32) / 255
+
+    mean_i = _box(gray_low, radius)[:, :, None]
+    var_i = _box(gray_low * gray_low, radius)[:, :, None] - mean_i * mean_i
+    mean_p = _box(src, radius)
+    cov_ip = _box(gray_low * src, radius) - mean_i * mean_p
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    mean_a = cv2.resize(_box(a, radius), size, interpolation=cv2.INTER_LINEAR)
+    mean_b = cv2.resize(_box(b, radius), size, interpolation=cv2.INTER_LINEAR)
+    # In place: these are the only full-resolution float buffers
+    mean_a *= gray.astype(np.float32)[:, :, None]
+    mean_b *= 255
+    mean_a += mean_b
+    return np.clip(mean_a, 0, 255, out=mean_a).astype(np.uint8)
+
+
+def gradient_similarity(result, reference, c=0.0026):
+    """
+    Gradient magnitude similarity deviation of a tier's output against the full tier's (lower is better)
+
+    GMSD tracks how well edges and fine structure survive, which is what a
+    reduced inference size loses. It runs at full resolution, so it is
+    used by `tier_report.py` offline rather than per request.
+
+    Args:
+        result (np.ndarray): RGB output of the tier being scored, uint8
+        reference (np.ndarray): RGB output of the full tier for the same input, uint8
+    """
+    def magnitude(gray):
+        gray = gray.astype(np.float32) / 255
+        return np.sqrt(cv2.Sobel(gray, cv2.CV_32F, 1, 0) ** 2 + cv2.Sobel(gray, cv2.CV_32F, 0, 1) ** 2)
+    m_r = magnitude(cv2.cvtColor(result, cv2.COLOR_RGB2GRAY))
+    m_i = magnitude(cv2.cvtColor(reference, cv2.COLOR_RGB2GRAY))
+    gms = (2 * m_r * m_i + c) / (m_r ** 2 + m_i ** 2 + c)
+    return float(gms.std())
+
+
+class QualityTierStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers = {}
+
+    def record(self, tier, seconds):
+        with self._lock:
+            entry = self._tiers.setdefault(tier, {"images": 0, "seconds": 0.0})
+            entry["images"] += 1
+            entry["seconds"] += seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                tier: {
+                    "max_edge": QUALITY_TIERS[tier],
+                    "images": entry["images"],
+                    "avg_latency_ms": round(entry["seconds"] / entry["images"] * 1000, 1),
+                }
+                for tier, entry in self._tiers.items()
+            }
+
+
+quality_stats = QualityTierStats()
@@ -0,0 +1,203 @@
+# result_cache.py
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "result_cache")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(1024 ** 3)))
+# Serve the URL uploaded for an earlier identical request instead of uploading again
+RESULT_CACHE_REUSE_URLS = os.getenv("RESULT_CACHE_REUSE_URLS", "true").lower() == "true"
+
+# Bump when resizing, filtering or encoding change, so stale outputs are not served
+PROCESSING_VERSION = 1
+
+
+def model_fingerprint(model_path):
+    """Identify a model file by path, size and modification time without hashing it."""
+    stat = os.stat(model_path)
+    return f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class ResultCache:
+    def __init__(self, root=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        """
+        Content-addressed cache of finished stylized images
+
+        Entries are keyed by a hash of the decoded input pixels, the model
+        identity and the processing parameters, so re-uploading the same
+        photo (even re-encoded or renamed) skips inference. Each entry keeps
+        the output file and, once known, the URL it was uploaded to. Total
+        size on disk is bounded and the least recently used entries are
+        evicted first.
+
+        Several worker processes can share one directory: writes take a
+        file lock and re-read the index from disk before checking the size
+        bound, lookups fall back to the entry files other processes wrote,
+        and hits touch the output's access time, which orders eviction.
+
+        Args:
+            root (str): Cache directory
+            max_bytes (int): Maximum size of cached outputs on disk
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._lock_path = os.path.join(root, ".lock")
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self.uploads_saved = 0
+        os.makedirs(root, exist_ok=True)
+        # Reading the index also trims a directory left over the size bound
+        with self._exclusive():
+            pass
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the cache across threads and processes, with the index freshly read from disk."""
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._load()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self, key):
+        """Entry for `key` as written to disk by any process, or None."""
+        try:
+            with open(self._meta_path(key)) as f:
+                meta = json.load(f)
+            meta["size"] = os.path.getsize(meta["path"])
+        except (OSError, ValueError, KeyError):
+            return None
+        return meta
+
+    def _load(self):
+        """Rebuild the index from disk, oldest access first."""
+        self._entries = OrderedDict()
+        self.size = 0
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, name)) as f:
+                    meta = json.load(f)
+                stat = os.stat(meta["path"])
+            except (OSError, ValueError, KeyError):
+                continue
+            meta["size"] = stat.st_size
+            entries.append((stat.st_atime, name[:-5], meta))
+        for _, key, meta in sorted(entries, key=lambda entry: entry[0]):
+            self._entries[key] = meta
+            self.size += meta["size"]
+        self._evict()
+
+    @staticmethod
+    def key(image, model_path, **params):
+        """Hash decoded pixels together with everything that changes the output."""
+        digest = hashlib.sha256()
+        digest.update(str(image.shape).encode())
+        digest.update(str(image.dtype).encode())
+        digest.update(memoryview(image.tobytes()))
+        digest.update(model_fingerprint(model_path).encode())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        digest.update(str(PROCESSING_VERSION).encode())
+        return digest.hexdigest()
+
+    def _meta_path(self, key):
+        return os.path.join(self.root, f"{key}.json")
+
+    def _write_meta(self, key, meta):
+        partial = self._meta_path(key) + ".tmp"
+        with open(partial, "w") as f:
+            json.dump({"path": meta["path"], "url": meta.get("url")}, f)
+        os.replace(partial, self._meta_path(key))
+
+    def _remove(self, key):
+        meta = self._entries.pop(key)
+        self.size -= meta["size"]
+        for path in (meta["path"], self._meta_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get(self, key):
+        """Return the entry ({"path", "url", "size"}) for `key`, or None."""
+        with self._lock:
+            # Another process may have added, updated or evicted the entry
+            meta = self._read_meta(key)
+            if meta is None:
+                if key in self._entries:
+                    self.size -= self._entries.pop(key)["size"]
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self.size -= self._entries[key]["size"]
+            self._entries[key] = meta
+            self._entries.move_to_end(key)
+            self.size += meta["size"]
+            try:
+                os.utime(meta["path"])
+            except OSError:
+                pass
+            self.hits += 1
+            self.bytes_saved += meta["size"]
+            if meta.get("url") and RESULT_CACHE_REUSE_URLS:
+                self.uploads_saved += 1
+            return dict(meta)
+
+    def put(self, key, output_path, url=None):
+        """Copy a finished output into the cache, recording its uploaded URL if any."""
+        extension = os.path.splitext(output_path)[1]
+        path = os.path.join(self.root, f"{key}{extension}")
+        partial = path + ".tmp"
+        shutil.copyfile(output_path, partial)
+        os.replace(partial, path)
+        meta = {"path": path, "url": url, "size": os.path.getsize(path)}
+        with self._exclusive():
+            if key in self._entries:
+                self.size -= self._entries[key]["size"]
+            self._entries[key] = meta
+            self._entries.move_to_end(key)
+            self.size += meta["size"]
+            self._write_meta(key, meta)
+            self._evict()
+
+    def set_url(self, key, url):
+        with self._exclusive():
+            meta = self._entries.get(key)
+            if meta is not None and url:
+                meta["url"] = url
+                self._write_meta(key, meta)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes_saved": self.bytes_saved,
+                "uploads_saved": self.uploads_saved,
+            }
+
+
+result_cache = ResultCache()
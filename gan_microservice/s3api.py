@@ -1,14 +1,96 @@
 import os
+import threading
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import mimetypes
 import uuid
 from dotenv import load_dotenv
 
+from executor import run_io
+from ingest import MAX_INGEST_BYTES, MediaTooLarge, ingest_stats
+
+load_dotenv()
+
+UPLOAD_POOL_CONNECTIONS = int(os.getenv("UPLOAD_POOL_CONNECTIONS", "16"))
+# Files above the threshold are uploaded as concurrent multipart chunks
+MULTIPART_THRESHOLD = int(os.getenv("MULTIPART_THRESHOLD", str(16 * 1024 ** 2)))
+MULTIPART_CHUNKSIZE = int(os.getenv("MULTIPART_CHUNKSIZE", str(8 * 1024 ** 2)))
+MULTIPART_CONCURRENCY = int(os.getenv("MULTIPART_CONCURRENCY", "8"))
+# S3 rejects multipart parts (other than the last) below 5 MiB
+MIN_PART_SIZE = 5 * 1024 ** 2
+
+class SpacesMultipartUpload:
+    def __init__(self, client, space_name, key, content_type, public_url, part_size=MULTIPART_CHUNKSIZE):
+        """
+        Multipart upload fed incrementally, for output that is still being produced
+
+        Bytes passed to `write` are buffered and sent as a part whenever
+        `part_size` is reached, so the object is mostly uploaded by the
+        time the producer finishes; `complete` sends the remainder and
+        returns the public URL.
+
+        :param client: boto3 S3 client
+        :param space_name: Name of the Space to upload to
+        :param key: Object name
+        :param content_type: MIME type stored with the object
+        :param public_url: URL returned once the upload completes
+        :param part_size: Bytes per uploaded part
+        """
+        self.client = client
+        self.space_name = space_name
+        self.key = key
+        self.public_url = public_url
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.parts = []
+        self.bytes_uploaded = 0
+        self._buffer = bytearray()
+        self.upload_id = client.create_multipart_upload(
+            Bucket=space_name,
+            Key=key,
+            ACL='public-read',
+            ContentType=content_type,
+            ContentDisposition='inline',
+        )['UploadId']
+
+    def _upload_part(self, data):
+        number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.space_name, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=bytes(data),
+        )
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': number})
+        self.bytes_uploaded += len(data)
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+
+    def complete(self):
+        """Upload the buffered tail and finish the object, returning its public URL."""
+        if self._buffer or not self.parts:
+            self._upload_part(self._buffer)
+            self._buffer.clear()
+        self.client.complete_multipart_upload(
+            Bucket=self.space_name, Key=self.key, UploadId=self.upload_id, MultipartUpload={'Parts': self.parts},
+        )
+        return self.public_url
+
+    def abort(self):
+        try:
+            self.client.abort_multipart_upload(Bucket=self.space_name, Key=self.key, UploadId=self.upload_id)
+        except ClientError as e:
+            print(f"Error aborting upload: {e}")
+
 class DOSpacesManager:
     def __init__(self, access_key_id, secret_key, region='sgp1'):
         """
         Initialize DigitalOcean Spaces client
+
+        The client is thread-safe and keeps a pool of HTTP connections, so
+        one manager should be created per process and shared.
         
         :param access_key_id: Your DigitalOcean Spaces access key ID
         :param secret_key: Your DigitalOcean Spaces secret key
@@ -16,6 +98,8 @@ class DOSpacesManager:
         """
 
         self.region = region
+        self._checked_spaces = set()
+        self._lock = threading.Lock()
         # Create a session
         self.session = boto3.session.Session()
         
@@ -23,9 +107,20 @@ class DOSpacesManager:
         self.client = self.session.client(
             's3',
             region_name=region,
-            endpoint_url=f'https://{region}.digitaloceanspaces.com',
+            endpoint_url=os.getenv('SPACES_ENDPOINT_URL', f'https://{region}.digitaloceanspaces.com'),
             aws_access_key_id=access_key_id,
-            aws_secret_access_key=secret_key
+            aws_secret_access_key=secret_key,
+            config=Config(
+                max_pool_connections=UPLOAD_POOL_CONNECTIONS,
+                retries={'max_attempts': 5, 'mode': 'adaptive'},
+                tcp_keepalive=True,
+            ),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNKSIZE,
+            max_concurrency=MULTIPART_CONCURRENCY,
+            use_threads=True,
         )
 
     def create_space(self, space_name):
@@ -58,6 +153,58 @@ class DOSpacesManager:
                 print(f"Error creating Space: {e}")
             return False
 
+    def ensure_space(self, space_name):
+        """
+        Make sure the Space exists, creating it if needed; checked once per manager
+
+        :param space_name: Name of the Space
+        """
+        with self._lock:
+            if space_name in self._checked_spaces:
+                return
+            try:
+                self.client.head_bucket(Bucket=space_name)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('404', 'NoSuchBucket'):
+                    raise
+                self.create_space(space_name)
+            self._checked_spaces.add(space_name)
+
+    def public_url(self, space_name, object_name):
+        return f'https://{space_name}.{self.region}.cdn.digitaloceanspaces.com/{object_name}'
+
+    def open_upload_stream(self, space_name, file_extension):
+        """
+        Start a multipart upload that is written to while the file is produced
+
+        :param space_name: Name of the Space to upload to
+        :param file_extension: Extension of the object, e.g. ".mp4"
+        :return: SpacesMultipartUpload
+        """
+        content_type, _ = mimetypes.guess_type(f"upload{file_extension}")
+        if not (content_type and (content_type.startswith('image/') or content_type.startswith('video/'))):
+            raise ValueError("File must be an image or video")
+        object_name = str(uuid.uuid4()) + file_extension
+        return SpacesMultipartUpload(self.client, space_name, object_name, content_type,
+                                     self.public_url(space_name, object_name))
+
+    def download_object(self, space_name, object_name, file_path, max_bytes=None):
+        """
+        Download an object with parallel ranged GETs
+
+        :param space_name: Name of the Space holding the object
+        :param object_name: Key of the object
+        :param file_path: Local destination
+        :param max_bytes: Largest object accepted; bigger ones raise MediaTooLarge before downloading
+        :return: The object's content type
+        """
+        head = self.client.head_object(Bucket=space_name, Key=object_name)
+        if max_bytes is not None and head.get('ContentLength', 0) > max_bytes:
+            ingest_stats.rejected += 1
+            raise MediaTooLarge(f"Media is {head['ContentLength']} bytes, limit is {max_bytes}")
+        self.client.download_file(space_name, object_name, file_path, Config=self.transfer_config)
+        return head.get('ContentType', '')
+
     def upload_file(self, space_name, file_path):
         """
         Upload a file to a specific Space
@@ -79,17 +226,18 @@ class DOSpacesManager:
 
             self.client.upload_file(
             file_path, 
-            'ganaura', 
+            space_name, 
             random_filename, 
             ExtraArgs={
                 'ACL': 'public-read', 
                 'ContentType': content_type, 
                 'ContentDisposition': 'inline'
-                }
+                },
+            Config=self.transfer_config
                 )
             
             # Construct and return public URL
-            public_url = f'https://{space_name}.{self.region}.cdn.digitaloceanspaces.com/{random_filename}'
+            public_url = self.public_url(space_name, random_filename)
             return public_url
         
         except Exception as e:
@@ -97,19 +245,38 @@ class DOSpacesManager:
             return None
 
 
+SPACE_NAME = os.getenv('SPACE_NAME', 'ganaura')
+
+_spaces_manager = None
+_spaces_manager_lock = threading.Lock()
+
+
+def get_spaces_manager():
+    """Return the process-wide Spaces manager, creating it and checking the Space on first use."""
+    global _spaces_manager
+    with _spaces_manager_lock:
+        if _spaces_manager is None:
+            manager = DOSpacesManager(os.getenv('ACCESS_KEY_ID'), os.getenv('SECRET_KEY'))
+            manager.ensure_space(SPACE_NAME)
+            _spaces_manager = manager
+    return _spaces_manager
+
+
 def upload_to_cloud(file_path):
-    
-    load_dotenv()
-    ACCESS_KEY_ID = os.getenv('ACCESS_KEY_ID')
-    SECRET_KEY = os.getenv('SECRET_KEY')
-    SPACE_NAME = os.getenv('SPACE_NAME')
-    # Create Spaces manager
-    spaces_manager = DOSpacesManager(ACCESS_KEY_ID, SECRET_KEY)
-    
-    spaces_manager.create_space(SPACE_NAME)
-
-    # Optional: Upload a file to a Space
-    return spaces_manager.upload_file(
-        space_name=SPACE_NAME, 
+    return get_spaces_manager().upload_file(
+        space_name=SPACE_NAME,
         file_path=file_path
-    )
\ No newline at end of file
+    )
+
+
+def download_from_cloud(object_name, file_path):
+    return get_spaces_manager().download_object(SPACE_NAME, object_name, file_path, MAX_INGEST_BYTES)
+
+
+def open_upload_stream(file_extension='.mp4'):
+    return get_spaces_manager().open_upload_stream(SPACE_NAME, file_extension)
+
+
+async def upload_to_cloud_async(file_path):
+    """Upload on the I/O threads so the caller's next inference can start meanwhile."""
+    return await run_io(upload_to_cloud, file_path)
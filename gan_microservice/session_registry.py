@@ -0,0 +1,154 @@
+# session_registry.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import onnxruntime as ort
+
+DEFAULT_MODEL_PATH = 'models/generator.onnx'
+# Devices requested by the endpoints: /process-video/ asks for "gpu", the image endpoints default to "cpu"
+WARM_DEVICES = tuple(os.getenv("WARM_DEVICES", "gpu,cpu").split(","))
+
+
+def resolve_providers(device):
+    """Map the `device` string used by the endpoints to ONNX Runtime providers."""
+    if ort.get_device() == 'GPU' and device == "gpu":
+        return ('CUDAExecutionProvider', 'CPUExecutionProvider')
+    return ('CPUExecutionProvider',)
+
+
+class SessionRegistry:
+    def __init__(self, max_sessions=4):
+        """
+        Process-wide cache of ONNX Runtime inference sessions
+
+        Sessions are keyed by (model path, providers, thread settings) so the
+        image and video paths share one loaded graph per generator variant.
+        When more than `max_sessions` variants are loaded the least recently
+        used one is dropped.
+
+        Args:
+            max_sessions (int): Maximum number of sessions kept alive
+        """
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    def _key(self, model_path, providers, intra_op_threads, inter_op_threads):
+        return (os.path.abspath(model_path), tuple(providers), intra_op_threads, inter_op_threads)
+
+    def _load(self, model_path, providers, intra_op_threads, inter_op_threads):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+        return ort.InferenceSession(model_path, sess_options=options, providers=list(providers))
+
+    def get(self, model_path, device="cpu", intra_op_threads=0, inter_op_threads=0):
+        """
+        Return a shared session for the model, loading it on first use
+
+        Args:
+            model_path (str): Path to the ONNX model
+            device (str): "gpu" to prefer CUDA when available, anything else for CPU
+            intra_op_threads (int): ORT intra-op thread count (0 = ORT default)
+            inter_op_threads (int): ORT inter-op thread count (0 = ORT default)
+        """
+        providers = resolve_providers(device)
+        key = self._key(model_path, providers, intra_op_threads, inter_op_threads)
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+                self.hits += 1
+                return session
+            self.misses += 1
+            # Concurrent first requests for the same key wait on one load
+            # instead of each building their own copy of the graph.
+            loading = self._loading.get(key)
+            owner = loading is None
+            if owner:
+                loading = self._loading[key] = threading.Event()
+
+        if not owner:
+            loading.wait()
+            with self._lock:
+                session = self._sessions.get(key)
+            if session is not None:
+                return session
+            return self.get(model_path, device, intra_op_threads, inter_op_threads)
+
+        try:
+            start = time.perf_counter()
+            session = self._load(model_path, providers, intra_op_threads, inter_op_threads)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.load_time += elapsed
+                self._sessions[key] = session
+                while len(self._sessions) > self.max_sessions:
+                    evicted, _ = self._sessions.popitem(last=False)
+                    self.evictions += 1
+                    print(f"Evicted ONNX session for {evicted[0]}")
+            print(f"Loaded ONNX session for {model_path} in {elapsed * 1000:.0f} ms")
+            return session
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading.set()
+
+    def warm(self, model_paths, devices=("cpu",), thread_settings=(0,)):
+        """
+        Load the given models ahead of the first request, skipping missing files
+
+        Every (device, intra-op threads) pair the callers use is its own
+        session, so all of them are loaded. Warm-up lookups are not counted
+        as hits or misses, leaving the metrics to describe real requests.
+        """
+        with self._lock:
+            counters = self.hits, self.misses
+        for model_path in model_paths:
+            if not model_path or not os.path.exists(model_path):
+                print(f"Skipping warm-up, model not found: {model_path}")
+                continue
+            for device in devices:
+                for threads in thread_settings:
+                    try:
+                        self.get(model_path, device, intra_op_threads=threads)
+                    except Exception as e:
+                        print(f"Error warming session for {model_path}: {e}")
+        with self._lock:
+            self.hits, self.misses = counters
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "load_time_ms": round(self.load_time * 1000, 1),
+                "models": [key[0] for key in self._sessions],
+            }
+
+
+session_registry = SessionRegistry(max_sessions=int(os.getenv("ONNX_MAX_SESSIONS", "4")))
+
+
+def get_session(model_path, device="cpu"):
+    return session_registry.get(model_path, device)
@@ -0,0 +1,34 @@
+# conftest.py
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# The service imports its modules top-level, as when started from gan_microservice/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Module-level singletons create these directories on import; keep them out of the tree
+_scratch = tempfile.mkdtemp(prefix="gan-tests-")
+os.environ.setdefault("RESULT_CACHE_DIR", os.path.join(_scratch, "result_cache"))
+os.environ.setdefault("CALLBACK_OUTBOX_DIR", os.path.join(_scratch, "callback_outbox"))
+
+
+class StubSession:
+    """Stands in for an ONNX generator; returns its input unchanged."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input", shape=["batch", "height", "width", 3])]
+
+    def run(self, outputs, feeds):
+        self.calls += 1
+        return [feeds["input"]]
+
+
+@pytest.fixture
+def stub_session():
+    return StubSession()
@@ -0,0 +1,90 @@
+# test_batching.py
+import asyncio
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from batching import BatchScheduler
+
+
+def tensors(count, size=16):
+    return [np.full((1, size, size, 3), n, dtype=np.float32) for n in range(count)]
+
+
+async def infer_all(scheduler, inputs):
+    return await asyncio.gather(*(scheduler.infer(tensor) for tensor in inputs))
+
+
+def test_concurrent_requests_share_one_session_run(stub_session):
+    scheduler = BatchScheduler(stub_session, max_latency_ms=1000, max_batch=4)
+    inputs = tensors(4)
+
+    outputs = asyncio.run(infer_all(scheduler, inputs))
+
+    # A full batch is flushed straight away, without waiting for the timer
+    assert stub_session.calls == 1
+    for tensor, output in zip(inputs, outputs):
+        np.testing.assert_array_equal(output, tensor)
+    assert scheduler.stats()["avg_batch_size"] == 4
+
+
+def test_partial_batch_is_flushed_after_the_latency_budget(stub_session):
+    scheduler = BatchScheduler(stub_session, max_latency_ms=30, max_batch=8)
+
+    started = time.perf_counter()
+    outputs = asyncio.run(infer_all(scheduler, tensors(3)))
+    elapsed = time.perf_counter() - started
+
+    assert len(outputs) == 3
+    assert stub_session.calls == 1
+    assert elapsed >= 0.03
+    assert scheduler.stats()["waiting"] == 0
+
+
+def test_tensors_of_different_sizes_are_batched_apart(stub_session):
+    scheduler = BatchScheduler(stub_session, max_latency_ms=5, max_batch=8)
+    inputs = tensors(2, size=16) + tensors(2, size=24)
+
+    outputs = asyncio.run(infer_all(scheduler, inputs))
+
+    assert stub_session.calls == 2
+    assert [output.shape for output in outputs] == [tensor.shape for tensor in inputs]
+
+
+def test_session_error_reaches_every_caller_in_the_batch(stub_session, monkeypatch):
+    def fail(outputs, feeds):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(stub_session, "run", fail)
+    scheduler = BatchScheduler(stub_session, max_latency_ms=1000, max_batch=3)
+
+    async def collect():
+        return await asyncio.gather(*(scheduler.infer(tensor) for tensor in tensors(3)), return_exceptions=True)
+
+    results = asyncio.run(collect())
+
+    assert [type(result) for result in results] == [RuntimeError] * 3
+    assert scheduler.stats()["batches"] == 0
+
+
+def test_model_with_a_fixed_batch_of_one_is_never_batched(stub_session, monkeypatch):
+    monkeypatch.setattr(stub_session, "get_inputs",
+                        lambda: [SimpleNamespace(name="input", shape=[1, "height", "width", 3])])
+    scheduler = BatchScheduler(stub_session, max_latency_ms=1000, max_batch=8)
+
+    asyncio.run(infer_all(scheduler, tensors(3)))
+
+    assert scheduler.max_batch == 1
+    assert stub_session.calls == 3
+
+
+@pytest.mark.parametrize("max_batch", [2, 5])
+def test_more_requests_than_a_batch_are_split(stub_session, max_batch):
+    scheduler = BatchScheduler(stub_session, max_latency_ms=5, max_batch=max_batch)
+
+    outputs = asyncio.run(infer_all(scheduler, tensors(7)))
+
+    assert [int(output[0, 0, 0, 0]) for output in outputs] == list(range(7))
+    assert stub_session.calls == -(-7 // max_batch)
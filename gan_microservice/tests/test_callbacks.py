@@ -0,0 +1,160 @@
+# test_callbacks.py
+import asyncio
+import json
+import os
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from callbacks import CallbackClient
+
+
+class StubDjango:
+    """Save-media endpoints that answer from a script of (status, body) responses."""
+
+    def __init__(self):
+        self.single = []
+        self.batch = []
+        self.requests = []
+        self.secrets = []
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/save-media/", self.handle(self.single))
+        app.router.add_post("/save-media/batch/", self.handle(self.batch))
+        return app
+
+    def handle(self, script):
+        async def handler(request):
+            self.requests.append((request.path, await request.json()))
+            self.secrets.append(request.headers.get("FastAPI-Secret"))
+            status, body = script.pop(0) if script else (200, {})
+            return web.json_response(body, status=status)
+        return handler
+
+
+async def with_client(tmp_path, stub, scenario):
+    server = TestServer(stub.app())
+    await server.start_server()
+    client = CallbackClient(url=str(server.make_url("/save-media/")), batch_url=str(server.make_url("/save-media/batch/")),
+                            secret="s3cret", outbox_dir=str(tmp_path / "outbox"), max_retries=1)
+    try:
+        return await scenario(client)
+    finally:
+        await client.close()
+        await server.close()
+
+
+def outbox(client, payloads):
+    for payload in payloads:
+        client._store(payload)
+
+
+def rejected(client):
+    entries = []
+    for name in sorted(os.listdir(client.rejected_dir)):
+        with open(os.path.join(client.rejected_dir, name)) as f:
+            entries.append(json.load(f))
+    return entries
+
+
+def test_flush_sets_aside_only_entries_django_rejected(tmp_path):
+    stub = StubDjango()
+    stub.batch.append((200, {"results": [
+        {"index": 0, "user_media": "m0"},
+        {"index": 1, "errors": {"media_url": ["This field may not be null."]}},
+        {"index": 2, "user_media": "m2"},
+    ]}))
+    payloads = [{"user_id": "u", "media_url": url, "job_id": str(n)}
+                for n, url in enumerate(["https://a/0", None, "https://a/2"])]
+
+    async def scenario(client):
+        outbox(client, payloads)
+        assert await client.flush()
+        return client
+
+    client = asyncio.run(with_client(tmp_path, stub, scenario))
+    assert client.pending() == []
+    assert client.sent == 2
+    assert [entry["payload"] for entry in rejected(client)] == [payloads[1]]
+
+
+def test_refused_batch_is_resent_one_by_one(tmp_path):
+    stub = StubDjango()
+    stub.batch.append((400, {"completions": ["Invalid"]}))
+    stub.single.extend([(200, {}), (400, {"media_url": ["This field may not be null."]}), (200, {})])
+    payloads = [{"user_id": "u", "media_url": url} for url in ["https://a/0", None, "https://a/2"]]
+
+    async def scenario(client):
+        outbox(client, payloads)
+        assert await client.flush()
+        return client
+
+    client = asyncio.run(with_client(tmp_path, stub, scenario))
+    assert [path for path, _ in stub.requests] == ["/save-media/batch/"] + ["/save-media/"] * 3
+    assert client.pending() == []
+    assert client.sent == 2
+    assert [entry["payload"] for entry in rejected(client)] == [payloads[1]]
+
+
+def test_notify_retries_server_errors(tmp_path):
+    stub = StubDjango()
+    stub.single.extend([(503, {}), (200, {"user_media": "m0"})])
+
+    async def scenario(client):
+        assert await client.notify({"user_id": "u", "media_url": "https://a/0"})
+        return client
+
+    client = asyncio.run(with_client(tmp_path, stub, scenario))
+    assert (client.sent, client.retries, client.outboxed) == (1, 1, 0)
+    assert stub.secrets == ["s3cret", "s3cret"]
+
+
+def test_notify_keeps_rejected_payloads_without_retrying(tmp_path):
+    stub = StubDjango()
+    stub.single.append((400, {"media_url": ["This field may not be null."]}))
+    payload = {"user_id": "u", "media_url": None}
+
+    async def scenario(client):
+        assert await client.notify(payload)
+        return client
+
+    client = asyncio.run(with_client(tmp_path, stub, scenario))
+    assert len(stub.requests) == 1
+    assert client.pending() == []
+    assert [entry["payload"] for entry in rejected(client)] == [payload]
+
+
+def test_undelivered_notification_waits_in_the_outbox_until_flushed(tmp_path):
+    stub = StubDjango()
+    # Both attempts fail, then Django is back for the batch
+    stub.single.extend([(503, {}), (503, {})])
+    stub.batch.append((200, {"results": [{"index": 0, "user_media": "m0"}]}))
+    payload = {"user_id": "u", "media_url": "https://a/0", "job_id": "j0"}
+
+    async def scenario(client):
+        assert not await client.notify(payload)
+        assert len(client.pending()) == 1
+        # notify started the background flusher; flush now rather than wait for it
+        assert not client._flusher.done()
+        assert await client.flush()
+        return client
+
+    client = asyncio.run(with_client(tmp_path, stub, scenario))
+    assert stub.requests[-1] == ("/save-media/batch/", {"completions": [payload]})
+    assert (client.outboxed, client.sent) == (1, 1)
+    assert client.stats()["outbox_pending"] == 0
+
+
+def test_flush_keeps_the_outbox_while_django_is_down(tmp_path):
+    stub = StubDjango()
+    stub.batch.extend([(502, {}), (502, {})])
+
+    async def scenario(client):
+        outbox(client, [{"user_id": "u", "media_url": "https://a/0"}])
+        assert not await client.flush()
+        return client
+
+    client = asyncio.run(with_client(tmp_path, stub, scenario))
+    assert len(client.pending()) == 1
+    assert client.sent == 0
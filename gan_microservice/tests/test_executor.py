@@ -0,0 +1,106 @@
+# test_executor.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from executor import BoundedExecutor, ExecutorBusy, JobSlots
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=1)
+    yield BoundedExecutor(pool, max_workers=1, max_queue=1)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def test_calls_beyond_the_queue_are_refused(executor):
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert executor.saturated()
+        with pytest.raises(ExecutorBusy):
+            await executor.run(time.sleep, 0)
+        release.set()
+        await asyncio.gather(*running)
+        # Finished calls give their places back
+        return await executor.run(sum, [1, 2])
+
+    assert asyncio.run(scenario()) == 3
+    assert executor.stats() == {"pending": 0, "limit": 2}
+
+
+def test_failed_call_frees_its_place(executor):
+    async def scenario():
+        with pytest.raises(ZeroDivisionError):
+            await executor.run(divmod, 1, 0)
+
+    asyncio.run(scenario())
+    assert executor.pending == 0
+
+
+def test_event_loop_keeps_running_while_workers_block(executor):
+    async def scenario():
+        work = asyncio.ensure_future(executor.run(time.sleep, 0.3))
+        # A loop blocked by the sleep would fire these ticks late
+        lag = 0.0
+        while not work.done():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - started - 0.01)
+        return lag
+
+    assert asyncio.run(scenario()) < 0.1
+
+
+def test_job_slot_is_released_when_the_job_fails():
+    slots = JobSlots(1)
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    assert slots.try_acquire()
+    assert not slots.try_acquire()
+    with pytest.raises(RuntimeError):
+        asyncio.run(slots.run(broken))
+    assert slots.stats() == {"active": 0, "limit": 1}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "job_queue", None)
+    monkeypatch.setattr(main, "job_slots", JobSlots(1))
+    monkeypatch.setattr(main, "submit_job", lambda *args: None)
+    return TestClient(main.app)
+
+
+def post_images(client):
+    return client.post("/process-images/", json={"user_id": "u", "input_imgs_dir": "in"})
+
+
+def test_saturated_workers_answer_503(client, monkeypatch):
+    monkeypatch.setattr(main.blocking_executor, "saturated", lambda: True)
+
+    response = post_images(client)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    # Refused requests must not hold a job slot
+    assert main.job_slots.active == 0
+
+
+def test_jobs_beyond_the_limit_answer_429(client):
+    assert post_images(client).status_code == 200
+
+    response = post_images(client)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+    main.job_slots.release()
+    assert post_images(client).status_code == 200
@@ -0,0 +1,86 @@
+# test_generate_media.py
+import os
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+MKV_HEADER = b'\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\xf7\x81\x01\x42\x82\x88matroska'
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    jobs = []
+    monkeypatch.setattr(main, "reserve_job_slot", lambda: None)
+    monkeypatch.setattr(main, "release_job_slot", lambda: None)
+    monkeypatch.setattr(main, "submit_job", lambda tasks, kind, task_id, payload, *args: jobs.append((kind, payload)))
+    return TestClient(main.app), jobs
+
+
+def stored_object(monkeypatch, data, content_type):
+    def download(object_key, path):
+        with open(path, 'wb') as f:
+            f.write(data)
+        return content_type
+    monkeypatch.setattr(main, "download_from_cloud", download)
+
+
+def test_direct_upload_without_content_type_is_sniffed(service, monkeypatch):
+    client, jobs = service
+    stored_object(monkeypatch, MKV_HEADER + b'\x00' * 64, 'application/octet-stream')
+
+    job_id = str(uuid.uuid4())
+    response = client.post("/process-video/", data={"user_id": "u", "object_key": "uploads/u/clip.mkv",
+                                                    "job_id": job_id})
+
+    assert response.status_code == 200
+    assert response.json()["media_type"] == 'video'
+    assert [(kind, payload["job_id"]) for kind, payload in jobs] == [('video', job_id)]
+
+
+def test_declared_type_is_the_last_resort(service, monkeypatch):
+    client, jobs = service
+    stored_object(monkeypatch, b'\x00' * 128, '')
+
+    response = client.post("/process-video/", data={"user_id": "u", "object_key": "uploads/u/photo.webp",
+                                                    "media_type": "image"})
+
+    assert response.status_code == 200
+    assert [kind for kind, _ in jobs] == ['image']
+    # No job id from Django, so the callback must not send the generated task id
+    assert jobs[0][1]["job_id"] is None
+
+
+def test_unrecognised_media_is_refused(service, monkeypatch):
+    client, jobs = service
+    stored_object(monkeypatch, b'\x00' * 128, 'application/octet-stream')
+
+    response = client.post("/process-video/", data={"user_id": "u", "object_key": "uploads/u/blob.bin"})
+
+    assert response.status_code == 415
+    assert jobs == []
+    assert os.listdir("downloads") == []
+
+
+def test_shared_upload_is_sniffed_and_size_checked(service, tmp_path, monkeypatch):
+    client, jobs = service
+    media_root = tmp_path / "media"
+    media_root.mkdir()
+    upload = media_root / "clip.wmv"
+    upload.write_bytes(b'\x30\x26\xb2\x75\x8e\x66\xcf\x11' + b'\x00' * 64)
+    monkeypatch.setattr(main, "SHARED_MEDIA_ROOT", str(media_root))
+
+    response = client.post("/process-video/", data={"user_id": "u", "media_path": "http://django.invalid/clip.wmv",
+                                                    "local_path": str(upload)})
+    assert response.status_code == 200
+    assert [kind for kind, _ in jobs] == ['video']
+
+    monkeypatch.setattr(main, "MAX_INGEST_BYTES", 16)
+    response = client.post("/process-video/", data={"user_id": "u", "media_path": "http://django.invalid/clip.wmv",
+                                                    "local_path": str(upload)})
+    assert response.status_code == 413
+    assert len(jobs) == 1
+    assert upload.exists()
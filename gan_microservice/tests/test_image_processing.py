@@ -0,0 +1,45 @@
+# test_image_processing.py
+import asyncio
+
+import cv2
+import numpy as np
+
+import image_processing
+from result_cache import ResultCache
+
+
+def test_process_images_stylizes_and_caches(tmp_path, monkeypatch, stub_session):
+    input_path = tmp_path / "photo.png"
+    cv2.imwrite(str(input_path), np.random.default_rng(0).integers(0, 255, (300, 400, 3), dtype=np.uint8))
+    model_path = tmp_path / "generator.onnx"
+    model_path.write_bytes(b"model")
+
+    uploads, notifications = [], []
+
+    async def upload(path):
+        uploads.append(path)
+        return f"https://cdn.example/{len(uploads)}.png"
+
+    async def notify(user_id, media_url, job_id=None):
+        notifications.append((user_id, media_url, job_id))
+
+    monkeypatch.setattr(image_processing, "get_session", lambda model, device: stub_session)
+    monkeypatch.setattr(image_processing, "upload_to_cloud_async", upload)
+    monkeypatch.setattr(image_processing, "notify_django", notify)
+    monkeypatch.setattr(image_processing, "result_cache", ResultCache(str(tmp_path / "cache")))
+
+    output_dir = tmp_path / "out"
+    url = asyncio.run(image_processing.process_images("task-1", "user-1", str(input_path), str(output_dir),
+                                                      str(model_path), "cpu", None, "job-1"))
+
+    assert url == "https://cdn.example/1.png"
+    assert stub_session.calls == 1
+    assert cv2.imread(str(output_dir / "photo.png")).shape == (300, 400, 3)
+    assert notifications == [("user-1", url, "job-1")]
+
+    # The same pixels again are served from the cache without inference
+    asyncio.run(image_processing.process_images("task-2", "user-1", str(input_path), str(output_dir),
+                                                str(model_path), "cpu"))
+    assert stub_session.calls == 1
+    # Images Django never saw carry no job id, rather than the task's own
+    assert notifications[-1] == ("user-1", url, None)
@@ -0,0 +1,111 @@
+# test_ingest.py
+import asyncio
+import hashlib
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import ingest
+from ingest import ingest_response, sniff_media_type, MediaTooLarge
+
+PNG = b'\x89PNG\r\n\x1a\n'
+
+
+class FakeContent:
+    """Hands out the body in network-sized pieces, never more than asked for."""
+
+    def __init__(self, body, piece):
+        self.body = body
+        self.piece = piece
+        self.reads = []
+        self.consumed = 0
+
+    async def read(self, n):
+        self.reads.append(n)
+        await asyncio.sleep(0)
+        data, self.body = self.body[:min(n, self.piece)], self.body[min(n, self.piece):]
+        self.consumed += len(data)
+        return data
+
+
+class FakeResponse:
+    def __init__(self, body, content_type='', path='/media/file', piece=7, declare_length=True):
+        self.content = FakeContent(body, piece)
+        self.content_length = len(body) if declare_length else None
+        self.headers = {'Content-Type': content_type}
+        self.url = SimpleNamespace(path=path)
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_MIN_CHUNK", 16)
+    monkeypatch.setattr(ingest, "INGEST_MAX_CHUNK", 64)
+
+
+def ingest_body(tmp_path, response, **kwargs):
+    return asyncio.run(ingest_response(response, str(tmp_path / "download"), **kwargs))
+
+
+def test_body_is_streamed_hashed_and_named_from_its_bytes(tmp_path):
+    body = PNG + os.urandom(1000)
+    response = FakeResponse(body, content_type='application/octet-stream', path='/media/photo.bin')
+
+    path, media_type, size, content_hash = ingest_body(tmp_path, response)
+
+    assert (path, media_type, size) == (str(tmp_path / "download.png"), 'image', len(body))
+    assert content_hash == hashlib.sha256(body).hexdigest()
+    with open(path, 'rb') as f:
+        assert f.read() == body
+    assert not os.path.exists(tmp_path / "download.part")
+    # Requests grow from the minimum chunk up to the maximum
+    assert response.content.reads[0] == 16 and max(response.content.reads) == 64
+
+
+def test_unrecognised_bytes_fall_back_to_headers_then_url(tmp_path):
+    _, media_type, _, _ = ingest_body(tmp_path, FakeResponse(b'\x00' * 100, content_type='video/mp4; codecs=avc1'))
+    assert media_type == 'video'
+
+    path, media_type, _, _ = ingest_body(tmp_path, FakeResponse(b'\x00' * 100, path='/media/clip.xyz'))
+    assert (media_type, os.path.splitext(path)[1]) == ('unknown', '.xyz')
+
+
+def test_declared_length_over_the_limit_is_refused_before_reading(tmp_path):
+    response = FakeResponse(b'x' * 200)
+
+    with pytest.raises(MediaTooLarge):
+        ingest_body(tmp_path, response, max_bytes=100)
+
+    assert response.content.reads == []
+    assert os.listdir(tmp_path) == []
+
+
+def test_undeclared_body_over_the_limit_is_cut_off_and_removed(tmp_path):
+    rejected = ingest.ingest_stats.rejected
+    response = FakeResponse(PNG + b'x' * 500, declare_length=False)
+
+    with pytest.raises(MediaTooLarge):
+        ingest_body(tmp_path, response, max_bytes=100)
+
+    # Reading stops at the first piece past the limit
+    assert response.content.consumed <= 100 + response.content.piece
+    assert os.listdir(tmp_path) == []
+    assert ingest.ingest_stats.rejected == rejected + 1
+
+
+@pytest.mark.parametrize("head, expected", [
+    (b'\xff\xd8\xff\xe0', ('image', '.jpg')),
+    (b'GIF89a', ('image', '.gif')),
+    (b'RIFF\x00\x00\x00\x00WEBPVP8 ', ('image', '.webp')),
+    (b'\x00\x00\x00\x18ftypavif', ('image', '.avif')),
+    (b'\x00\x00\x00\x18ftypisom', ('video', '.mp4')),
+    (b'\x00\x00\x00\x14ftypqt  ', ('video', '.mov')),
+    (b'RIFF\x00\x00\x00\x00AVI LIST', ('video', '.avi')),
+    (b'\x30\x26\xb2\x75\x8e\x66\xcf\x11', ('video', '.wmv')),
+    (b'FLV\x01\x05', ('video', '.flv')),
+    (b'\x1a\x45\xdf\xa3\x9f\x42\x82\x84webm', ('video', '.webm')),
+    (b'\x1a\x45\xdf\xa3\x9f\x42\x82\x88matroska', ('video', '.mkv')),
+    (b'%PDF-1.7', ('unknown', '')),
+])
+def test_sniffing(head, expected):
+    assert sniff_media_type(head) == expected
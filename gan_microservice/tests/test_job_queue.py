@@ -0,0 +1,75 @@
+# test_job_queue.py
+import time
+
+import pytest
+
+from job_queue import JobQueue, IMAGE_PRIORITY, VIDEO_PRIORITY
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_images_are_claimed_before_older_videos(queue):
+    video = queue.enqueue("video", {"n": 1}, priority=VIDEO_PRIORITY)
+    image = queue.enqueue("image", {"n": 2}, priority=IMAGE_PRIORITY)
+
+    first, second = queue.claim("w1"), queue.claim("w2")
+
+    assert (first["id"], first["payload"], first["attempts"]) == (image, {"n": 2}, 1)
+    assert second["id"] == video
+    assert queue.claim("w3") is None
+    assert queue.depth() == 0
+
+
+def test_expired_lease_is_claimed_again(queue):
+    job_id = queue.enqueue("image", {})
+    queue.claim("crashed", visibility_timeout=0)
+
+    job = queue.claim("w2")
+
+    assert (job["id"], job["attempts"]) == (job_id, 2)
+
+
+def test_heartbeat_keeps_the_job_hidden(queue):
+    job_id = queue.enqueue("image", {})
+    queue.claim("w1", visibility_timeout=0)
+    queue.heartbeat(job_id, visibility_timeout=60)
+
+    assert queue.claim("w2") is None
+
+
+def test_failures_back_off_until_attempts_run_out(queue):
+    job_id = queue.enqueue("video", {}, max_attempts=2)
+
+    queue.claim("w1")
+    queue.fail(job_id, RuntimeError("boom"), retry_delay=60)
+    assert queue.get(job_id)["status"] == "queued"
+    assert queue.claim("w1") is None  # still backing off
+
+    queue.fail(job_id, RuntimeError("boom"), retry_delay=0)
+    queue.claim("w1")
+    queue.fail(job_id, RuntimeError("boom again"))
+
+    job = queue.get(job_id)
+    assert (job["status"], job["attempts"], job["error"]) == ("failed", 2, "boom again")
+    assert queue.counts() == {"failed": 1}
+
+
+def test_lease_expiring_on_the_last_attempt_fails_the_job(queue):
+    job_id = queue.enqueue("video", {}, max_attempts=1)
+    queue.claim("crashed", visibility_timeout=0)
+    time.sleep(0.01)
+
+    assert queue.claim("w2") is None
+    assert queue.get(job_id)["status"] == "failed"
+
+
+def test_complete_stores_the_result(queue):
+    job_id = queue.enqueue("image", {}, job_id="task-1")
+    queue.claim("w1")
+    queue.complete(job_id, "https://cdn.example/1.png")
+
+    job = queue.get("task-1")
+    assert (job["status"], job["result"], job["error"]) == ("done", "https://cdn.example/1.png", None)
@@ -0,0 +1,46 @@
+# test_quality.py
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+import tier_report
+from quality import capped_size, resolve_tier, upsample_edge_aware, gradient_similarity
+
+
+def test_resolve_tier():
+    assert resolve_tier("draft") == ("draft", 512)
+    with pytest.raises(ValueError):
+        resolve_tier("ultra")
+
+
+def test_capped_size_keeps_aspect_ratio():
+    assert capped_size(3000, 4000, 512) == (384, 512)
+    assert capped_size(300, 400, 512) == (300, 400)
+    assert capped_size(3000, 4000, 0) == (3000, 4000)
+
+
+def test_upsampler_restores_edges_from_the_guide():
+    photo = np.zeros((512, 512, 3), dtype=np.uint8)
+    cv2.circle(photo, (256, 256), 150, (255, 255, 255), -1)
+    small = cv2.cvtColor(cv2.resize(photo, (128, 128), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+    expected = cv2.cvtColor(photo, cv2.COLOR_BGR2RGB)
+
+    guided = upsample_edge_aware(small, photo, (512, 512))
+    plain = cv2.resize(small, (512, 512), interpolation=cv2.INTER_CUBIC)
+
+    assert guided.shape == (512, 512, 3)
+    assert gradient_similarity(guided, expected) < gradient_similarity(plain, expected)
+
+
+def test_tier_report_scores_against_the_full_tier(tmp_path, stub_session):
+    input_path = tmp_path / "photo.png"
+    cv2.imwrite(str(input_path), np.random.default_rng(0).integers(0, 255, (600, 800, 3), dtype=np.uint8))
+
+    scores = asyncio.run(tier_report.score_image(stub_session, str(input_path), "model.onnx", str(tmp_path)))
+
+    # 800 px fits inside the high tier, so only draft and standard lose detail
+    assert scores["full"][1] == scores["high"][1] == 0
+    assert scores["standard"][1] > 0
+    assert scores["draft"][1] > scores["standard"][1]
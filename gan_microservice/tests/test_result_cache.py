@@ -0,0 +1,52 @@
+# test_result_cache.py
+import numpy as np
+
+from result_cache import ResultCache
+
+
+def output(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_key_changes_with_pixels_and_parameters(tmp_path):
+    model_path = tmp_path / "generator.onnx"
+    model_path.write_bytes(b"model")
+    image = np.zeros((4, 4, 3), dtype=np.uint8)
+
+    key = ResultCache.key(image, str(model_path), max_edge=512)
+
+    assert key == ResultCache.key(image.copy(), str(model_path), max_edge=512)
+    assert key != ResultCache.key(image, str(model_path), max_edge=768)
+    image[0, 0, 0] = 1
+    assert key != ResultCache.key(image, str(model_path), max_edge=512)
+
+
+def test_entries_and_urls_survive_a_restart(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1000)
+    cache.put("a", output(tmp_path, "a.png", 100))
+    cache.set_url("a", "https://cdn.example/a.png")
+
+    entry = ResultCache(str(tmp_path / "cache"), max_bytes=1000).get("a")
+
+    assert entry["url"] == "https://cdn.example/a.png"
+    assert entry["size"] == 100
+
+
+def test_processes_sharing_a_directory_share_entries_and_the_size_bound(tmp_path):
+    root = str(tmp_path / "cache")
+    # Two instances on one directory stand in for two worker processes
+    first, second = ResultCache(root, max_bytes=250), ResultCache(root, max_bytes=250)
+    first.put("a", output(tmp_path, "a.png", 100))
+    first.put("b", output(tmp_path, "b.png", 100))
+
+    # Written by the other process after this one loaded its index
+    assert second.get("a")["size"] == 100
+    # The bound counts both processes' entries; "b" is the least recently used
+    second.put("c", output(tmp_path, "c.png", 100))
+
+    assert first.get("b") is None
+    assert first.get("a") is not None
+    assert sorted(ResultCache(root, max_bytes=250)._entries) == ["a", "c"]
+    assert second.stats()["size_bytes"] == 200
@@ -0,0 +1,91 @@
+# test_s3api.py
+import pytest
+from moto import mock_aws
+
+import s3api
+from ingest import MediaTooLarge
+from s3api import DOSpacesManager
+
+
+@pytest.fixture
+def spaces(monkeypatch):
+    # moto answers requests for the AWS endpoint, so point the client there
+    monkeypatch.setenv("SPACES_ENDPOINT_URL", "https://s3.amazonaws.com")
+    with mock_aws():
+        yield DOSpacesManager("key", "secret", region="us-east-1")
+
+
+def stored(manager, space, url):
+    key = url.rsplit("/", 1)[1]
+    return manager.client.get_object(Bucket=space, Key=key)
+
+
+def test_ensure_space_creates_the_bucket_once(spaces, monkeypatch):
+    spaces.ensure_space("ganaura")
+    assert [b["Name"] for b in spaces.client.list_buckets()["Buckets"]] == ["ganaura"]
+
+    # Later calls are answered from memory without a request
+    monkeypatch.setattr(spaces.client, "head_bucket", None)
+    spaces.ensure_space("ganaura")
+
+
+def test_upload_file_sets_content_type_and_returns_the_cdn_url(spaces, tmp_path):
+    spaces.ensure_space("ganaura")
+    path = tmp_path / "result.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\x00" * 32)
+
+    url = spaces.upload_file("ganaura", str(path))
+
+    assert url.startswith("https://ganaura.us-east-1.cdn.digitaloceanspaces.com/") and url.endswith(".png")
+    obj = stored(spaces, "ganaura", url)
+    assert obj["ContentType"] == "image/png"
+    assert obj["Body"].read() == path.read_bytes()
+
+
+def test_upload_file_refuses_other_files(spaces, tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("hello")
+    assert spaces.upload_file("ganaura", str(path)) is None
+
+
+def test_download_object_checks_the_size_first(spaces, tmp_path):
+    spaces.ensure_space("ganaura")
+    spaces.client.put_object(Bucket="ganaura", Key="uploads/clip.mp4", Body=b"v" * 100, ContentType="video/mp4")
+
+    destination = tmp_path / "clip.mp4"
+    assert spaces.download_object("ganaura", "uploads/clip.mp4", str(destination), max_bytes=100) == "video/mp4"
+    assert destination.read_bytes() == b"v" * 100
+
+    rejected = s3api.ingest_stats.rejected
+    with pytest.raises(MediaTooLarge):
+        spaces.download_object("ganaura", "uploads/clip.mp4", str(tmp_path / "big.mp4"), max_bytes=99)
+    assert not (tmp_path / "big.mp4").exists()
+    assert s3api.ingest_stats.rejected == rejected + 1
+
+
+def test_upload_stream_sends_parts_as_they_fill(spaces):
+    spaces.ensure_space("ganaura")
+    stream = spaces.open_upload_stream("ganaura", ".mp4")
+    chunk = b"f" * (1024 ** 2)
+    writes = stream.part_size // len(chunk) + 1
+
+    for _ in range(writes):
+        stream.write(chunk)
+    assert len(stream.parts) == 1  # the first full part went out while writing
+    url = stream.complete()
+
+    assert [part["PartNumber"] for part in stream.parts] == [1, 2]
+    obj = stored(spaces, "ganaura", url)
+    assert obj["ContentType"] == "video/mp4"
+    assert obj["Body"].read() == chunk * writes
+
+
+def test_aborted_stream_leaves_no_upload(spaces):
+    spaces.ensure_space("ganaura")
+    stream = spaces.open_upload_stream("ganaura", ".mp4")
+    stream.write(b"f" * 10)
+    stream.abort()
+
+    assert spaces.client.list_multipart_uploads(Bucket="ganaura").get("Uploads", []) == []
+    with pytest.raises(ValueError):
+        spaces.open_upload_stream("ganaura", ".txt")
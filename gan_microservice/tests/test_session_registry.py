@@ -0,0 +1,34 @@
+# test_session_registry.py
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import image_processing
+import main
+import video_processing
+from session_registry import SessionRegistry
+
+
+def test_startup_warms_every_session_the_endpoints_use(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "models").mkdir()
+    (tmp_path / "models" / "generator.onnx").write_bytes(b"model")
+
+    registry = SessionRegistry()
+    monkeypatch.setattr(registry, "_load", lambda *key: object())
+    for module in (main, video_processing):
+        monkeypatch.setattr(module, "session_registry", registry)
+    monkeypatch.setattr(image_processing, "get_session", registry.get)
+    monkeypatch.setattr(main, "get_spaces_manager", lambda: None)
+
+    asyncio.run(main.warm_sessions())
+    assert TestClient(main.app).get("/metrics/sessions/").json()["misses"] == 0
+
+    # What /process-video/ and the image endpoints look up on their first request
+    image_processing.get_session(main.DEFAULT_MODEL_PATH, 'gpu')
+    image_processing.get_session(main.DEFAULT_MODEL_PATH, 'cpu')
+    video_processing.Cartoonizer(str(tmp_path / "clip.mp4"), main.DEFAULT_MODEL_PATH, 'gpu', str(tmp_path)).load_session()
+
+    metrics = TestClient(main.app).get("/metrics/sessions/").json()
+    assert metrics["misses"] == 0
+    assert metrics["hits"] == 3
@@ -0,0 +1,80 @@
+# test_tiling.py
+import asyncio
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from tiling import infer_tiled, tile_starts, feather, tiling_params, TILED_MIN_PIXELS
+
+
+class IdentityScheduler:
+    """Returns tiles unchanged, recording how many were in flight at once."""
+
+    def __init__(self):
+        self.shapes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def infer(self, tensor):
+        self.shapes.append(tensor.shape)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        return tensor
+
+
+@pytest.mark.parametrize("length, tile, overlap", [(100, 512, 64), (512, 512, 64), (1000, 512, 64), (1300, 256, 32)])
+def test_tiles_cover_the_whole_length(length, tile, overlap):
+    starts = tile_starts(length, tile, overlap)
+    covered = np.zeros(length, dtype=bool)
+    for start in starts:
+        covered[start:start + tile] = True
+
+    assert covered.all()
+    assert starts[0] == 0 and starts[-1] == max(0, length - tile)
+    assert all(b - a <= tile - overlap for a, b in zip(starts, starts[1:]))
+
+
+def test_feather_never_reaches_zero():
+    mask = feather(64, 48, 8)
+    assert mask.shape == (64, 48, 1)
+    assert mask.min() > 0 and mask.max() == 1
+
+
+def test_blended_tiles_reproduce_the_input():
+    image = np.random.default_rng(0).uniform(-1, 1, (1, 300, 470, 3)).astype(np.float32)
+    scheduler = IdentityScheduler()
+
+    output = asyncio.run(infer_tiled(scheduler, image, tile=128, overlap=32, max_in_flight=3))
+
+    assert output.shape == image.shape
+    np.testing.assert_allclose(output, image, atol=1e-5)
+    assert set(scheduler.shapes) == {(1, 128, 128, 3)}
+    assert scheduler.max_in_flight <= 3
+
+
+def test_tiling_params_only_apply_to_tiled_sizes():
+    assert tiling_params(10, 10) == {}
+    if TILED_MIN_PIXELS:
+        assert set(tiling_params(TILED_MIN_PIXELS, 2)) == {"tile", "overlap"}
+
+
+def test_tiling_memory_does_not_grow_with_the_tiles_submitted():
+    image = np.zeros((1, 1536, 2048, 3), dtype=np.float32)
+    tile, in_flight = 256, 4
+
+    tracemalloc.start()
+    try:
+        output = asyncio.run(infer_tiled(IdentityScheduler(), image, tile=tile, overlap=32, max_in_flight=in_flight))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # The blended output and its weight plane are the only full-size buffers;
+    # beyond them only the tiles in flight (and their weighted copies) are held
+    full_size = image.nbytes + image.nbytes // 3
+    tile_bytes = tile * tile * 3 * 4
+    assert output.shape == image.shape
+    assert peak < full_size + in_flight * tile_bytes * 3 + 2 * 1024 ** 2
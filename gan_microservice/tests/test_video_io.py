@@ -0,0 +1,180 @@
+# test_video_io.py
+import io
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+
+import video_io
+from video_io import FFmpegReader, FFmpegWriter, normalize_frames
+
+
+class FakeStdin(io.BytesIO):
+    def __init__(self, broken=False):
+        super().__init__()
+        self.broken = broken
+
+    def write(self, data):
+        if self.broken:
+            raise BrokenPipeError()
+        return super().write(bytes(data))
+
+    def close(self):
+        self.received = self.getvalue()
+        super().close()
+
+
+class FakeProcess:
+    """Records what the writer sends to ffmpeg instead of encoding it."""
+
+    def __init__(self, cmd, returncode=0, stderr=b"", broken=False, stdout=None):
+        self.cmd = cmd
+        self.returncode = returncode
+        self.stdin = FakeStdin(broken)
+        self.stderr = io.BytesIO(stderr)
+        self.stdout = io.BytesIO(stdout) if stdout is not None else None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self):
+        return self.returncode
+
+    def kill(self):
+        pass
+
+
+@pytest.fixture
+def launched(monkeypatch):
+    processes = []
+
+    def launch(**options):
+        def popen(cmd, **kwargs):
+            processes.append(FakeProcess(cmd, **options))
+            return processes[-1]
+        monkeypatch.setattr(video_io.subprocess, "Popen", popen)
+        return processes
+    return launch
+
+
+def frame(width=6, height=4):
+    return np.zeros((height, width, 3), dtype=np.uint8)
+
+
+def test_frames_are_encoded_and_muxed_in_one_process(launched, monkeypatch):
+    processes = launched()
+    monkeypatch.setattr(video_io, "probe_audio_codec", lambda path: "aac")
+
+    writer = FFmpegWriter("out.mp4", 6, 4, 25, audio_source="in.mov")
+    for _ in range(3):
+        writer.write(frame())
+    writer.release()
+
+    [process] = processes
+    assert process.stdin.received == frame().tobytes() * 3
+    cmd = process.cmd
+    assert cmd[cmd.index("in.mov") + 1:cmd.index("in.mov") + 5] == ["-map", "0:v:0", "-map", "1:a:0?"]
+    assert cmd[cmd.index("-c:a") + 1] == "copy"
+    assert cmd[cmd.index("-c:v") + 1] == "libx264"
+    assert cmd[-1] == "out.mp4"
+
+
+def test_audio_the_muxer_rejects_is_reencoded(launched, monkeypatch):
+    processes = launched()
+    monkeypatch.setattr(video_io, "probe_audio_codec", lambda path: "pcm_s16le")
+
+    FFmpegWriter("out.mp4", 6, 4, 25, audio_source="in.avi").release()
+
+    cmd = processes[0].cmd
+    assert cmd[cmd.index("-c:a") + 1] == "aac"
+
+
+def test_video_without_audio_source_maps_no_audio(launched):
+    processes = launched()
+
+    FFmpegWriter("out.mp4", 6, 4, 25).release()
+
+    assert "-c:a" not in processes[0].cmd
+    assert processes[0].cmd.count("-i") == 1
+
+
+def test_frame_of_the_wrong_size_is_refused(launched):
+    launched()
+    writer = FFmpegWriter("out.mp4", 6, 4, 25)
+
+    with pytest.raises(ValueError):
+        writer.write(frame(width=8))
+
+
+def test_encoder_failure_is_raised_on_release(launched):
+    launched(returncode=1, stderr=b"Unknown encoder 'libx264'")
+    writer = FFmpegWriter("out.mp4", 6, 4, 25)
+
+    with pytest.raises(RuntimeError, match="libx264"):
+        writer.release()
+
+
+def test_encoder_that_exits_early_fails_the_next_write(launched):
+    launched(returncode=1, stderr=b"No space left on device", broken=True)
+    writer = FFmpegWriter("out.mp4", 6, 4, 25)
+
+    with pytest.raises(RuntimeError, match="No space left"):
+        writer.write(frame())
+
+
+def decoded(count, width=6, height=4):
+    """Raw rgb24 output for `count` frames, frame n filled with the value n."""
+    return b"".join(bytes([n]) * (width * height * 3) for n in range(count))
+
+
+def test_reader_fills_and_reuses_its_ring_of_buffers(launched):
+    # Half a frame at the end is what ffmpeg leaves when it is cut short
+    launched(stdout=decoded(5) + b"\x00" * 36)
+    reader = FFmpegReader("in.mp4", 6, 4, ring_size=2)
+
+    seen = []
+    for frame in reader.frames():
+        seen.append((int(frame[0, 0, 0]), id(frame)))
+        reader.release(frame)
+
+    assert [value for value, _ in seen] == [0, 1, 2, 3, 4]
+    assert {buffer for _, buffer in seen} == {id(slot) for slot in reader.slots}
+
+
+def test_reader_stops_when_closed_with_every_buffer_held(launched):
+    launched(stdout=decoded(4))
+    reader = FFmpegReader("in.mp4", 6, 4, ring_size=2)
+    frames = reader.frames()
+
+    held = [next(frames), next(frames)]
+    # No buffer is free, so decoding can only end once the reader is closed
+    reader.close()
+
+    assert list(frames) == []
+    assert [int(frame[0, 0, 0]) for frame in held] == [0, 1]
+
+
+def test_normalize_matches_the_float_conversion_it_replaces():
+    frames = [np.random.default_rng(n).integers(0, 256, (4, 6, 3), dtype=np.uint8) for n in range(3)]
+    out = np.empty((3, 4, 6, 3), dtype=np.float32)
+
+    batch = normalize_frames(frames, out=out)
+
+    assert batch is out
+    expected = np.stack([frame.astype(np.float32) / 127.5 - 1.0 for frame in frames])
+    np.testing.assert_allclose(batch, expected, atol=1e-6)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_encoded_file_has_every_frame(tmp_path):
+    path = str(tmp_path / "out.mp4")
+    writer = FFmpegWriter(path, 64, 48, 10)
+    for n in range(10):
+        writer.write(np.full((48, 64, 3), n * 20, dtype=np.uint8))
+    writer.release()
+
+    cap = cv2.VideoCapture(path)
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 10
+    assert (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))) == (64, 48)
+    cap.release()
@@ -0,0 +1,95 @@
+# test_video_pipeline.py
+import random
+import threading
+import time
+
+import pytest
+
+from video_pipeline import FramePipeline, PipelineStage
+
+
+def jitter(fn):
+    rng = random.Random(0)
+
+    def stage(value):
+        time.sleep(rng.random() * 0.002)
+        return fn(value)
+    return stage
+
+
+def run(pipeline, source):
+    written = []
+    pipeline.start(source, written.append)
+    pipeline.join()
+    return written
+
+
+def test_items_reach_the_sink_in_source_order():
+    # Several workers per stage finish out of order; the sink must not notice
+    pipeline = FramePipeline([
+        PipelineStage("infer", jitter(lambda n: n * 2), workers=4),
+        PipelineStage("post", jitter(lambda n: n + 1), workers=3),
+    ], queue_size=4)
+
+    assert run(pipeline, range(200)) == [n * 2 + 1 for n in range(200)]
+
+    stats = pipeline.stats()
+    assert stats["items"] == pipeline.decoded == 200
+    assert stats["stages"]["infer"]["items"] == stats["stages"]["post"]["items"] == 200
+    assert stats["queues"]["source"]["max"] <= 4
+
+
+def test_sink_waits_for_an_item_that_finishes_last():
+    first = threading.Event()
+
+    def slow_first(n):
+        if n == 0:
+            first.wait(5)
+        return n
+
+    pipeline = FramePipeline([PipelineStage("infer", slow_first, workers=2)], queue_size=8)
+    written = []
+    pipeline.start(range(6), written.append)
+
+    # The second worker finishes everything after item 0 while it is still running
+    deadline = time.monotonic() + 5
+    while pipeline.stages[0].items < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pipeline.stages[0].items == 5
+    assert written == []
+
+    first.set()
+    pipeline.join()
+    assert written == list(range(6))
+
+
+def test_stage_error_stops_the_pipeline_and_is_raised():
+    def explode(n):
+        if n == 5:
+            raise ValueError("bad frame")
+        return n
+
+    pipeline = FramePipeline([PipelineStage("infer", explode, workers=2)], queue_size=2)
+    pipeline.start(iter(range(10_000)), lambda n: None)
+
+    with pytest.raises(ValueError, match="bad frame"):
+        pipeline.join()
+    assert pipeline.written < 10_000
+    assert pipeline.is_done()
+
+
+def test_cancel_stops_an_endless_source():
+    def frames():
+        n = 0
+        while True:
+            yield n
+            n += 1
+
+    pipeline = FramePipeline([PipelineStage("infer", lambda n: n)], queue_size=2)
+    pipeline.start(frames(), lambda n: None)
+    time.sleep(0.05)
+    pipeline.cancel()
+    pipeline.join()
+
+    assert pipeline.is_done()
+    assert pipeline.error is None
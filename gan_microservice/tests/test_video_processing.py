@@ -0,0 +1,156 @@
+# test_video_processing.py
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+from moto import mock_aws
+
+import video_processing
+from s3api import DOSpacesManager
+from video_io import OpenCVWriter
+from video_processing import Cartoonizer
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    rng = np.random.default_rng(0)
+    for _ in range(11):
+        writer.write(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def read_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def render(clip, tmp_path, session, batch_size):
+    output = str(tmp_path / f"out-{batch_size}.avi")
+    cartoonizer = Cartoonizer(clip, "generator.onnx", "cpu", str(tmp_path), batch_size=batch_size,
+                              keyframe_threshold=0, decoder="opencv")
+    cartoonizer.sess = session
+    return cartoonizer.render(output), output
+
+
+@pytest.fixture(autouse=True)
+def opencv_writer(monkeypatch):
+    # Keep the output independent of whether ffmpeg is installed
+    monkeypatch.setattr(video_processing, "open_video_writer",
+                        lambda path, width, height, fps, audio_source=None, stream=None:
+                        OpenCVWriter(path, width, height, fps))
+
+
+def test_batched_frames_match_frame_by_frame_output(clip, tmp_path, stub_session):
+    single, single_path = render(clip, tmp_path, stub_session, 1)
+    assert stub_session.calls == 11
+
+    stub_session.calls = 0
+    batched, batched_path = render(clip, tmp_path, stub_session, 4)
+
+    # 11 frames in batches of 4 take three session runs
+    assert stub_session.calls == 3
+    assert single["frames"] == batched["frames"] == 11
+    assert batched["batch_size"] == 4
+    single_frames, batched_frames = read_frames(single_path), read_frames(batched_path)
+    assert len(single_frames) == len(batched_frames) == 11
+    for a, b in zip(single_frames, batched_frames):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_fixed_batch_model_runs_one_frame_at_a_time(clip, tmp_path, stub_session, monkeypatch):
+    inputs = stub_session.get_inputs()
+    inputs[0].shape = [1, "height", "width", 3]
+    monkeypatch.setattr(stub_session, "get_inputs", lambda: inputs)
+
+    stats, _ = render(clip, tmp_path, stub_session, 8)
+
+    assert stats["batch_size"] == 1
+    assert stub_session.calls == 11
+
+
+class RawStreamWriter:
+    """Forwards raw frames to the upload, as FFmpegWriter forwards ffmpeg's fragmented MP4."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_written = 0
+
+    def write(self, frame):
+        data = np.ascontiguousarray(frame).tobytes()
+        self.stream.write(data)
+        self.bytes_written += len(data)
+
+    def release(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+@pytest.fixture
+def spaces(monkeypatch):
+    monkeypatch.setenv("SPACES_ENDPOINT_URL", "https://s3.amazonaws.com")
+    with mock_aws():
+        manager = DOSpacesManager("key", "secret", region="us-east-1")
+        manager.ensure_space("ganaura")
+        monkeypatch.setattr(video_processing, "open_upload_stream",
+                            lambda extension: manager.open_upload_stream("ganaura", extension))
+        monkeypatch.setattr(video_processing, "open_video_writer",
+                            lambda path, width, height, fps, audio_source=None, stream=None: RawStreamWriter(stream))
+        yield manager
+
+
+@pytest.fixture
+def notified(monkeypatch):
+    urls = []
+
+    async def notify(user_id, media_url, job_id=None):
+        urls.append(media_url)
+
+    monkeypatch.setattr(video_processing, "notify_django", notify)
+    return urls
+
+
+def streaming(clip, tmp_path, session):
+    cartoonizer = Cartoonizer(clip, "generator.onnx", "cpu", str(tmp_path), keyframe_threshold=0,
+                              decoder="opencv", stream_upload=True)
+    cartoonizer.sess = session
+    return cartoonizer
+
+
+def test_streamed_output_becomes_the_uploaded_object(clip, tmp_path, stub_session, spaces, notified):
+    cartoonizer = streaming(clip, tmp_path, stub_session)
+
+    url = asyncio.run(cartoonizer.process("task", "user-1"))
+
+    assert notified == [url]
+    obj = spaces.client.get_object(Bucket="ganaura", Key=url.rsplit("/", 1)[1])
+    assert obj["ContentType"] == "video/mp4"
+    assert len(obj["Body"].read()) == cartoonizer.stats["bytes_written"] == 11 * 64 * 48 * 3
+    assert cartoonizer.stats["stream_upload"] is True
+
+
+def test_failed_render_aborts_the_streamed_upload(clip, tmp_path, stub_session, spaces, notified, monkeypatch):
+    def fail(outputs, feeds):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(stub_session, "run", fail)
+    cartoonizer = streaming(clip, tmp_path, stub_session)
+
+    with pytest.raises(RuntimeError, match="out of memory"):
+        asyncio.run(cartoonizer.process("task", "user-1"))
+
+    assert notified == []
+    assert spaces.client.list_multipart_uploads(Bucket="ganaura").get("Uploads", []) == []
+    assert spaces.client.list_objects_v2(Bucket="ganaura").get("KeyCount") == 0
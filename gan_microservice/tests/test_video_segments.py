@@ -0,0 +1,72 @@
+# test_video_segments.py
+import asyncio
+import json
+import os
+
+import pytest
+
+import video_segments
+from video_segments import SegmentedVideoJob
+
+
+def checkpointed_job(tmp_path, job_id="job-1", **kwargs):
+    source = tmp_path / "source.wmv"
+    source.write_bytes(b"video")
+    job = SegmentedVideoJob(str(source), "generator.onnx", "cpu", "out", job_id, "user-1",
+                            keyframe_threshold=4.0, **kwargs)
+    os.makedirs(job.work_dir)
+    job.manifest = {"source": str(source), "model_path": "generator.onnx", "device": "cpu", "output_dir": "out",
+                    "user_id": "user-1", "keyframe_threshold": 4.0, "attempts": 0, "segments": []}
+    job.save_manifest()
+    return job
+
+
+def failures():
+    with open(video_segments.SEGMENT_FAILURES_PATH) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture(autouse=True)
+def scratch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def test_pending_job_keeps_its_keyframe_threshold(tmp_path):
+    checkpointed_job(tmp_path)
+
+    [job] = SegmentedVideoJob.pending()
+
+    assert job.job_id == "job-1"
+    assert job.keyframe_threshold == 4.0
+
+
+def test_failing_job_is_given_up_after_its_attempts(tmp_path, monkeypatch):
+    job = checkpointed_job(tmp_path, max_attempts=2)
+
+    async def broken(task_id):
+        raise RuntimeError("decoder crashed")
+
+    monkeypatch.setattr(job, "render", broken)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(job.process("job-1"))
+    # A retry is still allowed, so the checkpoint stays for the next run
+    [resumed] = SegmentedVideoJob.pending()
+    assert resumed.manifest["attempts"] == 1
+    assert resumed.manifest["error"] == "decoder crashed"
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(job.process("job-1"))
+    assert not os.path.exists(job.work_dir)
+    assert SegmentedVideoJob.pending() == []
+    assert [(f["job_id"], f["attempts"], f["error"]) for f in failures()] == [("job-1", 2, "decoder crashed")]
+
+
+def test_job_interrupted_on_its_last_attempt_is_not_resumed(tmp_path):
+    job = checkpointed_job(tmp_path)
+    job.manifest["attempts"] = job.max_attempts
+    job.save_manifest()
+
+    assert SegmentedVideoJob.pending() == []
+    assert not os.path.exists(job.work_dir)
+    assert failures()[0]["job_id"] == "job-1"
@@ -0,0 +1,63 @@
+# tier_report.py
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from glob import glob
+
+from executor import run_blocking
+from image_processing import read_image, stylize, pic_form
+from quality import QUALITY_TIERS, gradient_similarity
+from session_registry import get_session, DEFAULT_MODEL_PATH
+
+
+async def score_image(session, input_path, model_path, scratch):
+    """Run one image through every tier; returns {tier: (seconds, GMSD against the full tier)}."""
+    img0 = await run_blocking(read_image, input_path)
+    outputs, timings = {}, {}
+    # Full first: it is the reference every other tier is scored against
+    for tier in sorted(QUALITY_TIERS, key=lambda name: QUALITY_TIERS[name] == 0, reverse=True):
+        started = time.perf_counter()
+        outputs[tier] = await stylize(session, input_path, img0, model_path, QUALITY_TIERS[tier],
+                                      os.path.join(scratch, f"{tier}{os.path.splitext(input_path)[1]}"))
+        timings[tier] = time.perf_counter() - started
+    reference = outputs["full"]
+    return {tier: (timings[tier], await run_blocking(gradient_similarity, outputs[tier], reference))
+            for tier in QUALITY_TIERS}
+
+
+async def main(args):
+    paths = sorted(path for path in glob(os.path.join(args.images, "*")) if os.path.splitext(path)[1] in pic_form)
+    if args.sample and len(paths) > args.sample:
+        paths = random.Random(0).sample(paths, args.sample)
+    session = await run_blocking(get_session, args.model, args.device)
+
+    totals = {tier: {"seconds": 0.0, "gmsd": 0.0} for tier in QUALITY_TIERS}
+    with tempfile.TemporaryDirectory() as scratch:
+        for path in paths:
+            for tier, (seconds, gmsd) in (await score_image(session, path, args.model, scratch)).items():
+                totals[tier]["seconds"] += seconds
+                totals[tier]["gmsd"] += gmsd
+
+    report = {
+        tier: {
+            "max_edge": QUALITY_TIERS[tier],
+            "images": len(paths),
+            "avg_latency_ms": round(total["seconds"] / len(paths) * 1000, 1),
+            "avg_gmsd_vs_full": round(total["gmsd"] / len(paths), 4),
+        }
+        for tier, total in totals.items()
+    } if paths else {}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and quality loss of each image quality tier")
+    parser.add_argument("images", type=str, help="Directory of sample photos")
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL_PATH, help="Path to the generator")
+    parser.add_argument("--device", type=str, default="cpu", help="'gpu' or 'cpu'")
+    parser.add_argument("--sample", type=int, default=0, help="Score a random subset of this many images (0 = all)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+# tiling.py
+import asyncio
+import os
+
+import numpy as np
+
+from batching import BATCH_MAX_SIZE
+from executor import run_blocking
+from utils import available_memory
+
+# Images with more pixels than this are run tile by tile; 0 disables tiling
+TILED_MIN_PIXELS = int(os.getenv("TILED_MIN_PIXELS", str(4_000_000)))
+TILE_SIZE = int(os.getenv("TILE_SIZE", "512"))
+TILE_OVERLAP = int(os.getenv("TILE_OVERLAP", "64"))
+# Memory allowed for tiles in flight; 0 uses a quarter of what is currently available
+TILE_MEMORY_BUDGET_MB = int(os.getenv("TILE_MEMORY_BUDGET_MB", "0"))
+
+
+def use_tiling(height, width):
+    return TILED_MIN_PIXELS > 0 and height * width > TILED_MIN_PIXELS
+
+
+def tiling_params(height, width):
+    """Settings that change a tiled result, for the result cache key; empty when not tiled."""
+    if not use_tiling(height, width):
+        return {}
+    return {"tile": TILE_SIZE, "overlap": TILE_OVERLAP}
+
+
+def tile_memory(tile):
+    """Rough peak bytes for one tile: input/output plus the 256-channel residual activations."""
+    return tile * tile * 3 * 4 * 2 + (tile // 4) * (tile // 4) * 256 * 4 * 6
+
+
+def tiles_in_flight(tile, budget_mb=TILE_MEMORY_BUDGET_MB):
+    budget = budget_mb * 1024 ** 2 if budget_mb > 0 else available_memory() * 0.25
+    return int(max(1, min(BATCH_MAX_SIZE * 2, budget // tile_memory(tile))))
+
+
+def tile_starts(length, tile, overlap):
+    """Offsets of tiles covering `length`; the last tile is pulled back to end at the edge."""
+    if length <= tile:
+        return [0]
+    stride = tile - overlap
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def feather(tile_h, tile_w, overlap):
+    """
+    Blend weights for one tile
+
+    Weights ramp linearly over `overlap` pixels on every side and never
+    reach zero, so pixels near the image border, which only one tile
+    covers, come through unchanged once normalised.
+    """
+    def ramp(n):
+        if overlap <= 0 or n <= 2 * overlap:
+            return np.ones(n, dtype=np.float32)
+        edge = np.arange(1, overlap + 1, dtype=np.float32) / (overlap + 1)
+        return np.concatenate([edge, np.ones(n - 2 * overlap, dtype=np.float32), edge[::-1]])
+    return np.outer(ramp(tile_h), ramp(tile_w))[:, :, None]
+
+
+class TileBlender:
+    def __init__(self, height, width, channels, tile_h, tile_w, overlap):
+        self.output = np.zeros((height, width, channels), dtype=np.float32)
+        self.weight = np.zeros((height, width, 1), dtype=np.float32)
+        self.mask = feather(tile_h, tile_w, overlap)
+
+    def add(self, y, x, tile):
+        h, w = tile.shape[:2]
+        self.output[y:y + h, x:x + w] += tile * self.mask
+        self.weight[y:y + h, x:x + w] += self.mask
+
+    def result(self):
+        np.divide(self.output, self.weight, out=self.output)
+        return self.output[None]
+
+
+async def infer_tiled(scheduler, image, tile=TILE_SIZE, overlap=TILE_OVERLAP, max_in_flight=None):
+    """
+    Run a large preprocessed image through the generator in overlapping tiles
+
+    Every tile has the same shape, so the batch scheduler groups them into
+    batched session runs. Only `max_in_flight` tiles are submitted at a
+    time, which bounds the activation memory regardless of image size, and
+    overlaps are blended with feathered weights to hide the seams.
+
+    Args:
+        scheduler (BatchScheduler): Scheduler of the generator session
+        image (np.ndarray): Input of shape (1, H, W, C) in [-1, 1]
+        tile (int): Tile edge in pixels; a multiple of 16 suits every generator
+        overlap (int): Pixels shared by neighbouring tiles
+        max_in_flight (int): Tiles submitted at once; derived from the memory budget if None
+    Returns:
+        np.ndarray: Generated image of shape (1, H, W, C)
+    """
+    _, height, width, channels = image.shape
+    tile_h, tile_w = min(tile, height), min(tile, width)
+    overlap = min(overlap, tile_h // 4, tile_w // 4)
+    blender = TileBlender(height, width, channels, tile_h, tile_w, overlap)
+    limit = asyncio.Semaphore(max_in_flight or tiles_in_flight(tile))
+
+    async def run_tile(y, x):
+        async with limit:
+            out = await scheduler.infer(np.ascontiguousarray(image[:, y:y + tile_h, x:x + tile_w]))
+            blender.add(y, x, out[0])
+
+    await asyncio.gather(*(run_tile(y, x)
+                           for y in tile_starts(height, tile_h, overlap)
+                           for x in tile_starts(width, tile_w, overlap)))
+    return await run_blocking(blender.result)
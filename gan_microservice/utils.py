@@ -1,4 +1,5 @@
 
+import os
 import jwt
 
 SECRET_KEY = 'django-insecure-dgb9&02$ski*_+mz!@fns!3j7wtpvs_e4+p$ii-+n+xug%2_hq'
@@ -13,4 +14,19 @@ class JWTUtils:
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
-            return None
\ No newline at end of file
+            return None
+
+
+def available_memory():
+    """Bytes of memory currently available to the process (best effort)."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return 2 * 1024 ** 3
@@ -0,0 +1,235 @@
+# video_io.py
+import json
+import queue
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+# Audio codecs the mp4 muxer accepts as-is; anything else is re-encoded to AAC
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'alac', 'ac3', 'eac3', 'opus', 'flac'}
+
+
+def probe_audio_codec(video_path):
+    """Return the codec name of the first audio stream, '' if there is none, None if unknown."""
+    try:
+        output = subprocess.check_output([
+            "ffprobe", "-v", "error", "-select_streams", "a:0",
+            "-show_entries", "stream=codec_name", "-of", "json", video_path,
+        ])
+        streams = json.loads(output).get("streams", [])
+        return streams[0].get("codec_name", "") if streams else ""
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+class FFmpegReader:
+    def __init__(self, video_path, width, height, ring_size=8):
+        """
+        Decode and scale frames with ffmpeg into a ring of reusable buffers
+
+        ffmpeg scales to the target size itself and writes rgb24 frames to a
+        pipe, which are read with `readinto` straight into preallocated
+        numpy arrays. A yielded frame keeps its buffer until it is handed
+        back with `release`, so the ring also bounds how far decoding can
+        run ahead of preprocessing.
+
+        Args:
+            video_path (str): Input video
+            width (int): Output frame width
+            height (int): Output frame height
+            ring_size (int): Number of frame buffers
+        """
+        self.video_path = video_path
+        self.width, self.height = width, height
+        self.slots = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(ring_size)]
+        self._index = {id(slot): i for i, slot in enumerate(self.slots)}
+        self._free = queue.Queue()
+        for i in range(ring_size):
+            self._free.put(i)
+        self.closed = False
+        self.proc = None
+
+    def _acquire(self):
+        while not self.closed:
+            try:
+                return self._free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def release(self, frame):
+        index = self._index.get(id(frame))
+        if index is not None:
+            self._free.put(index)
+
+    def frames(self):
+        """Yield (H, W, 3) uint8 RGB frames that must be released after use."""
+        self.proc = subprocess.Popen([
+            "ffmpeg", "-loglevel", "error", "-i", self.video_path,
+            "-vf", f"scale={self.width}:{self.height}:flags=lanczos",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1",
+        ], stdout=subprocess.PIPE, stdin=subprocess.DEVNULL, bufsize=0)
+        try:
+            while True:
+                index = self._acquire()
+                if index is None:
+                    break
+                slot = self.slots[index]
+                view = memoryview(slot).cast('B')
+                filled = 0
+                while filled < len(view):
+                    n = self.proc.stdout.readinto(view[filled:])
+                    if not n:
+                        break
+                    filled += n
+                if filled < len(view):
+                    self._free.put(index)
+                    break
+                yield slot
+        finally:
+            self.close()
+
+    def close(self):
+        self.closed = True
+        if self.proc and self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+
+
+def normalize_frames(frames, out=None):
+    """Stack uint8 RGB frames into a float32 [-1, 1] batch without intermediate copies."""
+    if out is None:
+        out = np.empty((len(frames),) + frames[0].shape, dtype=np.float32)
+    for i, frame in enumerate(frames):
+        np.multiply(frame, 1 / 127.5, out=out[i], casting='unsafe')
+    out -= 1.0
+    return out
+
+
+class FFmpegWriter:
+    def __init__(self, output_path, width, height, fps, audio_source=None, crf=25, preset="veryfast", stream=None):
+        """
+        Encode RGB frames to H.264 with a single long-lived ffmpeg process
+
+        Raw frames are piped to ffmpeg's stdin and the audio track of
+        `audio_source` (if any) is muxed in the same pass, so the output is
+        encoded once and written to disk once.
+
+        With `stream` set, ffmpeg writes fragmented MP4 to its stdout instead
+        and a thread forwards it to `stream.write` as it is produced, so the
+        output never has to exist as a local file.
+
+        Args:
+            output_path (str): Destination .mp4 file
+            width (int): Frame width in pixels
+            height (int): Frame height in pixels
+            fps (float): Output frame rate
+            audio_source (str): Optional file whose first audio stream is copied
+            crf (int): x264 constant rate factor
+            preset (str): x264 speed preset
+            stream: Optional object with a `write(bytes)` method receiving the output
+        """
+        self.output_path = output_path
+        self.frame_bytes = width * height * 3
+        self.stream = stream
+        self.bytes_written = 0
+        self._pump = None
+        self._pump_error = None
+        cmd = [
+            "ffmpeg", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps or 30),
+            "-i", "pipe:0",
+        ]
+        if audio_source:
+            cmd += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?"]
+            codec = probe_audio_codec(audio_source)
+            cmd += ["-c:a", "copy"] if codec is None or codec in MP4_AUDIO_CODECS else ["-c:a", "aac"]
+        cmd += [
+            # yuv420p needs even dimensions
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p", "-shortest",
+        ]
+        if stream is None:
+            cmd += ["-movflags", "+faststart", output_path]
+        else:
+            # faststart needs a seekable file; fragments can be sent as soon as they are cut
+            cmd += ["-movflags", "frag_keyframe+empty_moov+default_base_moof", "-f", "mp4", "pipe:1"]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     stdout=subprocess.PIPE if stream is not None else None)
+        if stream is not None:
+            self._pump = threading.Thread(target=self._forward, daemon=True)
+            self._pump.start()
+
+    def _forward(self, chunk_size=1024 ** 2):
+        try:
+            while True:
+                data = self.proc.stdout.read(chunk_size)
+                if not data:
+                    break
+                self.stream.write(data)
+                self.bytes_written += len(data)
+        except Exception as e:
+            self._pump_error = e
+            # Stop the encoder; the next write or release reports the failure
+            self.proc.kill()
+
+    def write(self, frame):
+        """Write one (H, W, 3) uint8 RGB frame."""
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.nbytes != self.frame_bytes:
+            raise ValueError(f"Unexpected frame size: {frame.shape}")
+        try:
+            self.proc.stdin.write(frame.data)
+        except BrokenPipeError:
+            if self._pump_error is not None:
+                raise self._pump_error
+            raise RuntimeError(f"ffmpeg exited early: {self.proc.stderr.read().decode(errors='replace')}")
+
+    def release(self):
+        """Finish encoding, raising if ffmpeg failed."""
+        if self.proc.stdin and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        error = self.proc.stderr.read().decode(errors='replace')
+        if self._pump is not None:
+            self._pump.join()
+        if self._pump_error is not None:
+            raise self._pump_error
+        if self.proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {error}")
+
+    def abort(self):
+        self.proc.kill()
+        self.proc.wait()
+        if self._pump is not None:
+            self._pump.join()
+
+
+class OpenCVWriter:
+    def __init__(self, output_path, width, height, fps):
+        """Silent mp4v fallback used when ffmpeg is not installed."""
+        self.output_path = output_path
+        self.writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+
+    def write(self, frame):
+        self.writer.write(frame[:, :, ::-1])
+
+    def release(self):
+        self.writer.release()
+
+    def abort(self):
+        self.writer.release()
+
+
+def open_video_writer(output_path, width, height, fps, audio_source=None, stream=None):
+    try:
+        return FFmpegWriter(output_path, width, height, fps, audio_source, stream=stream)
+    except FileNotFoundError:
+        if stream is not None:
+            raise
+        print("FFmpeg not found, writing a silent mp4v video.")
+        return OpenCVWriter(output_path, width, height, fps)
@@ -0,0 +1,191 @@
+# video_pipeline.py
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class PipelineStage:
+    def __init__(self, name, fn, workers=1):
+        """
+        One step of a FramePipeline
+
+        Args:
+            name (str): Label used in the stats report
+            fn (callable): Function applied to every item passing through
+            workers (int): Number of threads running `fn` concurrently
+        """
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.items = 0
+        self.busy = 0.0
+        self._active = self.workers
+        self._lock = threading.Lock()
+
+    def record(self, elapsed):
+        with self._lock:
+            self.items += 1
+            self.busy += elapsed
+
+    def finish_worker(self):
+        """Return True for the last worker of the stage to finish."""
+        with self._lock:
+            self._active -= 1
+            return self._active == 0
+
+
+class FramePipeline:
+    def __init__(self, stages, queue_size=16):
+        """
+        Threaded multi-stage pipeline with bounded queues between stages
+
+        Items from the source are tagged with a sequence number, pass through
+        every stage (each possibly running several workers, so they can finish
+        out of order) and are handed to the sink strictly in source order.
+
+        Args:
+            stages (list[PipelineStage]): Stages in processing order
+            queue_size (int): Capacity of each queue between stages
+        """
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+        self.queue_names = ["source"] + [stage.name for stage in stages]
+        self._occupancy = [[0, 0, 0] for _ in self.queues]  # samples, total, max
+        self._stop = threading.Event()
+        self._threads = []
+        self.error = None
+        self.decoded = 0
+        self.written = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def _fail(self, e):
+        if self.error is None:
+            self.error = e
+        self._stop.set()
+
+    def _put(self, index, item):
+        q = self.queues[index]
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            sample = self._occupancy[index]
+            size = q.qsize()
+            sample[0] += 1
+            sample[1] += size
+            sample[2] = max(sample[2], size)
+            return True
+        return False
+
+    def _get(self, index):
+        q = self.queues[index]
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _source(self, source):
+        try:
+            for seq, item in enumerate(source):
+                if not self._put(0, (seq, item)):
+                    return
+                self.decoded += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(0, _END)
+
+    def _worker(self, index, stage):
+        try:
+            while True:
+                item = self._get(index)
+                if item is _END:
+                    # Let the stage's other workers see the end marker too
+                    self._put(index, _END)
+                    break
+                seq, value = item
+                start = time.perf_counter()
+                value = stage.fn(value)
+                stage.record(time.perf_counter() - start)
+                if not self._put(index + 1, (seq, value)):
+                    break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if stage.finish_worker():
+                self._put(index + 1, _END)
+
+    def _sink(self, sink):
+        pending = {}
+        next_seq = 0
+        try:
+            while True:
+                item = self._get(len(self.stages))
+                if item is _END:
+                    break
+                seq, value = item
+                pending[seq] = value
+                while next_seq in pending:
+                    sink(pending.pop(next_seq))
+                    next_seq += 1
+                    self.written += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self.finished_at = time.perf_counter()
+
+    def start(self, source, sink):
+        """Start all threads; `sink` receives processed items in source order."""
+        self.started_at = time.perf_counter()
+        self._threads.append(threading.Thread(target=self._source, args=(source,), daemon=True))
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                self._threads.append(threading.Thread(target=self._worker, args=(index, stage), daemon=True))
+        self._threads.append(threading.Thread(target=self._sink, args=(sink,), daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def is_done(self):
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def cancel(self):
+        self._stop.set()
+
+    def join(self, raise_error=True):
+        """Wait for every thread and re-raise the first error hit by any stage."""
+        for thread in self._threads:
+            thread.join()
+        if raise_error and self.error is not None:
+            raise self.error
+
+    def stats(self):
+        elapsed = ((self.finished_at or time.perf_counter()) - self.started_at) if self.started_at else 0.0
+        return {
+            "items": self.written,
+            "elapsed_s": round(elapsed, 2),
+            "items_per_s": round(self.written / elapsed, 2) if elapsed else 0.0,
+            "stages": {
+                stage.name: {
+                    "workers": stage.workers,
+                    "items": stage.items,
+                    # throughput one stage could sustain if it never waited on its neighbours
+                    "items_per_s": round(stage.items * stage.workers / stage.busy, 2) if stage.busy else 0.0,
+                    "busy_s": round(stage.busy, 2),
+                }
+                for stage in self.stages
+            },
+            "queues": {
+                name: {
+                    "capacity": self.queues[i].maxsize,
+                    "avg": round(sample[1] / sample[0], 2) if sample[0] else 0.0,
+                    "max": sample[2],
+                }
+                for i, (name, sample) in enumerate(zip(self.queue_names, self._occupancy))
+            },
+        }
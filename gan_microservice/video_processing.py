@@ -1,25 +1,48 @@
 # video_processing.py
 import cv2
 import numpy as np
-import onnxruntime as ort
 from PIL import Image
 import queue
 import threading
 import os
 import asyncio
-import subprocess
-import requests
+import time
+import shutil
+from collections import deque
 from websocket_handler import active_connections
-from s3api import upload_to_cloud
-
-DJANGO_API_URL = 'http://127.0.0.1:8000/api/gan/save-media/'
-FASTAPI_SECRET = "absdfasasdfasf"
+from callbacks import callback_client
+from s3api import upload_to_cloud_async, open_upload_stream
+from session_registry import session_registry
+from executor import run_io
+from video_pipeline import FramePipeline, PipelineStage
+from video_io import open_video_writer, FFmpegReader, normalize_frames
+from utils import available_memory
 
 video_form = ['.mp4', '.avi', '.mov', '.mkv']
 
+VIDEO_PREPROCESS_WORKERS = int(os.getenv("VIDEO_PREPROCESS_WORKERS", "1"))
+VIDEO_INFERENCE_WORKERS = int(os.getenv("VIDEO_INFERENCE_WORKERS", "2"))
+VIDEO_POSTPROCESS_WORKERS = int(os.getenv("VIDEO_POSTPROCESS_WORKERS", "2"))
+VIDEO_QUEUE_SIZE = int(os.getenv("VIDEO_QUEUE_SIZE", "16"))
+# Frames per session.run; 0 picks a size from free memory and the frame size
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "0"))
+MAX_VIDEO_BATCH = 16
+# Mean absolute difference (0-255) below which a frame reuses the last keyframe's
+# stylized output; 0 disables keyframe reuse
+VIDEO_KEYFRAME_THRESHOLD = float(os.getenv("VIDEO_KEYFRAME_THRESHOLD", "0"))
+VIDEO_KEYFRAME_MAX_REUSE = int(os.getenv("VIDEO_KEYFRAME_MAX_REUSE", "12"))
+# "opencv" decodes with cv2 and resizes with PIL, "ffmpeg" decodes and scales in ffmpeg
+VIDEO_DECODER = os.getenv("VIDEO_DECODER", "opencv")
+# Upload fragmented MP4 while it is encoded instead of after the file is finished
+VIDEO_STREAM_UPLOAD = os.getenv("VIDEO_STREAM_UPLOAD", "false").lower() == "true"
+
+# Stage throughput and queue occupancy of the last few jobs, for tuning worker counts
+recent_pipeline_stats = deque(maxlen=20)
+
 class Videocap:
-    def __init__(self, video_path, model_name, limit=1280):
+    def __init__(self, video_path, model_name, limit=1280, start_reader=True, decoder="opencv"):
         self.model_name = model_name
+        self.video_path = video_path
         vid = cv2.VideoCapture(video_path)
         width = int(vid.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(vid.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -38,9 +61,15 @@ class Videocap:
         self.ret, frame = self.cap.read()
         self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
         self.q = queue.Queue(maxsize=60)
-        t = threading.Thread(target=self._reader)
-        t.daemon = True
-        t.start()
+        self.reader = None
+        if decoder == "ffmpeg" and not shutil.which("ffmpeg"):
+            print("FFmpeg not found, decoding with OpenCV.")
+            decoder = "opencv"
+        self.decoder = decoder
+        if start_reader:
+            t = threading.Thread(target=self._reader)
+            t.daemon = True
+            t.start()
 
     def _reader(self):
         while True:
@@ -52,6 +81,53 @@ class Videocap:
             self.count += 1
         self.cap.release()
 
+    def frames(self, ring_size=8):
+        """Yield raw frames; used when a FramePipeline does the preprocessing."""
+        if self.decoder == "ffmpeg":
+            # ffmpeg yields RGB frames already scaled to (width, height)
+            self.cap.release()
+            self.reader = FFmpegReader(self.video_path, self.width, self.height, ring_size)
+            yield from self.reader.frames()
+            return
+        try:
+            while True:
+                self.ret, frame = self.cap.read()
+                if not self.ret:
+                    break
+                self.count += 1
+                yield frame
+        finally:
+            self.cap.release()
+
+    def batches(self, batch_size, frames=None):
+        """Yield lists of up to `batch_size` consecutive items from `frames` (raw frames by default)."""
+        batch = []
+        for frame in (self.frames() if frames is None else frames):
+            batch.append(frame)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def preprocess(self, frames):
+        """Turn frames from `frames()` into a (N, H, W, 3) float32 batch in [-1, 1]."""
+        if self.reader:
+            batch = normalize_frames(frames)
+            self.release(frames)
+            return batch
+        return np.concatenate([self.process_frame(frame, self.width, self.height) for frame in frames], axis=0)
+
+    def release(self, frames):
+        """Hand decoder buffers back once the frames are no longer needed."""
+        if self.reader:
+            for frame in frames:
+                self.reader.release(frame)
+
+    def close(self):
+        if self.reader:
+            self.reader.close()
+
     def read(self):
         f = self.q.get()
         self.q.task_done()
@@ -68,26 +144,167 @@ class Videocap:
         img = np.array(img).astype(np.float32) / 127.5 - 1.0
         return np.expand_dims(img, axis=0)
 
+async def notify_django(user_id, media_url, job_id=None):
+    return await callback_client.notify({
+        "user_id": user_id,
+        "media_type": 'video',
+        "media_url": media_url,
+        "job_id": str(job_id) if job_id else None,
+    })
+
+
+class KeyframeSelector:
+    def __init__(self, threshold, max_reuse=VIDEO_KEYFRAME_MAX_REUSE, thumb_width=96):
+        """
+        Decide which frames need a fresh pass through the generator
+
+        Each frame is shrunk to a small grayscale thumbnail and compared with
+        the thumbnail of the last keyframe. Frames whose mean absolute
+        difference stays under `threshold` reuse the keyframe's stylized
+        output; after `max_reuse` reused frames a keyframe is forced so slow
+        drift still gets picked up.
+        """
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.thumb_width = thumb_width
+        self.reference = None
+        self.reused = 0
+        self.keyframes = 0
+        self.skipped = 0
+
+    def is_keyframe(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.thumb_width, max(1, round(h * self.thumb_width / w)))
+        thumb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+        if (self.reference is None or self.reused >= self.max_reuse
+                or np.mean(np.abs(thumb - self.reference)) > self.threshold):
+            self.reference = thumb
+            self.reused = 0
+            self.keyframes += 1
+            return True
+        self.reused += 1
+        self.skipped += 1
+        return False
+
+    def tag(self, frames):
+        for frame in frames:
+            yield frame, self.is_keyframe(frame)
+
+
+def auto_batch_size(width, height, workers=1, memory_fraction=0.25):
+    """
+    Pick how many frames to stack into one inference call
+
+    The generator's widest activations are the 256-channel residual blocks
+    at a quarter of the input resolution; budgeting a handful of those per
+    frame keeps every inference worker's batch inside `memory_fraction` of
+    the memory currently available.
+    """
+    per_frame = width * height * 3 * 4 * 2 + (width // 4) * (height // 4) * 256 * 4 * 6
+    budget = available_memory() * memory_fraction / max(1, workers)
+    return int(max(1, min(MAX_VIDEO_BATCH, budget // per_frame)))
+
+
+def video_session_threads(inference_workers=VIDEO_INFERENCE_WORKERS):
+    """Intra-op threads per video session: the cores are split between inference workers
+    instead of letting each session.run spread over all of them."""
+    return max(1, (os.cpu_count() or 1) // inference_workers)
+
+
+def render_frame(frame, fake_img, wh, if_concat):
+    """Post-process one generated frame into the image written to the video."""
+    filtered_fake_img = Cartoonizer.filter(Cartoonizer.post_process(fake_img, wh))
+
+    if if_concat == "Horizontal":
+        return np.hstack((Cartoonizer.filter(frame), filtered_fake_img))
+    elif if_concat == "Vertical":
+        return np.vstack((Cartoonizer.filter(frame), filtered_fake_img))
+    return filtered_fake_img
+
+
 class Cartoonizer:
-    def __init__(self, video_path, model_path, device, output_dir, if_concat="None"):
+    def __init__(self, video_path, model_path, device, output_dir, if_concat="None",
+                 inference_workers=VIDEO_INFERENCE_WORKERS, postprocess_workers=VIDEO_POSTPROCESS_WORKERS,
+                 batch_size=VIDEO_BATCH_SIZE, keyframe_threshold=VIDEO_KEYFRAME_THRESHOLD, decoder=VIDEO_DECODER,
+                 session_threads=0, stream_upload=VIDEO_STREAM_UPLOAD):
         self.video_path = video_path
         self.model_path = model_path
         self.device = device
         self.output_dir = output_dir
         self.if_concat = if_concat
-        if ort.get_device() == 'GPU' and self.device == "gpu":
-            self.sess = ort.InferenceSession(self.model_path, providers=['CUDAExecutionProvider'])
-        else:
-            self.sess = ort.InferenceSession(self.model_path, providers=['CPUExecutionProvider'])
+        self.inference_workers = inference_workers
+        self.postprocess_workers = postprocess_workers
+        self.batch_size = batch_size
+        self.keyframe_threshold = keyframe_threshold
+        self.decoder = decoder
+        self.session_threads = session_threads
+        self.stream_upload = stream_upload
+        self.frames_written = 0
+        self.total_frames = 0
+        self.last_image = None
+        self._cancelled = threading.Event()
+        self.sess = None
+        self.stats = None
         self.name = os.path.basename(self.model_path).rsplit('.', 1)[0]
 
-    def post_process(self, img, wh):
+    def load_session(self):
+        threads = self.session_threads or video_session_threads(self.inference_workers)
+        return session_registry.get(self.model_path, self.device, intra_op_threads=threads)
+
+    def resolve_batch_size(self, width, height):
+        batch_dim = self.sess.get_inputs()[0].shape[0]
+        if isinstance(batch_dim, int):
+            # The model was exported with a fixed batch of 1
+            return 1
+        if self.batch_size > 0:
+            return min(self.batch_size, MAX_VIDEO_BATCH)
+        return auto_batch_size(width, height, self.inference_workers)
+
+    def infer(self, item):
+        keys, batch = item
+        if batch is None:
+            return keys, None, None
+        fake_imgs = self.sess.run(None, {self.sess.get_inputs()[0].name: batch})[0]
+        return keys, batch, fake_imgs
+
+    def preprocess_batch(self, vid, frames):
+        # Only keyframes are preprocessed and sent to the generator
+        keys = [is_key for _, is_key in frames]
+        vid.release([frame for frame, is_key in frames if not is_key])
+        key_frames = [frame for frame, is_key in frames if is_key]
+        return keys, vid.preprocess(key_frames) if key_frames else None
+
+    def render_batch(self, item, wh):
+        keys, batch, fake_imgs = item
+        images = []
+        k = 0
+        for is_key in keys:
+            if is_key:
+                images.append(render_frame(batch[k:k + 1], fake_imgs[k:k + 1], wh, self.if_concat))
+                k += 1
+            else:
+                images.append(None)
+        return images
+
+    def write_batch(self, video_writer, images):
+        for img in images:
+            # None marks a frame that reuses the previous stylized output
+            if img is None:
+                img = self.last_image
+            self.last_image = img
+            video_writer.write(img)
+            self.frames_written += 1
+
+    @staticmethod
+    def post_process(img, wh):
         img = (img.squeeze() + 1.) / 2 * 255
         img = img.clip(0, 255).astype(np.uint8)
         img = Image.fromarray(img).resize((wh[0], wh[1]), Image.Resampling.LANCZOS)
         return np.array(img).astype(np.uint8)
     
-    def filter(self, image):
+    @staticmethod
+    def filter(image):
         # Ensure image is uint8
         if image.dtype != np.uint8:
             image = image.astype(np.uint8)
@@ -126,97 +343,154 @@ class Cartoonizer:
 
         return filter_image
 
-    async def process(self, task_id, user_id):
-        vid = Videocap(self.video_path, self.name)
-        output_video_path = os.path.join(self.output_dir, f"{task_id}_{self.name}.mp4")
-        output_video_sounds_path = os.path.join(self.output_dir, f"{task_id}_{self.name}_sounds.mp4")
+    def cancel(self):
+        self._cancelled.set()
+
+    def render(self, output_video_path, audio_source=None, stream=None):
+        """
+        Cartoonize the whole input into `output_video_path` and return the job stats
+
+        Blocking; runs the frame pipeline to completion. `frames_written` and
+        `total_frames` can be read from another thread for progress.
+
+        Args:
+            output_video_path (str): Destination .mp4 file
+            audio_source (str): File whose audio is muxed into the output, if any
+            stream: Upload receiving the encoded output instead of `output_video_path`
+        """
+        if self.sess is None:
+            self.sess = self.load_session()
+        vid = Videocap(self.video_path, self.name, 1280, False, self.decoder)
+        self.total_frames = vid.total
+        batch_size = self.resolve_batch_size(vid.width, vid.height)
+        # Queues hold whole batches, so shrink them to keep the frames in flight bounded
+        queue_size = max(2, VIDEO_QUEUE_SIZE // batch_size)
+        # Decoder buffers must cover a full batch plus the batches queued ahead of preprocessing
+        ring_size = batch_size * (queue_size + VIDEO_PREPROCESS_WORKERS + 1)
 
         if self.if_concat == "Horizontal":
-            video_writer = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'mp4v'), vid.fps, (vid.ori_width * 2, vid.ori_height))
+            size = (vid.ori_width * 2, vid.ori_height)
         elif self.if_concat == "Vertical":
-            video_writer = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'mp4v'), vid.fps, (vid.ori_width, vid.ori_height * 2))
+            size = (vid.ori_width, vid.ori_height * 2)
         else:
-            video_writer = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'mp4v'), vid.fps, (vid.ori_width, vid.ori_height))
-
-        total_frames = vid.total
-        for i in range(total_frames):
-            if vid.count < total_frames and not vid.ret and vid.q.empty():
-                video_writer.release()
-                raise ValueError("The video is broken.")
-            
-            frame = vid.read()
-            
-            filtered_frame = self.filter(frame)
-            
-            fake_img = self.sess.run(None, {self.sess.get_inputs()[0].name: frame})[0]
-            fake_img = self.post_process(fake_img, (vid.ori_width, vid.ori_height))
-            
-            filtered_fake_img = self.filter(fake_img)
-
-            if self.if_concat == "Horizontal":
-                
-                combined_img = np.hstack((filtered_frame, filtered_fake_img))
-            elif self.if_concat == "Vertical":
-                combined_img = np.vstack((filtered_frame, filtered_fake_img))
-            else:
-                combined_img = filtered_fake_img
+            size = (vid.ori_width, vid.ori_height)
+        # Frames are encoded to H.264 and muxed with the source audio in one ffmpeg pass
+        video_writer = open_video_writer(output_video_path, size[0], size[1], vid.fps, audio_source, stream)
 
-            video_writer.write(combined_img[:, :, ::-1])
+        wh = (vid.ori_width, vid.ori_height)
+        pipeline = FramePipeline([
+            PipelineStage("preprocess", lambda frames: self.preprocess_batch(vid, frames), VIDEO_PREPROCESS_WORKERS),
+            PipelineStage("inference", self.infer, self.inference_workers),
+            PipelineStage("postprocess", lambda item: self.render_batch(item, wh), self.postprocess_workers),
+        ], queue_size=queue_size)
+        # Reused frames repeat the whole rendered image, so side-by-side output always runs every frame
+        if self.keyframe_threshold > 0 and self.if_concat not in ("Horizontal", "Vertical"):
+            selector = KeyframeSelector(self.keyframe_threshold)
+            frames = selector.tag(vid.frames(ring_size))
+        else:
+            selector = None
+            frames = ((frame, True) for frame in vid.frames(ring_size))
+        pipeline.start(vid.batches(batch_size, frames), lambda images: self.write_batch(video_writer, images))
 
-            progress = int((i + 1) / total_frames * 100)
-            websocket = active_connections.get(user_id)
-            if websocket:
-                await websocket.send_json({
-                    "progress": progress,
-                    "task_id": str(task_id),
-                })
-            await asyncio.sleep(0.01)
+        finished = False
+        try:
+            while not pipeline.is_done():
+                if self._cancelled.wait(0.25):
+                    raise RuntimeError("Video processing was cancelled")
+            finished = True
+        finally:
+            if not pipeline.is_done():
+                pipeline.cancel()
+                vid.close()
+            pipeline.join(raise_error=False)
+            if not finished or pipeline.error is not None or self.frames_written == 0:
+                video_writer.abort()
+        if pipeline.error is not None:
+            raise pipeline.error
+        if self.frames_written == 0:
+            raise ValueError("The video is broken.")
 
+        encode_start = time.perf_counter()
         video_writer.release()
+        encode_tail = time.perf_counter() - encode_start
+
+        stats = pipeline.stats()
+        stats["batch_size"] = batch_size
+        stats["decoder"] = vid.decoder
+        stats["frames"] = self.frames_written
+        stats["fps"] = round(self.frames_written / stats["elapsed_s"], 2) if stats["elapsed_s"] else 0.0
+        if selector is not None:
+            stages = stats["stages"]
+            busy = sum(stages[name]["busy_s"] for name in ("preprocess", "inference", "postprocess"))
+            stats["keyframes"] = selector.keyframes
+            stats["frames_skipped"] = selector.skipped
+            # Worker time the skipped frames would have cost at the keyframe rate
+            stats["time_saved_s"] = round(busy / max(selector.keyframes, 1) * selector.skipped, 2)
+        stats["encode_tail_s"] = round(encode_tail, 2)
+        stats["bytes_written"] = video_writer.bytes_written if stream is not None else os.path.getsize(output_video_path)
+        self.stats = stats
+        return stats
+
+    async def process(self, task_id, user_id, job_id=None):
+        output_video_path = os.path.join(self.output_dir, f"{task_id}_{self.name}.mp4")
+        stream = await run_io(open_upload_stream, '.mp4') if self.stream_upload else None
+        # The render holds its thread for the whole video, so it gets its own
+        # thread rather than one from the bounded blocking executor
+        render = asyncio.ensure_future(asyncio.to_thread(self.render, output_video_path, self.video_path, stream))
+
+        last_progress = -1
         try:
-            sound_path = os.path.join(self.output_dir, "sound.mp3")
-            subprocess.check_call(["ffmpeg", "-loglevel", "error", "-i", self.video_path, "-y", sound_path])
-            subprocess.check_call(["ffmpeg", "-loglevel", "error", "-i", sound_path, "-i", output_video_path, "-y", "-c:v", "libx264", "-c:a", "copy", "-crf", "25", output_video_sounds_path])
-            final = output_video_sounds_path
-        except:
-            print("FFmpeg failed, returning silent video.")
-            final = output_video_path
-                
-        media_url = upload_to_cloud(final)
-        response = requests.post(
-            DJANGO_API_URL,
-            headers={"FastAPI-Secret": FASTAPI_SECRET},
-            json={
-                "user_id": user_id,
-                "media_type": 'video',
-                "media_url": media_url,
-            }
-        )
-        self.cleanup_files(self.video_path, output_video_path, sound_path, output_video_sounds_path)
+            while not render.done():
+                await asyncio.wait({render}, timeout=0.25)
+                progress = min(100, int(self.frames_written / max(self.total_frames, 1) * 100))
+                websocket = active_connections.get(user_id)
+                if websocket and progress != last_progress:
+                    last_progress = progress
+                    await websocket.send_json({
+                        "progress": progress,
+                        "task_id": str(task_id),
+                    })
+            self.stats = render.result()
+        except BaseException:
+            self.cancel()
+            if stream is not None:
+                await run_io(stream.abort)
+            raise
+
+        # Time from the last encoded byte to a usable URL
+        upload_start = time.perf_counter()
+        if stream is not None:
+            try:
+                media_url = await run_io(stream.complete)
+            except Exception:
+                await run_io(stream.abort)
+                raise
+        else:
+            media_url = await upload_to_cloud_async(output_video_path)
+        self.stats["upload_tail_s"] = round(time.perf_counter() - upload_start, 2)
+        self.stats["stream_upload"] = stream is not None
+        print(f"Video pipeline stats for task {task_id}: {self.stats}")
+        recent_pipeline_stats.append({"task_id": str(task_id), **self.stats})
+
+        await notify_django(user_id, media_url, job_id)
+        self.cleanup_files(self.video_path, output_video_path)
                 
         return media_url
         
         
-    def cleanup_files(self, input_video_path, output_video_path, sound_path, output_video_sounds_path):
+    def cleanup_files(self, input_video_path, output_video_path):
         """
-        Clean up temporary and intermediate files.
+        Clean up temporary files.
         
         Args:
             input_video_path (str): Path to the original input video
-            output_video_path (str): Path to the output video without sound
-            sound_path (str): Path to the extracted sound file
-            output_video_sounds_path (str): Path to the output video with sound
+            output_video_path (str): Path to the encoded output video
         """
         files_to_delete = [
             input_video_path,  # Delete input video from downloads folder
-            output_video_path,  # Delete output video without sound
-            sound_path,  # Delete extracted sound file
+            output_video_path,  # Delete uploaded output video
         ]
 
-        # If a video with sound was created, delete it as well
-        if output_video_sounds_path != output_video_path:
-            files_to_delete.append(output_video_sounds_path)
-
         # Attempt to delete each file
         for file_path in files_to_delete:
             try:
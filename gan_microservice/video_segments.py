@@ -0,0 +1,290 @@
+# video_segments.py
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from executor import run_blocking
+from s3api import upload_to_cloud_async
+from video_io import probe_audio_codec, MP4_AUDIO_CODECS
+from video_processing import Cartoonizer, notify_django, recent_pipeline_stats, VIDEO_KEYFRAME_THRESHOLD
+from websocket_handler import active_connections
+
+# Worker processes rendering segments in parallel; 0 keeps videos as one job
+VIDEO_SEGMENT_WORKERS = int(os.getenv("VIDEO_SEGMENT_WORKERS", "0"))
+VIDEO_SEGMENT_SECONDS = float(os.getenv("VIDEO_SEGMENT_SECONDS", "20"))
+# Runs of the same job, including restarts, before its checkpoint is dropped
+VIDEO_SEGMENT_MAX_ATTEMPTS = int(os.getenv("VIDEO_SEGMENT_MAX_ATTEMPTS", "3"))
+SEGMENT_ROOT = "segment_jobs"
+SEGMENT_FAILURES_PATH = os.path.join(SEGMENT_ROOT, "failed.jsonl")
+
+_segment_pool = None
+
+
+def get_segment_pool():
+    global _segment_pool
+    if _segment_pool is None:
+        # spawn, not fork: the parent already runs ONNX Runtime and pipeline threads
+        _segment_pool = ProcessPoolExecutor(
+            max_workers=max(1, VIDEO_SEGMENT_WORKERS),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _segment_pool
+
+
+def probe_keyframes(video_path):
+    """Return (keyframe timestamps, duration) of the first video stream."""
+    output = subprocess.check_output([
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", video_path,
+    ]).decode()
+    keyframes = []
+    for line in output.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) >= 2 and "K" in parts[1] and parts[0] not in ("", "N/A"):
+            keyframes.append(float(parts[0]))
+    duration = subprocess.check_output([
+        "ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", video_path,
+    ]).decode().strip()
+    return sorted(keyframes), float(duration or 0)
+
+
+def plan_segments(keyframes, duration, target_seconds):
+    """Split [0, duration) at keyframes into segments of roughly `target_seconds`."""
+    bounds = [0.0]
+    for t in keyframes:
+        if t - bounds[-1] >= target_seconds and duration - t >= target_seconds / 2:
+            bounds.append(t)
+    bounds.append(duration)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def render_segment(segment_input, output_path, model_path, device, session_threads, keyframe_threshold):
+    """Cartoonize one segment in a worker process, publishing the result atomically."""
+    cartoonizer = Cartoonizer(segment_input, model_path, device, os.path.dirname(output_path), None,
+                              inference_workers=1, postprocess_workers=1, keyframe_threshold=keyframe_threshold,
+                              session_threads=session_threads)
+    partial = output_path + ".part.mp4"
+    stats = cartoonizer.render(partial)
+    os.replace(partial, output_path)
+    return stats
+
+
+class SegmentedVideoJob:
+    def __init__(self, video_path, model_path, device, output_dir, job_id, user_id,
+                 workers=VIDEO_SEGMENT_WORKERS, segment_seconds=VIDEO_SEGMENT_SECONDS,
+                 keyframe_threshold=VIDEO_KEYFRAME_THRESHOLD, max_attempts=VIDEO_SEGMENT_MAX_ATTEMPTS,
+                 upload_job_id=None):
+        """
+        Video job split into GOP-aligned segments rendered by worker processes
+
+        The input is cut at keyframes with stream copy, each segment is
+        cartoonized independently and checkpointed in `manifest.json` once
+        its output is complete, and the outputs are joined with ffmpeg's
+        concat demuxer without re-encoding. A job restarted with the same
+        `job_id` only renders the segments that are missing. After
+        `max_attempts` failed runs the checkpoint is dropped and the failure
+        is appended to `segment_jobs/failed.jsonl`.
+
+        Args:
+            video_path (str): Input video
+            model_path (str): ONNX generator
+            device (str): "gpu" or "cpu"
+            output_dir (str): Directory receiving the final video
+            job_id (str): Stable identifier; names the checkpoint directory
+            user_id (str): Owner, notified over WebSocket and in the callback
+            workers (int): Segments rendered at the same time
+            segment_seconds (float): Target segment length
+            keyframe_threshold (float): Frame difference under which frames reuse
+                the previous keyframe's output; 0 stylizes every frame
+            max_attempts (int): Runs before the job is given up
+            upload_job_id (str): Django upload the result is attached to; None
+                when Django did not issue one
+        """
+        self.video_path = video_path
+        self.model_path = model_path
+        self.device = device
+        self.output_dir = output_dir
+        self.job_id = str(job_id)
+        self.user_id = user_id
+        self.workers = max(1, workers)
+        self.segment_seconds = segment_seconds
+        self.keyframe_threshold = keyframe_threshold
+        self.max_attempts = max_attempts
+        self.upload_job_id = upload_job_id
+        self.work_dir = os.path.join(SEGMENT_ROOT, self.job_id)
+        self.manifest_path = os.path.join(self.work_dir, "manifest.json")
+        self.manifest = None
+
+    @classmethod
+    def pending(cls):
+        """Jobs with a checkpoint directory left behind by an interrupted run."""
+        jobs = []
+        if not os.path.isdir(SEGMENT_ROOT):
+            return jobs
+        for job_id in os.listdir(SEGMENT_ROOT):
+            manifest_path = os.path.join(SEGMENT_ROOT, job_id, "manifest.json")
+            try:
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            job = cls(manifest["source"], manifest["model_path"], manifest["device"], manifest["output_dir"],
+                      job_id, manifest["user_id"],
+                      keyframe_threshold=manifest.get("keyframe_threshold", VIDEO_KEYFRAME_THRESHOLD),
+                      upload_job_id=manifest.get("upload_job_id"))
+            job.manifest = manifest
+            if not os.path.exists(manifest["source"]):
+                job.give_up("source video is gone")
+            elif manifest.get("attempts", 0) >= job.max_attempts:
+                # The last attempt was cut short by a crash or shutdown
+                job.give_up(manifest.get("error") or "interrupted on its last attempt")
+            else:
+                jobs.append(job)
+        return jobs
+
+    def give_up(self, error):
+        """Record a job that failed for good and drop its checkpoint so it is not resumed."""
+        record = {"job_id": self.job_id, "user_id": self.user_id, "source": self.video_path,
+                  "attempts": (self.manifest or {}).get("attempts", 0), "error": str(error), "failed_at": time.time()}
+        print(f"Giving up segmented job {self.job_id}: {error}")
+        os.makedirs(SEGMENT_ROOT, exist_ok=True)
+        with open(SEGMENT_FAILURES_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def save_manifest(self):
+        partial = self.manifest_path + ".tmp"
+        with open(partial, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(partial, self.manifest_path)
+
+    def prepare(self):
+        """Load the checkpoint, or cut the input into segments on the first run."""
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest.get("source") == self.video_path:
+                return self.manifest
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        keyframes, duration = probe_keyframes(self.video_path)
+        segments = []
+        for index, (start, end) in enumerate(plan_segments(keyframes, duration, self.segment_seconds)):
+            # Matroska takes any codec ffmpeg can copy (WMV3, FLV1, ...), MP4 does not
+            segment_input = os.path.join(self.work_dir, f"input_{index:04d}.mkv")
+            # Segments start on keyframes, so stream copy cuts them cleanly
+            subprocess.check_call([
+                "ffmpeg", "-loglevel", "error", "-y", "-ss", str(start), "-i", self.video_path,
+                "-t", str(end - start), "-map", "0:v:0", "-an", "-c", "copy", segment_input,
+            ])
+            segments.append({
+                "index": index,
+                "start": start,
+                "end": end,
+                "input": segment_input,
+                "output": os.path.join(self.work_dir, f"output_{index:04d}.mp4"),
+                "done": False,
+            })
+        self.manifest = {
+            "source": self.video_path,
+            "model_path": self.model_path,
+            "device": self.device,
+            "output_dir": self.output_dir,
+            "user_id": self.user_id,
+            "keyframe_threshold": self.keyframe_threshold,
+            "upload_job_id": self.upload_job_id,
+            "attempts": 0,
+            "segments": segments,
+        }
+        self.save_manifest()
+        return self.manifest
+
+    def concat(self, output_path):
+        """Join the rendered segments and mux the original audio, without re-encoding video."""
+        list_path = os.path.join(self.work_dir, "segments.txt")
+        with open(list_path, "w") as f:
+            for segment in self.manifest["segments"]:
+                f.write(f"file '{os.path.abspath(segment['output'])}'\n")
+        codec = probe_audio_codec(self.video_path)
+        audio_args = ["-c:a", "copy"] if codec is None or codec in MP4_AUDIO_CODECS else ["-c:a", "aac"]
+        subprocess.check_call([
+            "ffmpeg", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", self.video_path, "-map", "0:v:0", "-map", "1:a:0?", "-c:v", "copy", *audio_args,
+            "-movflags", "+faststart", output_path,
+        ])
+
+    async def send_progress(self, task_id, done, total):
+        websocket = active_connections.get(self.user_id)
+        if websocket:
+            await websocket.send_json({
+                "progress": int(done / max(total, 1) * 100),
+                "task_id": str(task_id),
+            })
+
+    async def process(self, task_id, user_id=None):
+        try:
+            manifest = await run_blocking(self.prepare)
+        except Exception as e:
+            # Nothing was checkpointed, so there is nothing to resume
+            await run_blocking(self.give_up, e)
+            raise
+        manifest["attempts"] = manifest.get("attempts", 0) + 1
+        await run_blocking(self.save_manifest)
+        try:
+            return await self.render(task_id)
+        except Exception as e:
+            # Cancellation is a shutdown, not a failure: the checkpoint is kept for the restart
+            if manifest["attempts"] >= self.max_attempts:
+                await run_blocking(self.give_up, e)
+            else:
+                manifest["error"] = str(e)
+                await run_blocking(self.save_manifest)
+            raise
+
+    async def render(self, task_id):
+        segments = self.manifest["segments"]
+        pending = [s for s in segments if not (s["done"] and os.path.exists(s["output"]))]
+        done = len(segments) - len(pending)
+        if done:
+            print(f"Resuming job {self.job_id} at segment {done}/{len(segments)}")
+
+        loop = asyncio.get_running_loop()
+        pool = get_segment_pool()
+        session_threads = max(1, (os.cpu_count() or 1) // self.workers)
+        running = {
+            loop.run_in_executor(pool, render_segment, s["input"], s["output"], self.model_path, self.device,
+                                 session_threads, self.keyframe_threshold): s
+            for s in pending
+        }
+        try:
+            while running:
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in finished:
+                    segment = running.pop(future)
+                    future.result()
+                    segment["done"] = True
+                    await run_blocking(self.save_manifest)
+                    done += 1
+                    await self.send_progress(task_id, done, len(segments))
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+
+        output_path = os.path.join(self.output_dir, f"{task_id}.mp4")
+        await run_blocking(self.concat, output_path)
+        recent_pipeline_stats.append({"task_id": str(task_id), "segments": len(segments),
+                                      "bytes_written": os.path.getsize(output_path)})
+
+        media_url = await upload_to_cloud_async(output_path)
+        await notify_django(self.user_id, media_url, self.upload_job_id)
+        for path in (self.video_path, output_path):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        return media_url
@@ -0,0 +1,83 @@
+# worker.py
+import argparse
+import asyncio
+import os
+import socket
+
+from callbacks import callback_client
+from executor import run_blocking
+from image_processing import process_images
+from job_queue import JobQueue, JOB_QUEUE_PATH
+from session_registry import session_registry, DEFAULT_MODEL_PATH, WARM_DEVICES
+from video_processing import Cartoonizer, video_session_threads
+from video_segments import SegmentedVideoJob, VIDEO_SEGMENT_WORKERS
+
+
+async def run_job(job):
+    payload = job["payload"]
+    if job["kind"] == "image":
+        return await process_images(job["id"], payload["user_id"], payload["input_path"], payload["output_path"],
+                                    payload["model_path"], payload["device"], payload.get("quality"),
+                                    payload.get("job_id"))
+    if job["kind"] == "video":
+        if VIDEO_SEGMENT_WORKERS > 0:
+            # Retries reuse the job id, so finished segments are not rendered again
+            segmented = SegmentedVideoJob(payload["input_path"], payload["model_path"], payload["device"],
+                                          payload["output_path"], job["id"], payload["user_id"],
+                                          keyframe_threshold=payload.get("keyframe_threshold", 0),
+                                          upload_job_id=payload.get("job_id"))
+            return await segmented.process(job["id"], payload["user_id"])
+        cartoonizer = Cartoonizer(payload["input_path"], payload["model_path"], payload["device"], payload["output_path"],
+                                  None, keyframe_threshold=payload.get("keyframe_threshold", 0))
+        return await cartoonizer.process(job["id"], payload["user_id"], payload.get("job_id"))
+    raise ValueError(f"Unknown job kind: {job['kind']}")
+
+
+async def keep_alive(queue, job_id, visibility_timeout):
+    """Extend the job's lease while it is being processed."""
+    while True:
+        await asyncio.sleep(visibility_timeout / 3)
+        await run_blocking(queue.heartbeat, job_id, visibility_timeout)
+
+
+async def worker_loop(queue, name, visibility_timeout, poll_interval):
+    while True:
+        job = await run_blocking(queue.claim, name, visibility_timeout)
+        if job is None:
+            await asyncio.sleep(poll_interval)
+            continue
+
+        print(f"{name} picked up {job['kind']} job {job['id']} (attempt {job['attempts']})")
+        heartbeat = asyncio.create_task(keep_alive(queue, job["id"], visibility_timeout))
+        try:
+            result = await run_job(job)
+            await run_blocking(queue.complete, job["id"], result)
+        except Exception as e:
+            print(f"Job {job['id']} failed: {e}")
+            await run_blocking(queue.fail, job["id"], e)
+        finally:
+            heartbeat.cancel()
+
+
+async def main(args):
+    queue = JobQueue(args.db)
+    session_registry.warm([DEFAULT_MODEL_PATH], WARM_DEVICES, (0, video_session_threads()))
+    name = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"Worker {name} consuming {args.db} with concurrency {args.concurrency}")
+    callback_client.start()
+    try:
+        await asyncio.gather(*(
+            worker_loop(queue, f"{name}-{i}", args.visibility_timeout, args.poll_interval)
+            for i in range(args.concurrency)
+        ))
+    finally:
+        await callback_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ganaura job queue worker")
+    parser.add_argument("--db", type=str, default=JOB_QUEUE_PATH, help="Path to the SQLite job queue")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs processed at the same time")
+    parser.add_argument("--visibility-timeout", type=float, default=300, help="Seconds before an unacknowledged job is retried")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when the queue is empty")
+    asyncio.run(main(parser.parse_args()))
@@ -63,18 +63,23 @@ def filter(image):
 
 
 class GanauraInference:
-    def __init__(self, model_path, use_gpu=True):
+    def __init__(self, model_path, use_gpu=True, session_registry=None):
         """
         Initialize the Ganaura inference engine
         
         Args:
             model_path: Path to the ONNX model
             use_gpu: Whether to use GPU for inference (if available)
+            session_registry: Optional shared registry (gan_microservice.session_registry)
+                to reuse an already loaded session instead of building a new one
         """
         # Set up ONNX Runtime session
         providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] if use_gpu else ['CPUExecutionProvider']
         try:
-            self.session = ort.InferenceSession(model_path, providers=providers)
+            if session_registry is not None:
+                self.session = session_registry.get(model_path, 'gpu' if use_gpu else 'cpu')
+            else:
+                self.session = ort.InferenceSession(model_path, providers=providers)
             self.input_name = self.session.get_inputs()[0].name
             print(f"Model loaded successfully from {model_path}")
             print(f"Input name: {self.input_name}")